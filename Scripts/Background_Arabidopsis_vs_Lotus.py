@@ -3,92 +3,124 @@ Script Name: background_cluster3.py
 
 Purpose:
 This script selects expression-matched background genes for motif enrichment analysis in Arabidopsis cluster 3 genes responsive to synthetic microbial community (SC) treatments. 
-It filters promoter sequences for these background genes and scans them for known transcription factor (TF) motifs using FIMO from the MEME Suite.
+Every foreground gene gets its own distinct control(s), matched without replacement (background_sampler.py).
+It filters promoter sequences for these background genes and scans them for known transcription factor (TF) motifs with the
+in-process PWM scanner (pwm_scanner.py), which produces FIMO-compatible hits without calling the FIMO binary.
 
 Inputs:
 - Expression matrix (.xlsx) with clustering labels and gene expression values
 - FASTA file containing 1 kb upstream promoter sequences for Arabidopsis genes
 - Plant TF motif database in MEME format (e.g., from JASPAR)
-- FIMO binary (must be installed and in PATH)
 
 Outputs:
 - A text file with selected background gene IDs
 - A FASTA file with corresponding background promoter sequences
-- FIMO output folder with motif occurrences
+- FIMO-style output folder with motif occurrences (fimo.tsv)
 
 Associated Thesis Section:
 - Described in section 2.4.2 of the thesis "Motif Enrichment Analysis"
 - This script generates the background control for testing motif overrepresentation using Fisher's exact test
+- The functions are reused by motif_enrichment_pipeline.py, which runs all clusters in one batch
 """
 
 import os
-import pandas as pd
-from sklearn.neighbors import NearestNeighbors
-from Bio import SeqIO
-import subprocess
 from datetime import datetime
 
+from background_sampler import sample_background
+from expression_data import gene_table
+from promoter_store import PromoterStore
+from pwm_scanner import load_pssms, scan_codes
+
 # === Define file paths ===
 EXPR_PATH = "/home/15712745/personal/TF_prediction_genomes/Gene_regulatory_network/Expression_data_At.xlsx"
 UPSTREAM_FASTA = "/home/15712745/personal/Gene_selection/TAIR10_upstream_1000_20101104.txt"
 MOTIF_FILE = "/home/15712745/personal/TF_prediction_genomes/TF_bindingsite_motifs/ALL_plant_motifs_JASPAR.meme"
 FIMO_OUTPUT_DIR = "/home/15712745/personal/TF_prediction_genomes/MEME/FIMO_folder"
-OUTPUT_PREFIX = "background_cluster3_" + datetime.today().strftime("%d_%m_%Y")
+CLUSTER_COLUMN = "cl"
+CLUSTER = 3
+
+# Matching: k distinct controls per foreground gene, drawn without replacement (background_sampler.py).
+# Covariates are columns of the expression table; "promoter_gc" is computed from the promoter store,
+# other columns (e.g. a CDS length column) can be added to the table and listed here.
+MATCH_COVARIATES = ["avg_expr"]
+N_CONTROLS = 1
+RANDOM_SEED = 2025
+
+OUTPUT_PREFIX = f"background_cluster{CLUSTER}_" + datetime.today().strftime("%d_%m_%Y")
 
 GENE_ID_OUTPUT = f"/home/15712745/personal/TF_prediction_genomes/MEME/Visualization_MEME/{OUTPUT_PREFIX}_gene_ids.txt"
 PROMOTER_FASTA_OUTPUT = f"/home/15712745/personal/TF_prediction_genomes/MEME/Visualization_MEME/{OUTPUT_PREFIX}_promoters.fasta"
 FIMO_RUN_DIR = os.path.join(FIMO_OUTPUT_DIR, f"fimo_{OUTPUT_PREFIX}")
 
 # === Step 1: Load expression data ===
-# Load data and prepare for background selection by calculating average expression
-df = pd.read_excel(EXPR_PATH)
-df = df.replace(",", ".", regex=True)
-df.iloc[:, 9:-1] = df.iloc[:, 9:-1].astype(float)
-df['avg_expr'] = df.iloc[:, 9:-1].mean(axis=1)
+def load_expression(expr_path=EXPR_PATH):
+    """Load the expression table and calculate the average expression used for background matching."""
+    df = gene_table(expr_path)
+    if "promoter_gc" in MATCH_COVARIATES:
+        df['promoter_gc'] = PromoterStore(UPSTREAM_FASTA).gc_content(df['ID'].astype(str))
+    return df
+
 
 # === Step 2: Select background genes matched by average expression ===
-foreground_df = df[df['cl'] == 3].copy()
-background_pool = df[df['cl'] != 3].copy()
+def select_background(df, cluster=CLUSTER, cluster_column=CLUSTER_COLUMN, k=N_CONTROLS, seed=RANDOM_SEED):
+    """
+    Return the IDs of expression-matched background genes for one cluster: k distinct controls per
+    foreground gene, matched on MATCH_COVARIATES without replacement.
+    """
+    matched_background_df = sample_background(df, cluster, MATCH_COVARIATES, k=k, seed=seed,
+                                              cluster_column=cluster_column)
+    return matched_background_df['ID'].dropna().astype(str).unique()
 
-if len(foreground_df) == 0 or len(background_pool) == 0:
-    raise ValueError("Foreground or background pool is empty — check clustering column or input file.")
 
-# Use nearest neighbor matching to find background genes with similar expression levels
-nn = NearestNeighbors(n_neighbors=1)
-nn.fit(background_pool[['avg_expr']])
-_, indices = nn.kneighbors(foreground_df[['avg_expr']])
+# === Step 3: Write selected background gene IDs to file ===
+def write_gene_ids(gene_ids, output_path=GENE_ID_OUTPUT):
+    with open(output_path, "w") as f:
+        for gene_id in gene_ids:
+            f.write(gene_id + "\n")
+    print(f"Written gene list to: {output_path}")
 
-matched_background_df = background_pool.iloc[indices.flatten()].copy()
-matched_background_df['matched_to'] = foreground_df['ID'].values
-background_ids = matched_background_df['ID'].dropna().astype(str).unique()
 
-print(f"Background genes selected: {len(background_ids)}")
+# === Step 4: Extract promoter sequences from background gene list ===
+def extract_promoters(gene_ids, store, output_path=PROMOTER_FASTA_OUTPUT):
+    """
+    Look up the genes in the indexed promoter store (the FASTA is only parsed once) and write their
+    promoters to FASTA. Returns the gene IDs that were found and their encoded promoters.
+    """
+    found_ids, promoter_codes = store.fetch_codes(gene_ids)
 
-# === Step 3: Write selected background gene IDs to file ===
-with open(GENE_ID_OUTPUT, "w") as f:
-    for gene_id in background_ids:
-        f.write(gene_id + "\n")
-print(f"Written gene list to: {GENE_ID_OUTPUT}")
+    if len(found_ids) == 0:
+        print("No matching promoter sequences found. Check FASTA headers and gene ID format.")
+    else:
+        print("Example gene IDs:\n" + "\n".join(f">{gene_id}" for gene_id in found_ids[:5]))
+        print(f"{len(found_ids)} promoter sequences matched out of {len(gene_ids)} genes")
 
-# === Step 4: Extract promoter sequences from background gene list ===
-# Match gene IDs in the promoter FASTA file
-background_ids_set = set(gene_id.split('.')[0] for gene_id in background_ids)
-records = list(SeqIO.parse(UPSTREAM_FASTA, "fasta"))
-filtered_records = [rec for rec in records if rec.id.split('.')[0] in background_ids_set]
-
-if len(filtered_records) == 0:
-    print("No matching promoter sequences found. Check FASTA headers and gene ID format.")
-else:
-    print(f"Example FASTA headers:\n" + "\n".join(f">{r.id}" for r in filtered_records[:5]))
-    print(f"{len(filtered_records)} promoter sequences matched out of {len(background_ids)} genes")
-
-SeqIO.write(filtered_records, PROMOTER_FASTA_OUTPUT, "fasta")
-print(f"Filtered promoter FASTA written to: {PROMOTER_FASTA_OUTPUT}")
-
-# === Step 5: Run FIMO to scan promoter sequences for motif matches ===
-os.makedirs(FIMO_RUN_DIR, exist_ok=True)
-fimo_cmd = ["fimo", "--oc", FIMO_RUN_DIR, "--verbosity", "1", MOTIF_FILE, PROMOTER_FASTA_OUTPUT]
-
-print("🔍 Running FIMO...")
-subprocess.run(fimo_cmd, check=True)
-print(f"Done. FIMO output written to: {os.path.join(FIMO_RUN_DIR, 'fimo.tsv')}")
+    store.write_fasta(found_ids, output_path, full_headers=True)
+    print(f"Filtered promoter FASTA written to: {output_path}")
+    return found_ids, promoter_codes
+
+
+# === Step 5: Scan promoter sequences for motif matches ===
+def scan_promoters(promoter_codes, gene_ids, motif_file=MOTIF_FILE, run_dir=FIMO_RUN_DIR):
+    """Scan encoded promoters with all motifs and write a FIMO-style fimo.tsv to run_dir."""
+    os.makedirs(run_dir, exist_ok=True)
+
+    print("🔍 Scanning promoters for motifs...")
+    pssms, background = load_pssms(motif_file)
+    hits = scan_codes(promoter_codes, gene_ids, pssms, background)
+    hits.to_csv(os.path.join(run_dir, "fimo.tsv"), sep="\t", index=False)
+    print(f"Done. {len(hits)} motif hits written to: {os.path.join(run_dir, 'fimo.tsv')}")
+    return hits
+
+
+def main():
+    df = load_expression()
+    background_ids = select_background(df)
+    print(f"Background genes selected: {len(background_ids)}")
+
+    write_gene_ids(background_ids)
+    found_ids, promoter_codes = extract_promoters(background_ids, PromoterStore(UPSTREAM_FASTA))
+    scan_promoters(promoter_codes, found_ids)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,9 @@ Inputs:
 Output:
 - A FASTA file with promoter sequences corresponding to the input gene list
 
+Sequences are read through the indexed promoter store (promoter_store.py): the TAIR FASTA is indexed
+once and later runs only look up the requested genes instead of scanning the whole file.
+
 Thesis Reference:
 - Described in Section 2.2 "Promoter Sequence Extraction"
 - Used for generating input to FIMO and STREME motif analysis (Sections 2.3–2.4)
@@ -20,6 +23,8 @@ Thesis Reference:
 
 import re
 
+from promoter_store import PromoterStore
+
 # === File Paths ===
 gene_ids_file = "/home/15712745/personal/TF_prediction_genomes/MEME/Visualization_MEME/Lotus_cluster6_background_arabidopsishomolog.txt"
 tair_file = "/home/15712745/personal/Gene_selection/TAIR10_upstream_1000_20101104.txt"
@@ -45,35 +50,15 @@ def get_gene_ids(txt_file):
 # === Step 2: Extract Matching Promoter Sequences ===
 def extract_sequences(tair_file, gene_ids):
     """
-    Parse FASTA file and extract sequences for gene IDs in the input list.
-    Assumes headers start with '>AT1G...' style IDs.
+    Look up promoter sequences for gene IDs in the input list from the indexed TAIR FASTA.
+    Returns FASTA-formatted entries with bare gene IDs as headers.
     """
-    extracted_data = []
-    found_genes = set()
-    current_gene = None
-    current_sequence = []
-
-    with open(tair_file, "r", encoding="utf-8") as file:
-        for line in file:
-            if line.startswith(">"):
-                if current_gene and current_gene in gene_ids:
-                    extracted_data.append(f">{current_gene}\n" + "".join(current_sequence) + "\n")
-                    found_genes.add(current_gene)
-                
-                # Parse new gene ID from header
-                match = re.search(r'>(AT[1-5]G\d{5})', line)
-                current_gene = match.group(1) if match else None
-                current_sequence = []
-            elif current_gene:
-                current_sequence.append(line.strip())
-
-        # Capture final entry if matched
-        if current_gene and current_gene in gene_ids:
-            extracted_data.append(f">{current_gene}\n" + "".join(current_sequence) + "\n")
-            found_genes.add(current_gene)
+    store = PromoterStore(tair_file)
+    found_genes, sequences = store.fetch(sorted(gene_ids))
+    extracted_data = [f">{gene}\n{seq}\n" for gene, seq in zip(found_genes, sequences)]
 
     print(f"Found {len(found_genes)} matching promoter sequences (first 10 shown):")
-    print(list(found_genes)[:10])
+    print(found_genes[:10])
     return extracted_data
 
 # === Step 3: Write Output ===
@@ -84,4 +69,4 @@ if __name__ == "__main__":
     with open(output_file, "w") as output:
         output.writelines(selected_sequences)
 
-    print(f"Extraction complete! {len(selected_sequences) // 2} genes saved to {output_file}")
+    print(f"Extraction complete! {len(selected_sequences)} genes saved to {output_file}")
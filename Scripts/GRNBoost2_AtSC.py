@@ -19,18 +19,17 @@ Thesis Reference:
 
 Requirements:
 - Python packages: pandas, numpy, dask, arboreto
-- Dask installed and configured for parallelism
+- Dask cluster configured in grn_runner.DaskConfig (local workers or an existing scheduler)
 """
 
 import os
-import pandas as pd
 import numpy as np
-from arboreto.algo import grnboost2
-from dask.distributed import Client, LocalCluster
 import logging
 
-# Monkey patch for deprecated method in arboreto (if using older versions)
-pd.DataFrame.as_matrix = lambda self: self.to_numpy()
+from edge_store import store_path, write_edge_store
+from expression_data import expression_frame, load_tf_names
+from grn_consensus import consensus_network
+from grn_runner import DaskConfig, dask_client, run_grnboost2
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -40,22 +39,19 @@ def main():
     excel_path = "/home/15712745/personal/TF_prediction_genomes/Gene_regulatory_network/Expression_data_At.xlsx"
     tf_path = "/home/15712745/personal/TF_prediction_genomes/Gene_regulatory_network/Ath_TF_list.txt"
     output_path = "/home/15712745/personal/TF_prediction_genomes/Gene_regulatory_network/grnboost2_output_AtSC_vs_LjSC_final_8_6_2025.tsv"
+    # Dask cluster: local workers, or set scheduler_address to use an existing cluster
+    dask_config = DaskConfig(n_workers=4, threads_per_worker=1, memory_limit="auto", scheduler_address=None)
+    report_prefix = None  # e.g. output_path + ".perf" for performance report, task timings and memory
+    # Consensus over seeded replicates (grn_consensus.py): None for a single run, otherwise the number of
+    # replicates; the output then has median_importance, importance_std and frequency columns as well
+    n_replicates = None
+    consensus_mode = "seeds"  # "seeds" or "bootstrap" (resample samples with replacement)
+    random_seed = 2025
 
     # === Load expression matrix ===
     logging.info("Loading expression matrix...")
-    df = pd.read_excel(excel_path)
-    expr_cols = [col for col in df.columns if "C_AtSC" in col or "C_LjSC" in col]
-
-    # Normalize and clean
-    df[expr_cols] = df[expr_cols].replace(",", ".", regex=True).astype(float)
-    df['Gene_ID'] = df['ID'].astype(str).str.replace(r"\.\d+$", "", regex=True)
-    df.set_index('Gene_ID', inplace=True)
-
-    # Transpose for GRNBoost2 format: genes = columns, samples = rows
-    expression_matrix = df[expr_cols].T
-    expression_matrix.columns = expression_matrix.columns.str.replace(r"\.\d+$", "", regex=True)
-    expression_matrix = expression_matrix.loc[:, ~expression_matrix.columns.duplicated()]
-    expression_matrix = expression_matrix.loc[:, expression_matrix.std() > 0].dropna(axis=1)
+    # Parsed workbook is cached next to the Excel file (expression_data.py)
+    expression_matrix = expression_frame(excel_path, sample_filter=("C_AtSC", "C_LjSC"), drop_constant=True)
 
     if expression_matrix.empty:
         logging.error("Expression matrix is empty after filtering.")
@@ -66,10 +62,7 @@ def main():
 
     # === Load TF list ===
     logging.info("Loading TF list...")
-    tf_df = pd.read_csv(tf_path, sep="\t")
-    tf_df['Gene_ID'] = tf_df['Gene_ID'].astype(str).str.replace(r"\.\d+$", "", regex=True)
-
-    matched_tfs = [tf for tf in tf_df['Gene_ID'] if tf in expression_matrix.columns]
+    matched_tfs = load_tf_names(tf_path, expression_matrix.columns)
     tf_variance_filtered = [tf for tf in matched_tfs if expression_matrix[tf].std() > 0]
 
     if not tf_variance_filtered:
@@ -79,13 +72,15 @@ def main():
     logging.info(f"Variable TFs matched: {len(tf_variance_filtered)}")
 
     # === Run GRNBoost2 ===
-    logging.info("Starting Dask client...")
-    cluster = LocalCluster(n_workers=4, threads_per_worker=1)
-    client = Client(cluster)
-
     try:
-        logging.info("Running GRNBoost2...")
-        network = grnboost2(expression_data=expression_matrix, tf_names=tf_variance_filtered)
+        with dask_client(dask_config) as client:
+            if n_replicates:
+                logging.info(f"Running {n_replicates} GRNBoost2 replicates ({consensus_mode})...")
+                network = consensus_network(expression_matrix, tf_variance_filtered, client, n_replicates,
+                                            consensus_mode, random_seed, report_prefix)
+            else:
+                logging.info("Running GRNBoost2...")
+                network = run_grnboost2(expression_matrix, tf_variance_filtered, client, report_prefix=report_prefix)
         if network.empty:
             logging.warning("GRNBoost2 returned an empty network.")
     except Exception as e:
@@ -96,6 +91,7 @@ def main():
     try:
         logging.info(f"Saving GRN to {output_path}...")
         network.to_csv(output_path, sep="\t", index=False)
+        write_edge_store(network, store_path(output_path))  # memory-mapped query index
         logging.info("GRNBoost2 run completed successfully.")
     except Exception as e:
         logging.error(f"Error saving GRN output: {e}")
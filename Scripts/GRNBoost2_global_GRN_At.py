@@ -18,11 +18,12 @@ Thesis Reference:
 """
 
 import os
-import pandas as pd
-from arboreto.algo import grnboost2
-from dask.distributed import Client
 import logging
 
+from edge_store import store_path, write_edge_store
+from expression_data import expression_frame, load_tf_names
+from grn_runner import DaskConfig, dask_client, run_grnboost2, run_sharded
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -31,6 +32,13 @@ def main():
     excel_path = "/home/15712745/personal/TF_prediction_genomes/Gene_regulatory_network/Expression_data_At.xlsx"
     tf_path = "/home/15712745/personal/TF_prediction_genomes/Gene_regulatory_network/Ath_TF_list.txt"
     output_path = "/home/15712745/personal/TF_prediction_genomes/Gene_regulatory_network/grnboost2_output.tsv"
+    # Dask cluster: local workers, or set scheduler_address to use an existing cluster
+    # (None: Dask default, one worker process per core group)
+    dask_config = DaskConfig(n_workers=None, threads_per_worker=None, memory_limit="auto", scheduler_address=None)
+    report_prefix = output_path + ".perf"  # performance report, task timings and memory for node sizing
+    # Resumable sharded run: finished target shards are kept in checkpoint_dir and skipped on restart
+    shard_size = 500  # target genes per shard (None: one all-or-nothing run)
+    checkpoint_dir = output_path + ".shards"
 
     # === Check for input files ===
     if not os.path.exists(excel_path):
@@ -43,15 +51,8 @@ def main():
     # === Load expression matrix ===
     logging.info("Loading expression matrix...")
     try:
-        df = pd.read_excel(excel_path)
-        df.iloc[:, 9:-1] = df.iloc[:, 9:-1].replace(",", ".", regex=True).astype(float)
-        df['Gene_ID'] = df['ID'].astype(str).str.replace(r"\.\d+$", "", regex=True)
-        df.set_index('Gene_ID', inplace=True)
-
-        # Transpose for GRNBoost2 (samples as rows, genes as columns)
-        expression_matrix = df.iloc[:, 9:-1].T
-        expression_matrix.columns.name = None
-        expression_matrix.columns = expression_matrix.columns.str.replace(r'\.\d+$', '', regex=True)
+        # Parsed workbook is cached next to the Excel file (expression_data.py)
+        expression_matrix = expression_frame(excel_path)
 
         if expression_matrix.empty:
             logging.error("Expression matrix is empty after processing.")
@@ -63,12 +64,7 @@ def main():
     # === Load transcription factors ===
     logging.info("Loading transcription factor list...")
     try:
-        tf_df = pd.read_csv(tf_path, sep="\t")
-        if tf_df.empty:
-            logging.error("TF list file is empty.")
-            return
-
-        tf_names = [tf for tf in tf_df['Gene_ID'] if tf in expression_matrix.columns]
+        tf_names = load_tf_names(tf_path, expression_matrix.columns)
         if not tf_names:
             logging.warning("No TFs found in expression matrix.")
             return
@@ -79,26 +75,27 @@ def main():
         return
 
     # === Start Dask and run GRNBoost2 ===
-    logging.info("Starting Dask client...")
-    try:
-        client = Client()
-    except Exception as e:
-        logging.error(f"Failed to start Dask client: {e}")
-        return
-
     logging.info("Running GRNBoost2 (global)...")
     try:
-        network = grnboost2(expression_data=expression_matrix, tf_names=tf_names)
+        with dask_client(dask_config) as client:
+            if shard_size:
+                network = run_sharded(expression_matrix, tf_names, client, checkpoint_dir, shard_size,
+                                      report_prefix=report_prefix)
+            else:
+                network = run_grnboost2(expression_matrix, tf_names, client, report_prefix=report_prefix)
         if network.empty:
             logging.warning("GRNBoost2 returned an empty network.")
-    except Exception as e:
-        logging.error(f"GRNBoost2 failed: {e}")
+    except Exception:
+        logging.exception("GRNBoost2 failed")
+        if shard_size:
+            logging.error(f"Finished shards are kept in {checkpoint_dir}; rerun to resume")
         return
 
     # === Save output ===
     try:
         logging.info(f"Saving GRN to {output_path}...")
         network.to_csv(output_path, sep="\t", index=False)
+        write_edge_store(network, store_path(output_path))  # memory-mapped query index
         logging.info("GRNBoost2 global network saved.")
     except Exception as e:
         logging.error(f"Failed to save output: {e}")
@@ -3,122 +3,74 @@ Script Name: Gene_annotation.py
 
 Purpose:
 This script annotates FIMO motif‐scan hits with gene and genomic context:
-  1. Parses FIMO output for motif occurrences in promoter regions.
-  2. Retrieves the corresponding upstream promoter sequence for each hit.
-  3. Looks up gene coordinates (chromosome, gene start/stop, strand) from a GFF3 annotation.
-  4. Writes a combined CSV with motif ID, gene ID, hit position, sequence context, and genomic coordinates.
+  1. Streams FIMO output for motif occurrences in promoter regions.
+  2. Looks up gene coordinates (chromosome, gene start/stop, strand) from a cached GFF3 interval index and
+     lifts every hit to strand-aware genome coordinates, with the nearest gene model (genome_annotation.py).
+  3. Writes a normalized dataset (annotation_output.py): a hits table that references a gene table holding
+     each promoter sequence and the gene coordinates once, both as Parquet.
+  4. Optionally writes a flat CSV with one row per hit, carrying only the hit sequence plus flanking bases.
+  5. Writes the lifted hits as BED and lists motif sites shared by the promoters of several genes.
 
 Inputs:
 - FIMO TSV output (fimo.tsv) from MEME Suite scan of promoter FASTA.
-- FASTA file of upstream sequences (e.g., 1 kb promoters).
+- FASTA file of upstream sequences (e.g., 1 kb promoters).
 - GFF3 file of gene models (TAIR10).
 
 Output:
-- CSV file with one row per FIMO hit, including promoter sequence and gene location.
+- `<prefix>.hits.parquet` and `<prefix>.genes.parquet`, joinable on Gene_ID
+- Optional CSV file with one row per FIMO hit, including the hit sequence window and gene location.
+- BED file of the hits in genome coordinates and a CSV of shared promoter sites.
 
 Thesis Reference:
 - Section 2.5 “Gene Annotation” (maps motif occurrences to genes for functional interpretation)
 """
 
-import csv
-from collections import defaultdict
+import pandas as pd
+
+from annotation_output import write_annotation
+from genome_annotation import GenomeAnnotation, lift_hits, nearest_genes, promoter_intervals, shared_sites, write_bed
+from hit_table import stream_hits
+from promoter_store import PromoterStore
 
 # === File paths ===
 FIMO_TSV         = "/home/15712745/personal/TF_prediction_genomes/MEME/FIMO_folder/fimo_Lj_At_homolog_cluster6_ALL_plant_motifs_output/fimo.tsv"
 PROMOTER_FASTA   = "/home/15712745/personal/Gene_selection/TAIR10_upstream_1000_20101104.txt"
 GFF3_FILE        = "/home/15712745/personal/Gene_selection/TAIR10_GFF3_genes.gff"
-OUTPUT_CSV       = "/home/15712745/personal/TF_prediction_genomes/MEME/FIMO_folder/Gene_annotation_folder/annotated_fimo_results_Lotus_Cluster6.csv"
-
-def normalize_gene_id(gene_id):
-    """
-    Strip version suffix from gene ID.
-    E.g. 'AT1G01010.1' → 'AT1G01010'
-    """
-    return gene_id.split('.')[0]
-
-# === Step 1: Parse FIMO hits ===
-fimo_hits = []
-with open(FIMO_TSV, 'r', encoding='utf-8') as f:
-    reader = csv.reader(f, delimiter='\t')
-    header = next(reader, None)  # skip header
-    for row in reader:
-        if not row or row[0].startswith('#') or len(row) < 6:
-            continue
-        motif_id      = row[0]
-        raw_gene_id   = row[2]
-        start, stop   = row[3], row[4]
-        strand        = row[5]
-        gene_id       = normalize_gene_id(raw_gene_id)
-        fimo_hits.append((motif_id, gene_id, start, stop, strand))
-
-print(f"Parsed {len(fimo_hits)} FIMO hits.")
-
-# === Step 2: Load promoter sequences into a dict ===
-upstream_sequences = {}
-with open(PROMOTER_FASTA, 'r', encoding='utf-8') as fasta:
-    current_id = None
-    seq_chunks = []
-    for line in fasta:
-        line = line.rstrip()
-        if line.startswith('>'):
-            # Save previous
-            if current_id and seq_chunks:
-                upstream_sequences[current_id] = ''.join(seq_chunks)
-            # New record
-            current_id = normalize_gene_id(line[1:].split()[0])
-            seq_chunks = []
-        else:
-            seq_chunks.append(line)
-    # Save last
-    if current_id and seq_chunks:
-        upstream_sequences[current_id] = ''.join(seq_chunks)
+OUTPUT_PREFIX    = "/home/15712745/personal/TF_prediction_genomes/MEME/FIMO_folder/Gene_annotation_folder/annotated_fimo_results_Lotus_Cluster6"
+# Flat one-row-per-hit export (None to skip) and the number of flanking bases around each hit
+OUTPUT_CSV       = OUTPUT_PREFIX + ".csv"
+HIT_WINDOW       = 10
+OUTPUT_BED       = OUTPUT_PREFIX + ".bed"
+SHARED_SITES_CSV = OUTPUT_PREFIX + ".shared_sites.csv"
+
+# === Step 1: Gene models and promoter coordinates ===
+# The GFF3 is parsed once into a cached per-chromosome interval index (genome_annotation.py)
+genome = GenomeAnnotation(GFF3_FILE)
+# The indexed promoter store serves only the genes with hits instead of parsing the whole FASTA
+store = PromoterStore(PROMOTER_FASTA)
+gene_annotations = genome.gene_coordinates().join(promoter_intervals(store, genome), how="outer")
+print(f"Loaded annotations for {len(gene_annotations)} genes.")
 
-print(f"Loaded {len(upstream_sequences)} promoter sequences.")
 
-# === Step 3: Load GFF3 gene annotations ===
-gene_annotations = {}
-with open(GFF3_FILE, 'r', encoding='utf-8') as gff:
-    for line in gff:
-        if line.startswith('#'):
-            continue
-        cols = line.strip().split('\t')
-        if len(cols) < 9 or cols[2] != 'gene':
-            continue
-        chrom, source, feature, start, end, score, strand, phase, attrs = cols
-        # Parse ID from attributes field
-        try:
-            # Assumes attribute string contains "ID=ATxGxxxxx;..."
-            gene_id_raw = attrs.split('ID=')[1].split(';')[0]
-        except IndexError:
-            continue
-        gene_id = normalize_gene_id(gene_id_raw)
-        gene_annotations[gene_id] = {
-            'chromosome': chrom,
-            'gene_start': start,
-            'gene_stop':  end,
-            'strand':     strand
-        }
+def lift(hits):
+    """Genome coordinates and nearest gene model for a chunk of hits."""
+    lifted = lift_hits(hits, gene_annotations)
+    return pd.concat([lifted, nearest_genes(lifted, genome)], axis=1)
 
-print(f"Loaded annotations for {len(gene_annotations)} genes.")
 
-# === Step 4: Write annotated output ===
-with open(OUTPUT_CSV, 'w', newline='', encoding='utf-8') as out:
-    writer = csv.writer(out)
-    writer.writerow([
-        'Motif_ID','Gene_ID','Hit_Start','Hit_Stop','Hit_Strand',
-        'Promoter_Sequence','Chromosome','Gene_Start','Gene_Stop','Gene_Strand'
-    ])
+# === Step 2: Stream FIMO hits into the normalized hits/genes tables ===
+n_hits, n_genes = write_annotation(stream_hits(FIMO_TSV), store, gene_annotations, OUTPUT_PREFIX,
+                                   flat_csv=OUTPUT_CSV, window=HIT_WINDOW, transform=lift)
 
-    for motif_id, gene_id, start, stop, strand in fimo_hits:
-        seq = upstream_sequences.get(gene_id, 'N/A')
-        annot = gene_annotations.get(gene_id, {})
-        writer.writerow([
-            motif_id, gene_id, start, stop, strand,
-            seq,
-            annot.get('chromosome','N/A'),
-            annot.get('gene_start','N/A'),
-            annot.get('gene_stop','N/A'),
-            annot.get('strand','N/A')
-        ])
+print(f"Annotated {n_hits} FIMO hits in {n_genes} genes.")
+print(f"Normalized tables saved to: {OUTPUT_PREFIX}.hits.parquet and {OUTPUT_PREFIX}.genes.parquet")
+if OUTPUT_CSV:
+    print(f"Flat CSV saved to: {OUTPUT_CSV}")
 
-print(f"Annotated FIMO results saved to: {OUTPUT_CSV}")
+# === Step 3: Genome-coordinate outputs ===
+lifted = pd.read_parquet(f"{OUTPUT_PREFIX}.hits.parquet")
+n_bed = write_bed(lifted, OUTPUT_BED)
+print(f"{n_bed} hits lifted to genome coordinates: {OUTPUT_BED}")
+sites = shared_sites(lifted)
+sites.to_csv(SHARED_SITES_CSV, index=False)
+print(f"{len(sites)} motif sites shared by the promoters of several genes: {SHARED_SITES_CSV}")
@@ -7,14 +7,18 @@ in a foreground gene cluster (e.g., Cluster 3 from Arabidopsis SC samples) versu
 It visualizes significantly enriched or depleted motifs and corrects for multiple hypothesis testing.
 
 Steps:
-1. Count motif occurrences in FIMO outputs from foreground and background gene sets.
-2. Build 2x2 contingency tables per motif and run Fisher's exact test.
+1. Count motif occurrences in FIMO outputs from foreground and background gene sets with a sparse
+   gene x motif incidence matrix (motif_counts.py): hit-level counts, gene-level presence/absence
+   counts and hits per kb of promoter all come from the same matrix.
+2. Build 2x2 contingency tables for all motifs and run Fisher's exact test as one vectorized
+   operation (enrichment.py).
 3. Adjust p-values for multiple testing using Benjamini-Hochberg FDR.
 4. Filter significantly enriched motifs and plot the odds ratios.
 5. Save result tables and plots for downstream interpretation.
 
 Inputs:
 - FIMO output files (`fimo.tsv`) from MEME Suite for both foreground and background gene sets.
+- The promoter FASTA files that were scanned (gene universe for gene-level counts and densities).
 
 Outputs:
 - CSV with enrichment statistics for each motif
@@ -28,60 +32,85 @@ Thesis Reference:
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-from scipy.stats import fisher_exact
-from statsmodels.stats.multitest import multipletests
+
+from enrichment import motif_enrichment
+from hit_table import read_hits
+from motif_counts import (build_incidence, gene_counts, group_sizes, hit_counts, hit_density,
+                          membership_matrix, normalize_gene_ids)
+from pwm_scanner import read_fasta
 
 # === File paths ===
 foreground_path = "/home/15712745/personal/TF_prediction_genomes/MEME/FIMO_folder/fimo_At_cluster3_ALL_plant_motifs_output/fimo.tsv"
 background_path = "/home/15712745/personal/TF_prediction_genomes/MEME/FIMO_folder/fimo_background_cluster3_03_06_2025/fimo.tsv"
 
+# Promoter FASTA files that were scanned (defines the gene sets, including genes without hits)
+foreground_fasta = "/home/15712745/personal/Gene_selection/selected_upstream_sequences_cluster3.fasta"
+background_fasta = "/home/15712745/personal/TF_prediction_genomes/MEME/Visualization_MEME/background_cluster3_03_06_2025_promoters.fasta"
+
+# "hit": motif hits vs. all hits (original analysis); "gene": promoters with vs. without the motif,
+# so a promoter with many overlapping hits of a repeat motif counts once
+count_level = "hit"
+
 output_csv = "/home/15712745/personal/TF_prediction_genomes/MEME/FIMO_folder/fimo_At_cluster3_ALL_plant_motifs_output/At_cluster3_enrichment_results_3_6_2025.csv"
 output_plot = "/home/15712745/personal/TF_prediction_genomes/MEME/Visualization_MEME/At_cluster3_motif_enrichment_plot_ALL_plant_promoters.png"
 output_enriched_ids = "enriched_motifs_list.txt"
 
 # === Load FIMO outputs ===
-foreground = pd.read_csv(foreground_path, sep='\t')
-background = pd.read_csv(background_path, sep='\t')
+# Streamed with compact dtypes and cached next to each fimo.tsv; the '#' trailer is skipped
+foreground = read_hits(foreground_path, columns=['motif_id', 'sequence_name'])
+background = read_hits(background_path, columns=['motif_id', 'sequence_name'])
 
 print("Unique motifs in foreground:", foreground['motif_id'].nunique())
 print("Unique motifs in background:", background['motif_id'].nunique())
 
-# === Count motif occurrences ===
-foreground_counts = foreground['motif_id'].value_counts().reset_index()
-foreground_counts.columns = ['motif_id', 'count_fg']
-
-background_counts = background['motif_id'].value_counts().reset_index()
-background_counts.columns = ['motif_id', 'count_bg']
-
-# === Merge counts and fill missing values with 0 ===
-merged = pd.merge(foreground_counts, background_counts, on='motif_id', how='outer').fillna(0)
-
-# === Total hits ===
-total_fg = len(foreground)
-total_bg = len(background)
-
-# === Fisher's Exact Test per motif ===
-results = []
-for _, row in merged.iterrows():
-    a = int(row['count_fg'])  # motif in foreground
-    b = int(row['count_bg'])  # motif in background
-    c = total_fg - a          # non-motif in foreground
-    d = total_bg - b          # non-motif in background
-
-    oddsratio, pvalue = fisher_exact([[a, c], [b, d]])
-
-    results.append({
-        'Motif': row['motif_id'],
-        'Foreground_Count': a,
-        'Background_Count': b,
-        'Odds_Ratio': oddsratio,
-        'P_Value': pvalue
-    })
-
-enrichment_df = pd.DataFrame(results)
-
-# === Multiple testing correction ===
-enrichment_df['Adj_P_Value'] = multipletests(enrichment_df['P_Value'], method='fdr_bh')[1]
+# === Gene universe: every scanned promoter, including those without any hit ===
+fg_genes, fg_seqs = read_fasta(foreground_fasta)
+bg_genes, bg_seqs = read_fasta(background_fasta)
+gene_ids = list(normalize_gene_ids(fg_genes + bg_genes))
+# Keyed by normalized gene ID: build_incidence drops repeated IDs (transcript versions, genes in both files)
+lengths_by_gene = pd.Series([len(seq) for seq in fg_seqs + bg_seqs], index=gene_ids)
+lengths_by_gene = lengths_by_gene[~lengths_by_gene.index.duplicated()]
+
+# === Sparse gene x motif incidence matrix, built from all hits in one pass ===
+hits = pd.concat([foreground, background], ignore_index=True)
+motif_ids = sorted(set(foreground['motif_id'].astype(str)) | set(background['motif_id'].astype(str)))
+incidence = build_incidence(hits, gene_ids=gene_ids, motif_ids=motif_ids)
+membership, _ = membership_matrix(incidence.gene_ids, {'foreground': fg_genes, 'background': bg_genes})
+
+# Hit level: motif hits vs. all other hits; gene level: promoters with vs. without the motif
+hits_fg, hits_bg = hit_counts(incidence, membership)
+genes_fg, genes_bg = gene_counts(incidence, membership)
+density_fg, density_bg = hit_density(incidence, membership, lengths_by_gene.reindex(incidence.gene_ids).to_numpy())
+n_genes_fg, n_genes_bg = group_sizes(membership)
+
+# === Fisher's Exact Test for all motifs at once ===
+# Contingency table per motif: [[motif in fg, non-motif in fg], [motif in bg, non-motif in bg]]
+hit_stats = motif_enrichment(hits_fg, hits_fg.sum(), hits_bg, hits_bg.sum())
+gene_stats = motif_enrichment(genes_fg, n_genes_fg, genes_bg, n_genes_bg)
+stats, counts_fg, counts_bg = {
+    'hit': (hit_stats, hits_fg, hits_bg),
+    'gene': (gene_stats, genes_fg, genes_bg),
+}[count_level]
+
+enrichment_df = pd.DataFrame({
+    'Motif': motif_ids,
+    'Foreground_Count': counts_fg,
+    'Background_Count': counts_bg,
+    'Odds_Ratio': stats['odds_ratio'],
+    'P_Value': stats['pvalue'],
+    # Multiple testing correction (Benjamini-Hochberg)
+    'Adj_P_Value': stats['qvalue'],
+    # Both counting levels and the hit density are always reported
+    'Foreground_Hits': hits_fg,
+    'Background_Hits': hits_bg,
+    'Hit_Adj_P_Value': hit_stats['qvalue'],
+    'Foreground_Genes': genes_fg,
+    'Background_Genes': genes_bg,
+    'Gene_Adj_P_Value': gene_stats['qvalue'],
+    'Foreground_Hits_per_kb': density_fg,
+    'Background_Hits_per_kb': density_bg,
+})
+print(f"Counting level: {count_level} ({n_genes_fg} foreground / {n_genes_bg} background promoters)")
 
 # === Filter significant motifs ===
 significant = enrichment_df[enrichment_df['Adj_P_Value'] < 0.05]
@@ -3,16 +3,24 @@ Script Name: Shuffled_control_At_100_times.py
 
 Purpose:
 This script performs a full shuffled sequence control for motif enrichment in Arabidopsis Cluster 3:
-1. Shuffles real promoter sequences 100 times
-2. Runs FIMO on real and shuffled sets
-3. Computes empirical p-values based on motif score sums
+1. Shuffles real promoter sequences 100 times, all in memory with a seeded generator (null_model.py).
+   `--shuffle mono` permutes single bases (original behaviour), `--shuffle di` preserves dinucleotide
+   counts and `--shuffle k --kmer K` preserves K-mer counts.
+   With `--adaptive`, shuffles are generated in rounds and motifs are retired once their p-value is
+   clearly non-significant (Besag-Clifford sequential Monte Carlo), so borderline motifs can receive
+   thousands of shuffles and p-values are no longer capped at 1/101.
+2. Scans real and shuffled sets in-process with the PWM scanner (pwm_scanner.py, FIMO-compatible scores)
+3. Computes empirical p-values based on motif score sums (no intermediate FASTA or FIMO files)
 4. Applies multiple testing correction (FDR)
 5. Visualizes significantly enriched motifs
 
+Usage:
+    python Shuffled_control_At_100_times.py [--shuffle {mono,di,k}] [--kmer K] [--seed SEED] [--num-shuffles N]
+        [--adaptive [--max-shuffles N] [--exceedances H]]
+
 Inputs:
 - Real promoter FASTA file for Cluster 3
 - JASPAR motif file (.meme format)
-- FIMO must be installed and accessible
 
 Outputs:
 - Empirical p-values and FDR-adjusted CSV
@@ -24,91 +32,81 @@ Thesis Reference:
 - Complements Fisher’s exact test (see Motif_distribution_visualization.py)
 """
 
-import os
-import random
-import subprocess
-from collections import defaultdict
+import argparse
 
 import pandas as pd
-from Bio import SeqIO
 from statsmodels.stats.multitest import multipletests
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from null_model import SHUFFLE_MODES, adaptive_pvalues, real_score_sums, shuffled_score_sums
+from pwm_scanner import encode_sequences, load_pssms, read_fasta
+
 # === Config ===
 input_fasta = "/home/15712745/personal/Gene_selection/selected_upstream_sequences_cluster3.fasta"
-shuffled_fasta_base = "/home/15712745/personal/TF_prediction_genomes/MEME/FIMO_folder/Shuffled_control/shuffled_promoters_Arabidopsis_Cluster3_"
-fimo_output_shuffled_base = "/home/15712745/personal/TF_prediction_genomes/MEME/FIMO_folder/Shuffled_control/fimo_shuffled_output_Arabidopsis_Cluster3_"
-fimo_output_real = "/home/15712745/personal/TF_prediction_genomes/MEME/FIMO_folder/Shuffled_control/fimo_real_output_Arabidopsis_Cluster3"
 motif_file = "/home/15712745/personal/TF_prediction_genomes/TF_bindingsite_motifs/ALL_plant_motifs_JASPAR.meme"
 result_csv = "/home/15712745/personal/TF_prediction_genomes/MEME/FIMO_folder/Shuffled_control/fimo_score_pval_comparison_Arabidopsis_Cluster3.csv"
 filtered_csv = "/home/15712745/personal/TF_prediction_genomes/MEME/FIMO_folder/Shuffled_control/fdr_significant_motifs_Cluster3.csv"
 barplot_path = "/home/15712745/personal/TF_prediction_genomes/MEME/FIMO_folder/Shuffled_control/fdr_corrected_enriched_motifs_barplot_7_6_2025.png"
 scatterplot_path = "/home/15712745/personal/TF_prediction_genomes/MEME/FIMO_folder/Shuffled_control/fdr_corrected_motif_score_scatter_7_6_2025.png"
 num_shuffles = 100
+random_seed = 2025
+
+# Adaptive mode: stop testing a motif after h exceedances, up to max_shuffles shuffles
+adaptive_h = 10
+adaptive_round_size = 100
+adaptive_max_shuffles = 10000
 
 # === Functions ===
 
-def shuffle_sequence(sequence):
-    """Return a randomly shuffled version of a sequence."""
-    seq_list = list(sequence)
-    random.shuffle(seq_list)
-    return ''.join(seq_list)
-
-def run_fimo(input_fasta, output_dir):
-    """Run FIMO on a given input FASTA."""
-    cmd = f"fimo --oc {output_dir} {motif_file} {input_fasta}"
-    subprocess.run(cmd, shell=True, check=True)
-
-def generate_shuffled_controls():
-    """Generate shuffled promoter sequences and run FIMO."""
-    os.makedirs(fimo_output_real, exist_ok=True)
-    run_fimo(input_fasta, fimo_output_real)
-
-    for i in range(num_shuffles):
-        print(f"Shuffle round {i+1}/{num_shuffles}")
-        shuffled_fasta = f"{shuffled_fasta_base}{i}.f"
-        fimo_dir = f"{fimo_output_shuffled_base}{i}"
-        os.makedirs(fimo_dir, exist_ok=True)
-
-        with open(shuffled_fasta, "w") as out:
-            for record in SeqIO.parse(input_fasta, "fasta"):
-                shuffled = shuffle_sequence(record.seq)
-                out.write(f">{record.id}_shuffled\n{shuffled}\n")
-
-        run_fimo(shuffled_fasta, fimo_dir)
-
-def compute_empirical_pvalues():
-    """Calculate empirical p-values and adjust with FDR."""
-    real_fimo = os.path.join(fimo_output_real, "fimo.tsv")
-    real_df = pd.read_csv(real_fimo, sep='\t')
-    real_scores = real_df.groupby('motif_id')['score'].sum()
-
-    shuffled_scores = defaultdict(list)
-    for i in range(num_shuffles):
-        tsv = os.path.join(f"{fimo_output_shuffled_base}{i}", "fimo.tsv")
-        if not os.path.exists(tsv):
-            print(f"Missing FIMO shuffle file {i}")
-            continue
-        df = pd.read_csv(tsv, sep='\t')
-        scores = df.groupby('motif_id')['score'].sum()
-        for motif in set(scores.index).union(real_scores.index):
-            shuffled_scores[motif].append(scores.get(motif, 0))
-
-    results = []
-    for motif in real_scores.index:
-        real_score = real_scores[motif]
-        shuf_scores = shuffled_scores[motif]
-        p_val = (sum(s >= real_score for s in shuf_scores) + 1) / (len(shuf_scores) + 1)
-        mean_shuffled = sum(shuf_scores) / len(shuf_scores)
-        results.append({
-            'motif_id': motif,
-            'Real_Score_Sum': real_score,
-            'Shuffled_Mean_Score': mean_shuffled,
-            'P_Value': p_val
-        })
-
-    df = pd.DataFrame(results)
+def load_real_scores():
+    """Load motifs and promoters and compute the real per-motif score sums."""
+    pssms, background = load_pssms(motif_file)
+    _, sequences = read_fasta(input_fasta)
+    codes = encode_sequences(sequences)
+
+    real_scores, real_counts = real_score_sums(codes, pssms, background)
+    return codes, pssms, background, real_scores[real_counts > 0]
+
+def generate_shuffled_controls(kmer_size=1, seed=random_seed, n_shuffles=num_shuffles):
+    """
+    Scan the real promoters and a batch of in-memory shuffles; return per-motif score sums.
+    kmer_size is the length of the k-mers preserved by the shuffle (1 = mononucleotide).
+    """
+    codes, pssms, background, real_scores = load_real_scores()
+
+    print(f"Scanning {n_shuffles} shuffles ({kmer_size}-mer preserving) of {len(codes)} promoters...")
+    shuffled_scores = shuffled_score_sums(codes, pssms, background, n_shuffles, seed=seed, k=kmer_size)
+    return real_scores, shuffled_scores
+
+def compute_empirical_pvalues(real_scores, shuffled_scores):
+    """
+    Calculate empirical p-values and adjust with FDR.
+    real_scores is a Series of motif score sums; shuffled_scores has one row per shuffle and one column per motif.
+    """
+    shuf = shuffled_scores.reindex(columns=real_scores.index, fill_value=0)
+    exceed = (shuf.values >= real_scores.values).sum(axis=0)
+
+    df = pd.DataFrame({
+        'motif_id': real_scores.index,
+        'Real_Score_Sum': real_scores.values,
+        'Shuffled_Mean_Score': shuf.mean(axis=0).values,
+        'P_Value': (exceed + 1) / (len(shuf) + 1)
+    })
+    return adjust_and_save(df)
+
+def compute_adaptive_pvalues(kmer_size=1, seed=random_seed, max_shuffles=adaptive_max_shuffles, h=adaptive_h):
+    """Besag-Clifford sequential p-values: motifs are retired after h exceedances."""
+    codes, pssms, background, real_scores = load_real_scores()
+    print(f"Adaptive shuffling ({kmer_size}-mer preserving): h={h}, up to {max_shuffles} shuffles per motif")
+    df = adaptive_pvalues(codes, pssms, background, real_scores, h=h, round_size=adaptive_round_size,
+                          max_shuffles=max_shuffles, seed=seed, k=kmer_size)
+    print(f"Total motif-shuffles scanned: {df['Num_Shuffles'].sum()} "
+          f"(fixed design: {len(df) * max_shuffles})")
+    return adjust_and_save(df)
+
+def adjust_and_save(df):
+    """Add FDR-adjusted p-values and score differences, then save the table."""
     df['Adjusted_P'] = multipletests(df['P_Value'], method='fdr_bh')[1]
     df['Score_Difference'] = df['Real_Score_Sum'] - df['Shuffled_Mean_Score']
     df['Significant'] = df['Adjusted_P'] < 0.05
@@ -163,9 +161,29 @@ def visualize_results(df):
     print(f"Filtered significant motifs saved to: {filtered_csv}")
 
 # === Execute Pipeline ===
+def parse_args():
+    parser = argparse.ArgumentParser(description="Shuffled sequence control for motif enrichment.")
+    parser.add_argument("--shuffle", choices=["mono", "di", "k"], default="mono",
+                        help="Shuffle model: mononucleotide, dinucleotide or k-mer preserving (default: mono)")
+    parser.add_argument("--kmer", type=int, default=3, help="k-mer size preserved with --shuffle k (default: 3)")
+    parser.add_argument("--seed", type=int, default=random_seed, help="Random seed for the shuffles")
+    parser.add_argument("--num-shuffles", type=int, default=num_shuffles, help="Number of shuffled sets")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Sequential (Besag-Clifford) permutation test instead of a fixed number of shuffles")
+    parser.add_argument("--max-shuffles", type=int, default=adaptive_max_shuffles,
+                        help="Maximum shuffles per motif in adaptive mode")
+    parser.add_argument("--exceedances", type=int, default=adaptive_h,
+                        help="Exceedances after which a motif is retired in adaptive mode (h)")
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
+    kmer_size = SHUFFLE_MODES.get(args.shuffle, args.kmer)
     print("Starting shuffled control analysis for Cluster 3...")
-    generate_shuffled_controls()
-    result_df = compute_empirical_pvalues()
+    if args.adaptive:
+        result_df = compute_adaptive_pvalues(kmer_size, args.seed, args.max_shuffles, args.exceedances)
+    else:
+        real_scores, shuffled_scores = generate_shuffled_controls(kmer_size, args.seed, args.num_shuffles)
+        result_df = compute_empirical_pvalues(real_scores, shuffled_scores)
     visualize_results(result_df)
     print("Full analysis complete.")
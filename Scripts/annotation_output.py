@@ -0,0 +1,116 @@
+"""
+Script Name: annotation_output.py
+
+Purpose:
+Normalized output for annotated motif hits. Instead of copying the full 1 kb promoter into every hit row,
+the annotation is written as two tables that reference each other by Gene_ID:
+  - `<prefix>.hits.parquet`  : one row per hit (Motif_ID, Gene_ID, Hit_Start, Hit_Stop, Hit_Strand, score,
+                               p-value), streamed chunk by chunk from the hit table
+  - `<prefix>.genes.parquet` : one row per gene with hits (promoter sequence and GFF3 gene coordinates)
+Join them on Gene_ID, e.g. pd.read_parquet(hits).merge(pd.read_parquet(genes), on="Gene_ID").
+An optional flat CSV keeps the old one-row-per-hit layout, but carries only the hit subsequence plus a
+window of flanking bases instead of the whole promoter.
+
+Inputs:
+- Hit table chunks (hit_table.stream_hits), PromoterStore, gene coordinates from the GFF3
+
+Outputs:
+- Hits and genes Parquet tables, optional flat CSV
+
+Thesis Reference:
+- Section 2.5 "Gene Annotation"
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from promoter_store import normalize_gene_id
+
+GENE_COLUMNS = ["Chromosome", "Gene_Start", "Gene_Stop", "Gene_Strand"]
+
+
+def normalize_hits(chunk):
+    """Hit table chunk (FIMO column names) → hits table rows with version-free gene IDs."""
+    names = chunk["sequence_name"].astype(str)
+    gene_ids = pd.Series(names.unique()).map(normalize_gene_id)
+    hits = pd.DataFrame({
+        "Motif_ID": chunk["motif_id"].astype(str).to_numpy(),
+        "Gene_ID": names.map(dict(zip(names.unique(), gene_ids))).to_numpy(),
+        "Hit_Start": chunk["start"].to_numpy(dtype=np.int32),
+        "Hit_Stop": chunk["stop"].to_numpy(dtype=np.int32),
+        "Hit_Strand": chunk["strand"].astype(str).to_numpy(),
+    })
+    for col in ("score", "p-value"):
+        if col in chunk:
+            hits[col] = chunk[col].to_numpy(dtype=np.float32)
+    return hits
+
+
+def promoter_gene_table(gene_ids, store, gene_annotations):
+    """
+    One row per gene: promoter sequence and length from the PromoterStore and GFF3 coordinates
+    (gene_annotations indexed by Gene_ID with GENE_COLUMNS and optionally further columns such as the
+    promoter coordinates from genome_annotation.promoter_intervals; missing genes get empty values).
+    """
+    found, sequences = store.fetch(sorted(gene_ids))
+    genes = pd.DataFrame({"Gene_ID": sorted(gene_ids)})
+    promoters = pd.DataFrame({"Gene_ID": found, "Promoter_Sequence": sequences})
+    promoters["Promoter_Length"] = promoters["Promoter_Sequence"].str.len().astype(np.int32)
+    genes = genes.merge(promoters, on="Gene_ID", how="left")
+    genes = genes.merge(gene_annotations, left_on="Gene_ID", right_index=True, how="left")
+    return genes.astype({"Promoter_Length": "Int32", "Gene_Start": "Int64", "Gene_Stop": "Int64"})
+
+
+def hit_sequences(hits, promoters, window=0):
+    """Hit subsequence with `window` flanking bases on each side (FIMO positions are 1-based, inclusive)."""
+    sequence_of = promoters.set_index("Gene_ID")["Promoter_Sequence"].dropna().to_dict()
+    starts = np.maximum(hits["Hit_Start"].to_numpy() - 1 - window, 0)
+    stops = hits["Hit_Stop"].to_numpy() + window
+    return [sequence_of.get(gene, "")[a:b] for gene, a, b in zip(hits["Gene_ID"], starts, stops)]
+
+
+def write_annotation(hit_chunks, store, gene_annotations, output_prefix, flat_csv=None, window=0,
+                     transform=None):
+    """
+    Stream hit chunks into `<prefix>.hits.parquet`, then write `<prefix>.genes.parquet` for the genes
+    that have hits. transform, if given, adds columns to every normalized hits chunk (e.g. genome
+    coordinates from genome_annotation.lift_hits) before it is written. With flat_csv, a one-row-per-hit CSV with the hit window sequence is written as well
+    (promoters are fetched per chunk, so memory stays bounded by the chunk size).
+    Returns (number of hits, number of genes).
+    """
+    hits_path, genes_path = f"{output_prefix}.hits.parquet", f"{output_prefix}.genes.parquet"
+    writer = None
+    gene_ids = set()
+    n_hits = 0
+    csv_started = False
+    try:
+        for chunk in hit_chunks:
+            hits = normalize_hits(chunk)
+            if transform is not None:
+                hits = transform(hits)
+            table = pa.Table.from_pandas(hits, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(hits_path, table.schema)
+            writer.write_table(table)
+            gene_ids.update(hits["Gene_ID"].unique())
+            n_hits += len(hits)
+
+            if flat_csv:
+                promoters = promoter_gene_table(set(hits["Gene_ID"]), store, gene_annotations)
+                flat = hits.merge(promoters.drop(columns=["Promoter_Sequence"]), on="Gene_ID", how="left")
+                flat.insert(5, "Hit_Sequence", hit_sequences(hits, promoters, window))
+                flat = flat.drop(columns=[col for col in flat.columns if col.startswith("Promoter_")])
+                flat.to_csv(flat_csv, mode="a" if csv_started else "w", header=not csv_started,
+                            index=False, na_rep="N/A")
+                csv_started = True
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        pd.DataFrame({"Motif_ID": [], "Gene_ID": [], "Hit_Start": pd.Series(dtype=np.int32),
+                      "Hit_Stop": pd.Series(dtype=np.int32), "Hit_Strand": []}).to_parquet(hits_path, index=False)
+
+    promoter_gene_table(gene_ids, store, gene_annotations).to_parquet(genes_path, index=False)
+    return n_hits, len(gene_ids)
@@ -0,0 +1,158 @@
+"""
+Script Name: background_sampler.py
+
+Purpose:
+Expression-matched background selection for motif enrichment, without replacement.
+The previous nearest-neighbour matching (sklearn NearestNeighbors, n_neighbors=1) let many foreground
+genes map to the same background gene, and the later `.unique()` silently shrank the background.
+Here every foreground gene receives k distinct controls and no background gene is used twice:
+  - one covariate (e.g. avg_expr): the pool is sorted once, all foreground values are located with a
+    single np.searchsorted, and each match takes the closest still-unused neighbour on either side
+    (free slots are tracked with path-compressed "next free" pointers, so a match costs ~O(1))
+  - several covariates (e.g. expression, promoter GC, CDS length): covariates are scaled by their pool
+    standard deviation and matched through a scipy cKDTree, again taking the nearest unused gene
+Foreground genes are processed in a seeded random order (one control per gene per round), so no gene is
+systematically favoured and results are reproducible. Resampled backgrounds (bootstrap of the
+foreground genes, then matching) are cheap enough to build hundreds per cluster; their counts can be
+tested in one call with enrichment.enrichment_table (one cluster against many backgrounds).
+
+Inputs:
+- Expression table with a cluster column, gene IDs and the covariate columns
+
+Outputs:
+- DataFrame of matched background genes with the foreground gene each one is matched to
+
+Thesis Reference:
+- Section 2.4.2: Background Gene Selection for Motif Enrichment
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def _find(parent, i):
+    """Follow 'next free' pointers to the first free slot, compressing the path."""
+    root = i
+    while parent[root] != root:
+        root = parent[root]
+    while parent[i] != root:
+        parent[i], i = root, parent[i]
+    return root
+
+
+def _match_sorted(fg_values, pool_values, k, rng):
+    """Nearest-unused matching on one covariate. Returns (n_fg, k) pool indices."""
+    # Random order before the stable sort breaks ties between equal pool values at random
+    shuffled = rng.permutation(len(pool_values))
+    sorted_idx = shuffled[np.argsort(pool_values[shuffled], kind="stable")]
+    sorted_values = pool_values[sorted_idx].tolist()
+    starts = np.searchsorted(pool_values[sorted_idx], fg_values).tolist()
+
+    n = len(sorted_values)
+    right = list(range(n + 1))  # right[i]: first free slot >= i (n: none)
+    left = list(range(n + 1))   # left[i]: first free slot < i, stored as slot + 1 (0: none)
+    matches = np.empty((len(fg_values), k), dtype=np.int64)
+    for round_number in range(k):
+        for i in rng.permutation(len(fg_values)).tolist():
+            value, start = fg_values[i], starts[i]
+            r = _find(right, start)
+            l = _find(left, start) - 1
+            if l < 0 or (r < n and sorted_values[r] - value <= value - sorted_values[l]):
+                slot = r
+            else:
+                slot = l
+            right[slot] = slot + 1
+            left[slot + 1] = slot
+            matches[i, round_number] = sorted_idx[slot]
+    return matches
+
+
+def _match_kdtree(fg_values, pool_values, k, rng):
+    """Nearest-unused matching on several covariates through a KD-tree. Returns (n_fg, k) pool indices."""
+    scale = pool_values.std(axis=0)
+    scale[scale == 0] = 1.0
+    tree = cKDTree(pool_values / scale)
+    fg_scaled = fg_values / scale
+
+    n = len(pool_values)
+    n_query = min(n, 4 * k + 4)
+    _, neighbours = tree.query(fg_scaled, k=n_query)
+    neighbours = neighbours.reshape(len(fg_values), -1)
+    used = np.zeros(n, dtype=bool)
+    matches = np.empty((len(fg_values), k), dtype=np.int64)
+    for round_number in range(k):
+        for i in rng.permutation(len(fg_values)):
+            candidates = neighbours[i][~used[neighbours[i]]]
+            query_size = n_query
+            while len(candidates) == 0:
+                # All precomputed neighbours are taken; widen the search for this gene
+                query_size = min(n, query_size * 2)
+                _, wider = tree.query(fg_scaled[i], k=query_size)
+                wider = np.atleast_1d(wider)
+                candidates = wider[~used[wider]]
+            used[candidates[0]] = True
+            matches[i, round_number] = candidates[0]
+    return matches
+
+
+def match_controls(fg_values, pool_values, k=1, seed=None):
+    """
+    Match k distinct controls to every foreground value without replacement.
+    Values are 1-D (one covariate) or (n, n_covariates). Returns an (n_fg, k) array of pool indices.
+    seed may be an int, a SeedSequence or a Generator.
+    """
+    fg_values = np.asarray(fg_values, dtype=float)
+    pool_values = np.asarray(pool_values, dtype=float)
+    if k * len(fg_values) > len(pool_values):
+        raise ValueError(f"Background pool ({len(pool_values)} genes) is too small for "
+                         f"{k} controls per foreground gene ({len(fg_values)} genes).")
+    rng = np.random.default_rng(seed)
+
+    if fg_values.ndim == 1 or fg_values.shape[1] == 1:
+        return _match_sorted(fg_values.reshape(-1), pool_values.reshape(-1), k, rng)
+    return _match_kdtree(fg_values, pool_values, k, rng)
+
+
+def _split_cluster(df, cluster, covariates, cluster_column):
+    covariates = list(covariates)
+    usable = df.dropna(subset=covariates)
+    if len(usable) < len(df):
+        print(f"Skipping {len(df) - len(usable)} genes with missing covariates ({', '.join(covariates)})")
+    foreground_df = usable[usable[cluster_column] == cluster]
+    background_pool = usable[usable[cluster_column] != cluster]
+    if len(foreground_df) == 0 or len(background_pool) == 0:
+        raise ValueError("Foreground or background pool is empty — check clustering column or input file.")
+    return foreground_df, background_pool
+
+
+def _matched_rows(foreground_df, background_pool, covariates, k, seed):
+    covariates = list(covariates)
+    matches = match_controls(foreground_df[covariates].to_numpy(), background_pool[covariates].to_numpy(), k, seed)
+    matched = background_pool.iloc[matches.ravel()].copy()
+    matched['matched_to'] = np.repeat(foreground_df['ID'].to_numpy(), k)
+    return matched
+
+
+def sample_background(df, cluster, covariates=("avg_expr",), k=1, seed=None, cluster_column="cl"):
+    """
+    Background genes matched to the genes of one cluster: k distinct controls per foreground gene,
+    drawn from the genes outside the cluster. Returns the matched rows with a 'matched_to' column.
+    """
+    foreground_df, background_pool = _split_cluster(df, cluster, covariates, cluster_column)
+    return _matched_rows(foreground_df, background_pool, covariates, k, seed)
+
+
+def bootstrap_backgrounds(df, cluster, n_backgrounds, covariates=("avg_expr",), k=1, seed=None,
+                          cluster_column="cl"):
+    """
+    Resampled backgrounds for a bootstrap of the enrichment test. Each replicate resamples the foreground
+    genes with replacement and matches k controls per drawn gene without replacement.
+    Every replicate has its own seed stream derived from seed. Returns a list of matched-row DataFrames.
+    """
+    foreground_df, background_pool = _split_cluster(df, cluster, covariates, cluster_column)
+    backgrounds = []
+    for replicate_seed in np.random.SeedSequence(seed).spawn(n_backgrounds):
+        rng = np.random.default_rng(replicate_seed)
+        resampled = foreground_df.iloc[rng.integers(len(foreground_df), size=len(foreground_df))]
+        backgrounds.append(_matched_rows(resampled, background_pool, covariates, k, rng))
+    return backgrounds
@@ -0,0 +1,138 @@
+"""
+Script Name: edge_store.py
+
+Purpose:
+Compact columnar store for GRNBoost2 edge lists, so downstream steps can query the network without
+reloading the full TSV with pandas. The store is a directory `<network>.edges/` of .npy files that are
+opened memory-mapped:
+  - `names.npy`          : sorted gene names (string dictionary); a gene's code is its position
+  - `tf.npy`, `target.npy` : int32 codes, edges sorted by TF and by decreasing importance within a TF
+  - `importance.npy`     : float64 importance (plus float64 columns such as frequency for consensus networks),
+                           the values of the TSV, so thresholds select the same edges as on the TSV
+  - `tf_offsets.npy`     : edges of TF code c are rows tf_offsets[c]:tf_offsets[c + 1]
+  - `by_target.npy`, `target_offsets.npy` : edge rows grouped by target, for regulator queries
+  - `by_importance.npy`  : edge rows in order of decreasing importance, for threshold queries
+Queries only touch the rows they return: targets of a TF and regulators of a gene are offset lookups,
+edges above an importance threshold are a binary search over by_importance.
+
+Inputs:
+- GRNBoost2 edge list DataFrame (TF, target, importance[, consensus columns])
+
+Outputs:
+- Edge store directory next to the network TSV
+
+Thesis Reference:
+- Section 2.6: "Gene Regulatory Network Inference"
+"""
+
+import bisect
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+_INDEX_FILES = ("names", "tf", "target", "tf_offsets", "by_target", "target_offsets", "by_importance")
+# Bumped when the layout changes; stores of another format are rebuilt (format 2: float64 value columns)
+_FORMAT = 2
+
+
+def store_path(network_path):
+    """Default store directory for a network TSV."""
+    return network_path + ".edges"
+
+
+def store_is_current(network_path):
+    """True when the edge store of a network TSV exists, has the current format and is not older than the TSV."""
+    meta = os.path.join(store_path(network_path), "meta.json")
+    if not os.path.exists(meta) or os.path.getmtime(meta) < os.path.getmtime(network_path):
+        return False
+    with open(meta) as handle:
+        return json.load(handle).get("format") == _FORMAT
+
+
+def write_edge_store(network, path, source="TF", target="target"):
+    """Write an edge list as a memory-mappable edge store directory. Returns the path."""
+    os.makedirs(path, exist_ok=True)
+    codes, names = pd.factorize(pd.concat([network[source], network[target]], ignore_index=True).astype(str),
+                                sort=True)
+    names = names.to_numpy(dtype=str)
+    n_edges = len(network)
+    tf_codes, target_codes = codes[:n_edges].astype(np.int32), codes[n_edges:].astype(np.int32)
+    importance = network["importance"].to_numpy(dtype=np.float64)
+    order = np.lexsort((-importance, tf_codes))
+    tf_codes, target_codes = tf_codes[order], target_codes[order]
+    importance = importance[order]
+
+    columns = [col for col in network.columns
+               if col not in (source, target) and pd.api.types.is_numeric_dtype(network[col])]
+    arrays = {
+        "names": names,
+        "tf": tf_codes,
+        "target": target_codes,
+        "tf_offsets": np.r_[0, np.cumsum(np.bincount(tf_codes, minlength=len(names)))].astype(np.int64),
+        "by_target": np.argsort(target_codes, kind="stable").astype(np.int64),
+        "target_offsets": np.r_[0, np.cumsum(np.bincount(target_codes, minlength=len(names)))].astype(np.int64),
+        "by_importance": np.argsort(-importance, kind="stable").astype(np.int64),
+    }
+    arrays.update({col: network[col].to_numpy(dtype=np.float64)[order] for col in columns})
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), array)
+    with open(os.path.join(path, "meta.json"), "w") as meta:
+        json.dump({"format": _FORMAT, "n_edges": n_edges, "columns": columns}, meta)
+    return path
+
+
+class EdgeStore:
+    """Memory-mapped read access to an edge store written by write_edge_store."""
+
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json")) as meta:
+            meta = json.load(meta)
+        self.n_edges = meta["n_edges"]
+        self.columns = meta["columns"]
+        # np.load cannot memory-map a zero-length array
+        mode = "r" if self.n_edges else None
+        self.names = np.load(os.path.join(path, "names.npy"))
+        for name in _INDEX_FILES[1:] + tuple(self.columns):
+            setattr(self, "_" + name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode))
+
+    def __len__(self):
+        return self.n_edges
+
+    def code(self, gene):
+        """Code of a gene name, or -1 when it is not in the network."""
+        pos = int(np.searchsorted(self.names, gene))
+        return pos if pos < len(self.names) and self.names[pos] == gene else -1
+
+    def _rows(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        frame = pd.DataFrame({"TF": self.names[self._tf[rows]], "target": self.names[self._target[rows]]})
+        for col in self.columns:
+            frame[col] = getattr(self, "_" + col)[rows]
+        return frame
+
+    def targets_of(self, tf):
+        """Edges regulated by one TF, by decreasing importance."""
+        code = self.code(tf)
+        if code < 0:
+            return self._rows([])
+        return self._rows(np.arange(self._tf_offsets[code], self._tf_offsets[code + 1]))
+
+    def regulators_of(self, gene):
+        """Edges pointing to one gene, by decreasing importance."""
+        code = self.code(gene)
+        if code < 0:
+            return self._rows([])
+        frame = self._rows(self._by_target[self._target_offsets[code]:self._target_offsets[code + 1]])
+        return frame.sort_values("importance", ascending=False, kind="stable").reset_index(drop=True)
+
+    def edges_above(self, threshold):
+        """Edges with importance > threshold, by decreasing importance."""
+        stop = bisect.bisect_left(self._by_importance, -threshold, key=lambda row: -self._importance[row])
+        # bisect_left stops before the first importance <= threshold
+        return self._rows(self._by_importance[:stop])
+
+    def to_frame(self):
+        """The whole edge list as a DataFrame (sorted by TF)."""
+        return self._rows(np.arange(self.n_edges))
@@ -0,0 +1,161 @@
+"""
+Script Name: expression_data.py
+
+Purpose:
+Shared, cached loader for the expression workbooks (Expression_data_At.xlsx). The workbook is parsed only
+once: decimal commas are converted, gene IDs are stripped of their version suffix and the expression values
+are stored as a float32 samples x genes matrix.
+The result is cached next to the workbook, keyed by a hash of the workbook contents:
+  - `<xlsx>.<hash>.expression.npz` : float32 matrix, sample names and gene IDs
+  - `<xlsx>.<hash>.genes.feather`  : per-gene metadata columns (ID, annotation, cluster label `cl`, ...)
+Later loads read the binary cache in well under a second; editing the workbook changes the hash and
+rebuilds the cache automatically (stale caches are removed).
+
+Layout of the expression workbook: metadata columns first, the expression samples in columns 10 up to the
+second-to-last column, and the cluster label `cl` last.
+
+Inputs:
+- Expression workbook (.xlsx), TF list (TSV with a Gene_ID column)
+
+Outputs:
+- ExpressionData named tuple, pandas DataFrames for GRNBoost2 and background selection
+
+Thesis Reference:
+- Sections 2.4.2 and 2.6: background selection and GRN inference
+"""
+
+import glob
+import hashlib
+import os
+import re
+import warnings
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+ExpressionData = namedtuple("ExpressionData", ["matrix", "samples", "gene_ids", "genes"])
+
+# Expression samples in the workbook: columns 10 up to the second-to-last column
+EXPRESSION_COLUMNS = slice(9, -1)
+
+
+def strip_version(ids):
+    """Remove transcript version suffixes, e.g. 'AT1G01010.1' → 'AT1G01010'."""
+    return pd.Series(ids, dtype=str).str.replace(r"\.\d+$", "", regex=True).to_numpy()
+
+
+def source_hash(path):
+    """Short content hash of a file, used as cache key."""
+    digest = hashlib.blake2b(digest_size=8)
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def frame_hash(frame):
+    """Short content hash of a DataFrame (index, columns and values), e.g. a filtered expression matrix."""
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update("\t".join(map(str, frame.index)).encode())
+    digest.update("\t".join(map(str, frame.columns)).encode())
+    digest.update(np.ascontiguousarray(frame.to_numpy(dtype=np.float64)).tobytes())
+    return digest.hexdigest()
+
+
+def _cache_path(path, suffix):
+    return f"{path}.{source_hash(path)}{suffix}"
+
+
+def _remove_stale(path, suffix, current):
+    pattern = re.compile(re.escape(path) + r"\.[0-9a-f]{16}" + re.escape(suffix) + "$")
+    for stale in glob.glob(f"{glob.escape(path)}.*{suffix}"):
+        if stale != current and pattern.match(stale):
+            os.remove(stale)
+
+
+def _to_feather_safe(df):
+    """Object columns may mix numbers and text; store them as nullable strings."""
+    df = df.reset_index(drop=True)
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].astype("string")
+    df.columns = [str(col) for col in df.columns]
+    return df
+
+
+def _to_float(column):
+    """Convert a column with decimal commas to float."""
+    if column.dtype == object:
+        column = column.astype(str).str.replace(",", ".", regex=False)
+    return pd.to_numeric(column, errors="coerce").astype(np.float32)
+
+
+def _parse_workbook(path):
+    df = pd.read_excel(path)
+    expression = df.iloc[:, EXPRESSION_COLUMNS]
+    matrix = np.column_stack([_to_float(expression[col]) for col in expression.columns]).T  # samples x genes
+    genes = df.drop(columns=expression.columns)
+    genes.insert(1, "Gene_ID", strip_version(genes["ID"]))
+    samples = np.array([str(col) for col in expression.columns])
+    return ExpressionData(np.ascontiguousarray(matrix, dtype=np.float32), samples,
+                          genes["Gene_ID"].to_numpy(dtype=str), _to_feather_safe(genes))
+
+
+def load_expression_data(path, use_cache=True):
+    """
+    Cleaned expression workbook: float32 (samples x genes) matrix, sample names, version-free gene IDs
+    (one per workbook row, in workbook order) and the per-gene metadata table.
+    """
+    npz_cache = _cache_path(path, ".expression.npz")
+    genes_cache = _cache_path(path, ".genes.feather")
+    if use_cache and os.path.exists(npz_cache) and os.path.exists(genes_cache):
+        with np.load(npz_cache) as cached:
+            return ExpressionData(cached["matrix"], cached["samples"], cached["gene_ids"],
+                                  pd.read_feather(genes_cache))
+
+    data = _parse_workbook(path)
+    if use_cache:
+        _remove_stale(path, ".expression.npz", npz_cache)
+        _remove_stale(path, ".genes.feather", genes_cache)
+        np.savez(npz_cache, matrix=data.matrix, samples=data.samples, gene_ids=data.gene_ids)
+        data.genes.to_feather(genes_cache)
+    return data
+
+
+def expression_frame(path, sample_filter=None, drop_constant=False, use_cache=True):
+    """
+    Samples x genes DataFrame for GRNBoost2. Duplicate gene IDs (several transcript models) keep the first
+    row. sample_filter keeps samples whose name contains any of the given substrings; drop_constant removes
+    genes without variance or with missing values.
+    """
+    data = load_expression_data(path, use_cache)
+    samples = data.samples
+    rows = np.arange(len(samples))
+    if sample_filter:
+        rows = rows[[any(key in name for key in sample_filter) for name in samples]]
+    _, first = np.unique(data.gene_ids, return_index=True)
+    columns = np.sort(first)
+    frame = pd.DataFrame(data.matrix[np.ix_(rows, columns)], index=samples[rows], columns=data.gene_ids[columns])
+    if drop_constant:
+        frame = frame.loc[:, frame.std() > 0].dropna(axis=1)
+    return frame
+
+
+def gene_table(path, use_cache=True):
+    """Per-gene metadata with the expression samples as float32 columns and their mean as `avg_expr`."""
+    data = load_expression_data(path, use_cache)
+    table = data.genes.copy()
+    table = pd.concat([table, pd.DataFrame(data.matrix.T, columns=data.samples)], axis=1)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # genes without any value stay NaN
+        table["avg_expr"] = np.nanmean(data.matrix, axis=0)  # blank cells are skipped, as in DataFrame.mean
+    return table
+
+
+def load_tf_names(tf_path, gene_ids=None):
+    """TF gene IDs without version suffix, optionally restricted to (and ordered as in) a TF list ∩ gene_ids."""
+    tfs = strip_version(pd.read_csv(tf_path, sep="\t")["Gene_ID"])
+    if gene_ids is None:
+        return list(tfs)
+    present = set(gene_ids)
+    return [tf for tf in tfs if tf in present]
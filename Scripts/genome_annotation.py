@@ -0,0 +1,267 @@
+"""
+Script Name: genome_annotation.py
+
+Purpose:
+Interval index over the TAIR10 GFF3 and lifting of promoter-relative motif hits to genome coordinates.
+  1. The GFF3 is parsed once into per-chromosome NumPy interval arrays sorted by start (start, end, strand,
+     feature type, ID), with a running maximum of the end coordinates. The arrays are cached next to the
+     GFF3 (`<gff>.<size>-<mtime>.<feature types>.intervals.npz`) and rebuilt when the file changes;
+     caches of older versions of the file are deleted.
+  2. Promoter coordinates come from the TAIR upstream FASTA headers (e.g. "chr1:2631-3630 FORWARD"), or,
+     when a header carries none, from the gene model: the 1 kb upstream of the gene start on its strand.
+  3. Hits (1-based, inclusive positions in the promoter read 5' → 3') are lifted with vectorized,
+     strand-aware arithmetic: on a forward promoter g = promoter_start + p - 1, on a reverse promoter
+     g = promoter_end - p + 1 and the hit strand flips.
+  4. Bulk queries over all hits at once: overlapping features (binary search on starts and on the running
+     maximum of ends) and the nearest feature with its distance. Lifted hits can be written as BED.
+
+Inputs:
+- GFF3 file of gene models (TAIR10_GFF3_genes.gff), PromoterStore, hits table (annotation_output.py)
+
+Outputs:
+- Genome-coordinate hit columns, overlap / nearest-feature tables, BED files
+
+Thesis Reference:
+- Section 2.5 "Gene Annotation"
+"""
+
+import glob
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from promoter_store import normalize_gene_id
+
+FEATURE_TYPES = ("gene",)
+_HEADER_COORDINATES = re.compile(r"chr(\w+):(\d+)-(\d+)\s+(FORWARD|REVERSE)", re.IGNORECASE)
+
+
+def _cache_path(gff_path, feature_types=FEATURE_TYPES):
+    stat = os.stat(gff_path)
+    features = re.sub(r"[^\w.+-]", "_", "+".join(sorted(set(feature_types))))
+    return f"{gff_path}.{stat.st_size}-{stat.st_mtime_ns}.{features}.intervals.npz"
+
+
+def _remove_stale(gff_path):
+    """Delete interval caches built from an older version of the GFF3 file (any feature types)."""
+    stat = os.stat(gff_path)
+    pattern = re.compile(re.escape(gff_path) + r"\.(\d+-\d+)\.(?:.+\.)?intervals\.npz$")
+    for cache in glob.glob(f"{glob.escape(gff_path)}.*.intervals.npz"):
+        match = pattern.match(cache)
+        if match and match.group(1) != f"{stat.st_size}-{stat.st_mtime_ns}":
+            os.remove(cache)
+
+
+def parse_gff3(gff_path, feature_types=FEATURE_TYPES):
+    """Features of the given types as a DataFrame: chromosome, start, end, strand (+1/-1), feature, ID."""
+    gff = pd.read_csv(gff_path, sep="\t", comment="#", header=None, usecols=[0, 2, 3, 4, 6, 8],
+                      names=["chromosome", "feature", "start", "end", "strand", "attributes"],
+                      dtype={"chromosome": str, "feature": str, "start": np.int64, "end": np.int64,
+                             "strand": str, "attributes": str})
+    gff = gff[gff["feature"].isin(feature_types)]
+    ids = gff["attributes"].str.extract(r"(?:^|;)ID=([^;]+)", expand=False)
+    gff = gff.assign(ID=ids.fillna("").map(normalize_gene_id),
+                     strand=np.where(gff["strand"] == "-", -1, 1).astype(np.int8))
+    return gff[gff["ID"] != ""].drop(columns="attributes").reset_index(drop=True)
+
+
+class GenomeAnnotation:
+    """Per-chromosome sorted interval arrays of GFF3 features, with bulk overlap and nearest queries."""
+
+    def __init__(self, gff_path, feature_types=FEATURE_TYPES, use_cache=True):
+        cache = _cache_path(gff_path, feature_types)
+        if use_cache:
+            _remove_stale(gff_path)
+        if use_cache and os.path.exists(cache):
+            with np.load(cache) as index:
+                arrays = {key: index[key] for key in index.files}
+        else:
+            arrays = self._build(parse_gff3(gff_path, feature_types))
+            if use_cache:
+                np.savez(cache, **arrays)
+        self.chromosomes = arrays.pop("chromosomes")
+        self.offsets = arrays.pop("offsets")
+        for key, array in arrays.items():
+            setattr(self, key, array)
+        self._chromosome_code = {name.lower(): code for code, name in enumerate(self.chromosomes)}
+
+    @staticmethod
+    def _build(features):
+        features = features.sort_values(["chromosome", "start", "end"], kind="stable")
+        chromosomes, codes = np.unique(features["chromosome"].to_numpy(dtype=str), return_inverse=True)
+        ends = features["end"].to_numpy(dtype=np.int64)
+        offsets = np.r_[0, np.cumsum(np.bincount(codes, minlength=len(chromosomes)))]
+        max_end = np.empty_like(ends)
+        for lo, hi in zip(offsets[:-1], offsets[1:]):
+            max_end[lo:hi] = np.maximum.accumulate(ends[lo:hi])
+        return {
+            "chromosomes": chromosomes,
+            "offsets": offsets,
+            "starts": features["start"].to_numpy(dtype=np.int64),
+            "ends": ends,
+            "max_ends": max_end,
+            "strands": features["strand"].to_numpy(dtype=np.int8),
+            "features": features["feature"].to_numpy(dtype=str),
+            "ids": features["ID"].to_numpy(dtype=str),
+        }
+
+    def chromosome_codes(self, chromosomes):
+        """Codes of chromosome names (case-insensitive, 'chr1' matches 'Chr1'); -1 when unknown."""
+        names = pd.Series(np.asarray(chromosomes, dtype=str)).str.lower()
+        return names.map(self._chromosome_code).fillna(-1).to_numpy(dtype=np.int64)
+
+    def gene_coordinates(self):
+        """Gene coordinates indexed by Gene_ID (Chromosome, Gene_Start, Gene_Stop, Gene_Strand)."""
+        chromosome = np.repeat(self.chromosomes, np.diff(self.offsets))
+        genes = pd.DataFrame({
+            "Chromosome": chromosome,
+            "Gene_Start": self.starts,
+            "Gene_Stop": self.ends,
+            "Gene_Strand": np.where(self.strands < 0, "-", "+"),
+        }, index=pd.Index(self.ids, name="Gene_ID"))
+        return genes[self.features == "gene"].loc[lambda df: ~df.index.duplicated()]
+
+    def overlaps(self, chromosomes, starts, ends):
+        """
+        All (query, feature) pairs whose closed intervals overlap. Returns two aligned arrays: query
+        positions and feature rows (into starts/ends/ids).
+        """
+        codes = self.chromosome_codes(chromosomes)
+        starts, ends = np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64)
+        first = np.zeros(len(codes), dtype=np.int64)
+        stop = np.zeros(len(codes), dtype=np.int64)
+        for code in np.unique(codes[codes >= 0]):
+            lo, hi = self.offsets[code], self.offsets[code + 1]
+            query = np.flatnonzero(codes == code)
+            # Candidates start at or before the query end and come after the last feature whose
+            # running maximum end is still left of the query
+            first[query] = lo + np.searchsorted(self.max_ends[lo:hi], starts[query], side="left")
+            stop[query] = lo + np.searchsorted(self.starts[lo:hi], ends[query], side="right")
+        counts = np.maximum(stop - first, 0)
+        query = np.repeat(np.arange(len(codes)), counts)
+        rows = np.repeat(first - np.r_[0, np.cumsum(counts)[:-1]], counts) + np.arange(counts.sum())
+        keep = self.ends[rows] >= starts[query]
+        return query[keep], rows[keep]
+
+    def nearest(self, chromosomes, positions):
+        """
+        Nearest feature to every position (distance 0 when inside a feature). Returns feature rows
+        (-1 for unknown chromosomes) and distances.
+        """
+        codes = self.chromosome_codes(chromosomes)
+        positions = np.asarray(positions, dtype=np.int64)
+        rows = np.full(len(codes), -1, dtype=np.int64)
+        distance = np.full(len(codes), -1, dtype=np.int64)
+        for code in np.unique(codes[codes >= 0]):
+            lo, hi = self.offsets[code], self.offsets[code + 1]
+            query = np.flatnonzero(codes == code)
+            pos = positions[query]
+            right = np.searchsorted(self.starts[lo:hi], pos, side="right")  # first feature starting after pos
+            # Left side: the feature reaching furthest right among those starting at or before pos
+            left_end = self.max_ends[lo:hi][np.maximum(right - 1, 0)]
+            left_distance = np.where(right > 0, np.maximum(pos - left_end, 0), np.iinfo(np.int64).max)
+            right_distance = np.where(right < hi - lo, self.starts[lo:hi][np.minimum(right, hi - lo - 1)] - pos,
+                                      np.iinfo(np.int64).max)
+            use_left = left_distance <= right_distance
+            left_row = self._furthest_left(lo, right, left_end)
+            rows[query] = np.where(use_left, left_row, lo + right)
+            distance[query] = np.minimum(left_distance, right_distance)
+        return rows, distance
+
+    def _furthest_left(self, lo, right, left_end):
+        """Row of the feature that attains the running maximum end before `right` (per query)."""
+        # max_ends only increases, so the feature that set it is the first row where max_ends == left_end
+        segment = self.max_ends[lo:lo + max(int(right.max(initial=0)), 1)]
+        return lo + np.searchsorted(segment, left_end, side="left")
+
+
+def promoter_intervals(store, genome, promoter_length=1000):
+    """
+    Genome coordinates of every promoter in the store, indexed by Gene_ID: Promoter_Chromosome, Promoter_Start,
+    Promoter_End (1-based, inclusive) and Promoter_Strand ('+' when the promoter reads forward).
+    Taken from the FASTA headers, or derived from the gene model when a header has no coordinates.
+    """
+    parsed = pd.Series(store.headers).str.extract(_HEADER_COORDINATES)
+    lengths = store.lengths.astype(np.int64)
+    intervals = pd.DataFrame({
+        "Promoter_Chromosome": "chr" + parsed[0],
+        "Promoter_Start": np.minimum(parsed[1].astype(float), parsed[2].astype(float)),
+        "Promoter_End": np.maximum(parsed[1].astype(float), parsed[2].astype(float)),
+        "Promoter_Strand": np.where(parsed[3].str.upper() == "REVERSE", "-", "+"),
+    }, index=pd.Index(store.gene_ids, name="Gene_ID"))
+
+    genes = genome.gene_coordinates().reindex(intervals.index)
+    missing = intervals["Promoter_Start"].isna().to_numpy() & genes["Gene_Start"].notna().to_numpy()
+    forward = (genes["Gene_Strand"] == "+").to_numpy()
+    length = np.where(lengths > 0, lengths, promoter_length)
+    fallback_start = np.where(forward, genes["Gene_Start"] - length, genes["Gene_Stop"] + 1)
+    intervals.loc[missing, "Promoter_Chromosome"] = genes.loc[missing, "Chromosome"]
+    intervals.loc[missing, "Promoter_Start"] = fallback_start[missing]
+    intervals.loc[missing, "Promoter_End"] = fallback_start[missing] + length[missing] - 1
+    intervals.loc[missing, "Promoter_Strand"] = genes.loc[missing, "Gene_Strand"]
+
+    # Use the GFF3 chromosome names so lifted hits match the gene models
+    codes = genome.chromosome_codes(intervals["Promoter_Chromosome"].fillna(""))
+    intervals["Promoter_Chromosome"] = np.where(codes >= 0, genome.chromosomes[np.maximum(codes, 0)],
+                                                intervals["Promoter_Chromosome"])
+    return intervals.astype({"Promoter_Start": "Int64", "Promoter_End": "Int64"})
+
+
+def lift_hits(hits, intervals):
+    """
+    Add genome coordinates to a hits table (Gene_ID, Hit_Start, Hit_Stop, Hit_Strand):
+    Hit_Chromosome, Hit_Genomic_Start, Hit_Genomic_Stop (1-based, inclusive) and Hit_Genomic_Strand.
+    Hits in promoters without coordinates get missing values.
+    """
+    promoter = intervals.reindex(hits["Gene_ID"].to_numpy())
+    reverse = (promoter["Promoter_Strand"] == "-").to_numpy()
+    lo = promoter["Promoter_Start"].to_numpy(dtype=float, na_value=np.nan)
+    hi = promoter["Promoter_End"].to_numpy(dtype=float, na_value=np.nan)
+    start, stop = hits["Hit_Start"].to_numpy(), hits["Hit_Stop"].to_numpy()
+    strand = hits["Hit_Strand"].to_numpy(dtype=str)
+    lifted = hits.copy()
+    lifted["Hit_Chromosome"] = pd.array(promoter["Promoter_Chromosome"].to_numpy(), dtype="string")
+    lifted["Hit_Genomic_Start"] = pd.array(np.where(reverse, hi - stop + 1, lo + start - 1), dtype="Int64")
+    lifted["Hit_Genomic_Stop"] = pd.array(np.where(reverse, hi - start + 1, lo + stop - 1), dtype="Int64")
+    flipped = np.where(strand == "+", "-", np.where(strand == "-", "+", strand))
+    lifted["Hit_Genomic_Strand"] = pd.array(np.where(np.isnan(lo), None, np.where(reverse, flipped, strand)),
+                                            dtype="string")
+    return lifted
+
+
+def nearest_genes(lifted, genome):
+    """Nearest annotated feature to every lifted hit (midpoint) and its distance in bp."""
+    located = lifted["Hit_Genomic_Start"].notna().to_numpy()
+    midpoint = ((lifted["Hit_Genomic_Start"].fillna(0) + lifted["Hit_Genomic_Stop"].fillna(0)) // 2).to_numpy(dtype=np.int64)
+    rows, distance = genome.nearest(lifted["Hit_Chromosome"].fillna("").to_numpy(dtype=str), midpoint)
+    found = located & (rows >= 0)
+    return pd.DataFrame({
+        "Nearest_Gene": pd.array(np.where(found, genome.ids[np.maximum(rows, 0)], None), dtype="string"),
+        "Nearest_Gene_Distance": pd.Series(distance, index=lifted.index, dtype="Int64").where(found),
+    }, index=lifted.index)
+
+
+def write_bed(lifted, bed_path, name_columns=("Motif_ID", "Gene_ID"), score_column="score"):
+    """Write lifted hits as BED6 (0-based start, name = Motif_ID|Gene_ID). Returns the number of rows."""
+    lifted = lifted[lifted["Hit_Genomic_Start"].notna()]
+    bed = pd.DataFrame({
+        "chrom": lifted["Hit_Chromosome"],
+        "start": lifted["Hit_Genomic_Start"].astype(np.int64) - 1,
+        "end": lifted["Hit_Genomic_Stop"].astype(np.int64),
+        "name": lifted[list(name_columns)].astype(str).agg("|".join, axis=1),
+        "score": lifted[score_column] if score_column in lifted else 0,
+        "strand": lifted["Hit_Genomic_Strand"],
+    }).sort_values(["chrom", "start", "end"], kind="stable")
+    bed.to_csv(bed_path, sep="\t", header=False, index=False)
+    return len(bed)
+
+
+def shared_sites(lifted):
+    """Genomic sites (same motif, position and strand) reported in the promoters of more than one gene."""
+    lifted = lifted[lifted["Hit_Genomic_Start"].notna()]
+    keys = ["Motif_ID", "Hit_Chromosome", "Hit_Genomic_Start", "Hit_Genomic_Stop", "Hit_Genomic_Strand"]
+    sites = lifted.groupby(keys, observed=True)["Gene_ID"].agg(
+        Num_Genes="nunique", Genes=lambda genes: ";".join(sorted(set(genes)))).reset_index()
+    return sites[sites["Num_Genes"] > 1].reset_index(drop=True)
@@ -0,0 +1,154 @@
+"""
+Script Name: grn_consensus.py
+
+Purpose:
+Consensus GRN from repeated GRNBoost2 runs. GRNBoost2 is stochastic, so a single run gives one sample of
+the edge importances. Here R replicates are run on the same Dask client (grn_runner.py), either with
+different seeds on the same data ("seeds") or on bootstrap resamples of the samples ("bootstrap").
+
+The replicate edge lists are merged as they arrive, without concatenating them: every (TF, target) pair is
+hashed (open addressing, linear probing, vectorized in NumPy) into a preallocated slot of a table holding
+one float32 importance per replicate. Memory is bounded by the number of distinct edges x R; the table
+doubles when it is more than half full. Per edge the consensus reports:
+  - importance        : mean importance over all R replicates (0 where the edge was not recovered)
+  - median_importance : median over all R replicates (0 where not recovered)
+  - importance_std    : standard deviation over all R replicates
+  - frequency         : fraction of replicates that recovered the edge
+The importance column keeps its name, so the consensus network loads like a single GRNBoost2 output and
+can be filtered on frequency (grn_graph.load_grn(min_frequency=...)) instead of a raw importance cutoff.
+
+Inputs:
+- Expression matrix (samples x genes DataFrame), TF names, Dask client
+
+Outputs:
+- Consensus edge list: TF, target, importance, median_importance, importance_std, frequency
+
+Thesis Reference:
+- Section 2.6: "Gene Regulatory Network Inference"
+- Section 2.6.4: "Network Validation and Robustness Analysis"
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+from grn_runner import run_grnboost2
+
+MODES = ("seeds", "bootstrap")
+_EMPTY = np.int64(-1)
+
+
+class EdgeConsensus:
+    """Streaming per-edge importance table over a fixed number of replicates."""
+
+    def __init__(self, gene_names, n_replicates, capacity=1 << 20):
+        self.gene_names = np.asarray(gene_names, dtype=str)
+        self._code_of = {name: code for code, name in enumerate(self.gene_names)}
+        self.n_replicates = n_replicates
+        self.n_edges = 0
+        self._allocate(1 << int(np.ceil(np.log2(max(capacity, 2)))))
+
+    def _allocate(self, capacity):
+        self._keys = np.full(capacity, _EMPTY, dtype=np.int64)
+        self._values = np.zeros((capacity, self.n_replicates), dtype=np.float32)
+
+    @staticmethod
+    def _hash(keys, mask):
+        # Fibonacci hashing spreads consecutive (TF, target) codes over the table
+        return ((keys.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(20)).astype(np.int64) & mask
+
+    def _slots(self, keys):
+        """Slot of every key, inserting the missing ones. keys must be unique."""
+        mask = len(self._keys) - 1
+        slots = self._hash(keys, mask)
+        result = np.empty(len(keys), dtype=np.int64)
+        todo = np.arange(len(keys))
+        while len(todo):
+            current = self._keys[slots[todo]]
+            found = current == keys[todo]
+            result[todo[found]] = slots[todo[found]]
+            empty = current == _EMPTY
+            # Keys probing the same empty slot: the first one claims it, the others probe on
+            _, first = np.unique(slots[todo[empty]], return_index=True)
+            claim = todo[empty][first]
+            self._keys[slots[claim]] = keys[claim]
+            result[claim] = slots[claim]
+            self.n_edges += len(claim)
+            done = np.zeros(len(todo), dtype=bool)
+            done[found] = True
+            done[np.flatnonzero(empty)[first]] = True
+            todo = todo[~done]
+            retry = todo[self._keys[slots[todo]] != keys[todo]]
+            slots[retry] = (slots[retry] + 1) & mask
+        return result
+
+    def _grow(self, n_new):
+        capacity = len(self._keys)
+        while 2 * (self.n_edges + n_new) > capacity:
+            capacity *= 2
+        if capacity == len(self._keys):
+            return
+        occupied = self._keys != _EMPTY
+        keys, values = self._keys[occupied], self._values[occupied]
+        self._allocate(capacity)
+        self.n_edges = 0
+        self._values[self._slots(keys)] = values
+
+    def add(self, replicate, network, source="TF", target="target"):
+        """Add one replicate's edge list (duplicate pairs keep their highest importance)."""
+        tf_codes = network[source].astype(str).map(self._code_of).to_numpy()
+        target_codes = network[target].astype(str).map(self._code_of).to_numpy()
+        keys = tf_codes.astype(np.int64) * len(self.gene_names) + target_codes.astype(np.int64)
+        importance = network["importance"].to_numpy(dtype=np.float32)
+        order = np.lexsort((-importance, keys))
+        keys, importance = keys[order], importance[order]
+        first = np.r_[True, keys[1:] != keys[:-1]]
+        keys, importance = keys[first], importance[first]
+        self._grow(len(keys))
+        self._values[self._slots(keys), replicate] = importance
+
+    def table(self):
+        """Consensus DataFrame, sorted by decreasing frequency and mean importance."""
+        occupied = self._keys != _EMPTY
+        keys, values = self._keys[occupied], self._values[occupied]
+        n_genes = len(self.gene_names)
+        consensus = pd.DataFrame({
+            "TF": self.gene_names[keys // n_genes],
+            "target": self.gene_names[keys % n_genes],
+            "importance": values.mean(axis=1),
+            "median_importance": np.median(values, axis=1),
+            "importance_std": values.std(axis=1),
+            "frequency": (values > 0).mean(axis=1),
+        })
+        return consensus.sort_values(["frequency", "importance"], ascending=False,
+                                     kind="stable").reset_index(drop=True)
+
+
+def replicate_seeds(seed, n_replicates):
+    """Independent integer seeds for the replicates, derived from one master seed."""
+    return [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(n_replicates)]
+
+
+def consensus_network(expression_matrix, tf_names, client, n_replicates=10, mode="seeds", seed=None,
+                      report_prefix=None):
+    """
+    Run n_replicates GRNBoost2 replicates on the client and merge them into a consensus edge list.
+    mode "seeds" reruns the same data with different seeds; "bootstrap" also resamples the samples
+    (rows) with replacement for every replicate.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown consensus mode '{mode}'; choose from {', '.join(MODES)}")
+    seeds = replicate_seeds(seed, n_replicates)
+    consensus = EdgeConsensus(expression_matrix.columns, n_replicates)
+    for replicate, replicate_seed in enumerate(seeds):
+        data = expression_matrix
+        if mode == "bootstrap":
+            rows = np.random.default_rng(replicate_seed).integers(0, len(data), len(data))
+            data = data.iloc[rows]
+        prefix = f"{report_prefix}.rep{replicate:03d}" if report_prefix else None
+        network = run_grnboost2(data, tf_names, client, seed=replicate_seed, report_prefix=prefix)
+        consensus.add(replicate, network)
+        logging.info(f"Replicate {replicate + 1}/{n_replicates}: {len(network)} edges, "
+                     f"{consensus.n_edges} distinct edges so far")
+    return consensus.table()
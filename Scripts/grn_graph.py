@@ -0,0 +1,121 @@
+"""
+Script Name: grn_graph.py
+
+Purpose:
+Compact array representation of a GRNBoost2 network for the robustness analyses. The filtered edge list is
+converted once into CSR adjacency arrays (scipy.sparse conventions: indptr / indices):
+  - out-adjacency of the directed graph (TF → target)
+  - symmetric adjacency of the underlying undirected graph (used for weakly connected components)
+Nodes are integer codes; names maps codes back to gene IDs. Duplicate edges and self-loops are dropped
+from the undirected adjacency, while degrees follow the networkx DiGraph convention (in + out degree).
+
+Inputs:
+- GRNBoost2 output TSV file with columns: TF, target, importance
+
+Outputs:
+- GRNGraph named tuple used by grn_perturbation.py and the perturbation scripts
+
+Thesis Reference:
+- Section 2.6.4: "Network Validation and Robustness Analysis"
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from edge_store import EdgeStore, store_is_current, store_path
+
+GRNGraph = namedtuple("GRNGraph", ["names", "sources", "targets", "out_indptr", "out_indices", "indptr", "indices"])
+
+
+def load_grn(network_file, importance_threshold=None, min_frequency=None):
+    """
+    Load a GRNBoost2 TSV, keeping edges with importance > importance_threshold and, for consensus
+    networks (grn_consensus.py), recovered in at least min_frequency of the replicates.
+    When the runner wrote an up-to-date edge store next to the TSV (edge_store.py), only the edges above
+    the threshold are read from it instead of parsing the whole TSV.
+    """
+    if store_is_current(network_file):
+        store = EdgeStore(store_path(network_file))
+        df = store.to_frame() if importance_threshold is None else store.edges_above(importance_threshold)
+    else:
+        # round_trip parses the importances exactly as written, i.e. as stored in the edge store
+        df = pd.read_csv(network_file, sep="\t", float_precision="round_trip")
+        if importance_threshold is not None:
+            df = df[df["importance"] > importance_threshold]
+    if min_frequency is not None:
+        df = df[df["frequency"] >= min_frequency]
+    return df.reset_index(drop=True)
+
+
+def _csr(rows, cols, n_nodes):
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(n_nodes, n_nodes))
+    matrix.sum_duplicates()
+    matrix.sort_indices()
+    return matrix.indptr.astype(np.int64), matrix.indices.astype(np.int64)
+
+
+def graph_from_codes(names, sources, targets):
+    """Build the CSR arrays from integer-coded directed edges (duplicate edges are collapsed)."""
+    n_nodes = len(names)
+    edges = np.unique(np.stack([sources, targets], axis=1), axis=0) if len(sources) else np.zeros((0, 2), int)
+    sources, targets = edges[:, 0].astype(np.int64), edges[:, 1].astype(np.int64)
+
+    out_indptr, out_indices = _csr(sources, targets, n_nodes)
+    loops = sources == targets
+    undirected_rows = np.concatenate([sources[~loops], targets[~loops]])
+    undirected_cols = np.concatenate([targets[~loops], sources[~loops]])
+    indptr, indices = _csr(undirected_rows, undirected_cols, n_nodes)
+    return GRNGraph(np.asarray(names), sources, targets, out_indptr, out_indices, indptr, indices)
+
+
+def build_graph(df, source="TF", target="target"):
+    """Directed GRN from an edge DataFrame; every TF and target becomes a node."""
+    codes, names = pd.factorize(pd.concat([df[source], df[target]], ignore_index=True).astype(str))
+    return graph_from_codes(names, codes[:len(df)], codes[len(df):])
+
+
+def node_degrees(graph):
+    """Total (in + out) degree of every node, as networkx DiGraph.degree() reports it."""
+    n_nodes = len(graph.names)
+    return np.bincount(graph.sources, minlength=n_nodes) + np.bincount(graph.targets, minlength=n_nodes)
+
+
+def undirected_matrix(graph):
+    """The undirected adjacency as a scipy CSR matrix."""
+    n_nodes = len(graph.names)
+    return sparse.csr_matrix((np.ones(len(graph.indices), dtype=np.int8), graph.indices, graph.indptr),
+                             shape=(n_nodes, n_nodes))
+
+
+def weak_components(graph, removed=None):
+    """
+    Weakly connected component labels, optionally after removing a set of node codes.
+    Removed nodes get label -1. Returns (n_components, labels).
+    """
+    matrix = undirected_matrix(graph)
+    if removed is None or len(removed) == 0:
+        return connected_components(matrix, directed=False)
+    keep = np.ones(len(graph.names), dtype=bool)
+    keep[np.asarray(removed, dtype=np.int64)] = False
+    n_components, sub_labels = connected_components(matrix[keep][:, keep], directed=False)
+    labels = np.full(len(graph.names), -1, dtype=np.int64)
+    labels[keep] = sub_labels
+    return n_components, labels
+
+
+def subgraph_csr(graph, nodes, directed=False):
+    """
+    CSR arrays (indptr, indices) of the subgraph induced by the given node codes, renumbered 0..len(nodes)-1
+    in the given order. directed=True uses the TF → target adjacency, otherwise the undirected one.
+    """
+    nodes = np.asarray(nodes, dtype=np.int64)
+    n_nodes = len(graph.names)
+    indptr, indices = (graph.out_indptr, graph.out_indices) if directed else (graph.indptr, graph.indices)
+    matrix = sparse.csr_matrix((np.ones(len(indices), dtype=np.int8), indices, indptr), shape=(n_nodes, n_nodes))
+    sub = matrix[nodes][:, nodes].tocsr()
+    sub.sort_indices()
+    return sub.indptr.astype(np.int64), sub.indices.astype(np.int64)
@@ -0,0 +1,253 @@
+"""
+Script Name: grn_knockout.py
+
+Purpose:
+Multi-TF knockout sweeps on the GRN, to find redundant regulators whose joint removal fragments the network
+more than their single removals suggest. Strategies:
+  - pairs  : every pair from the top N TFs. One articulation-point pass with TF a removed
+             (grn_perturbation.py) gives the effect of every (a, b) pair at once, so N passes cover all
+             N(N-1)/2 pairs. Each pair also gets the component count expected if the two single
+             knockouts acted independently, and the excess over that expectation.
+  - greedy : sequential attack; every step removes the TF whose removal creates the most components
+             (ties: smallest largest component), evaluated for all candidates in one pass per step
+  - random : random attack orders, R replicates of k steps each, seeded per replicate
+
+Work is spread over a process pool. The read-only CSR arrays are placed in shared memory once and attached
+by every worker instead of being pickled into each task. Every finished task (pair block, replicate or
+greedy step) is written as a Parquet part file in `<output>.parts/<run key>/`, where the run key hashes the
+strategy, candidates, sweep settings and graph edges. An interrupted sweep resumes by skipping the parts that
+already exist for the same run key; a changed run starts a fresh directory. At the end only the parts of
+the current run's tasks are combined into `<output>`.
+
+Inputs:
+- GRNGraph from grn_graph.build_graph
+
+Outputs:
+- Parquet table with one row per knockout set: Strategy, Replicate, Step, Knockout (';'-separated TFs),
+  Last_Removed, num_components, largest_component_size (+ Expected_Components / Excess_Components for pairs)
+
+Thesis Reference:
+- Section 2.6.4: "Network Validation and Robustness Analysis"
+"""
+
+import glob
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from grn_graph import GRNGraph, weak_components
+from grn_perturbation import single_removal_effects
+
+STRATEGIES = ("pairs", "greedy", "random")
+_ARRAY_FIELDS = ("sources", "targets", "out_indptr", "out_indices", "indptr", "indices")
+
+
+# === Shared-memory graph ===
+
+def share_graph(graph):
+    """Copy the graph arrays into shared memory. Returns (blocks to close/unlink, spec for attach_graph)."""
+    blocks, specs = [], {}
+    for field in _ARRAY_FIELDS:
+        array = getattr(graph, field)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[:] = array
+        blocks.append(block)
+        specs[field] = (block.name, array.shape, array.dtype.str)
+    return blocks, (len(graph.names), specs)
+
+
+def attach_graph(spec):
+    """Rebuild a GRNGraph (node codes as names) on top of the shared-memory blocks."""
+    n_nodes, specs = spec
+    blocks, arrays = [], {}
+    for field, (name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        blocks.append(block)
+        arrays[field] = np.ndarray(shape, dtype, buffer=block.buf)
+    return GRNGraph(np.arange(n_nodes), **arrays), blocks
+
+
+_worker_graph = None
+_worker_blocks = None
+
+
+def _init_worker(spec):
+    global _worker_graph, _worker_blocks
+    _worker_graph, _worker_blocks = attach_graph(spec)
+
+
+# === Knockout evaluation ===
+
+def knockout_stats(graph, removed):
+    """Number of weakly connected components and largest component size after removing node codes."""
+    n_components, labels = weak_components(graph, removed)
+    sizes = np.bincount(labels[labels >= 0])
+    return n_components, int(sizes.max()) if len(sizes) else 0
+
+
+def _pairs_task(args):
+    """All pairs (first, partner): one articulation-point pass with `first` removed."""
+    first, partners = args
+    effects = single_removal_effects(_worker_graph, removed=[first]).set_index("Node")
+    effects = effects.loc[partners]
+    return pd.DataFrame({
+        "First": first,
+        "Second": partners,
+        "num_components": effects["num_components"].to_numpy(),
+        "largest_component_size": effects["largest_component_size"].to_numpy(),
+    })
+
+
+def _random_task(args):
+    """One random attack: remove `steps` random candidates in sequence, measuring after every step."""
+    replicate, seed, candidates, steps = args
+    order = np.random.default_rng(seed).permutation(candidates)[:steps]
+    rows = [(replicate, step + 1, order[:step + 1].tolist(), *knockout_stats(_worker_graph, order[:step + 1]))
+            for step in range(len(order))]
+    return pd.DataFrame(rows, columns=["Replicate", "Step", "Codes", "num_components", "largest_component_size"])
+
+
+# === Sweep driver ===
+
+def run_key(graph, strategy, candidates, steps=None, replicates=None, seed=None):
+    """Short hash of everything that determines a sweep's results (settings and graph edges)."""
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(repr((strategy, list(map(int, candidates)), steps, replicates, seed)).encode())
+    digest.update("\n".join(map(str, graph.names)).encode())
+    for array in (graph.sources, graph.targets):
+        digest.update(np.ascontiguousarray(array, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def _part_path(parts_dir, task_id):
+    return os.path.join(parts_dir, f"part-{task_id}.parquet")
+
+
+def _run_parallel(graph, task_function, tasks, parts_dir, n_jobs, to_rows):
+    """Run (task_id, args) tasks on a shared-memory pool, writing each result as a Parquet part."""
+    pending = [(task_id, args) for task_id, args in tasks if not os.path.exists(_part_path(parts_dir, task_id))]
+    if len(pending) < len(tasks):
+        print(f"Resuming: {len(tasks) - len(pending)} of {len(tasks)} tasks already done")
+    if not pending:
+        return
+    blocks, spec = share_graph(graph)
+    try:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(spec,)) as pool:
+            futures = {pool.submit(task_function, args): task_id for task_id, args in pending}
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                to_rows(future.result()).to_parquet(_part_path(parts_dir, futures[future]), index=False)
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def _names(graph, codes):
+    return ";".join(graph.names[list(codes)])
+
+
+def _pairs_sweep(graph, candidates, parts_dir, n_jobs):
+    tasks = [(f"pairs-{i:05d}", (candidates[i], candidates[i + 1:])) for i in range(len(candidates) - 1)]
+    singles = single_removal_effects(graph).set_index("Node")["num_components"]
+    n_intact, _ = weak_components(graph)
+
+    def to_rows(pairs):
+        first, second = graph.names[pairs["First"]], graph.names[pairs["Second"]]
+        expected = singles.loc[first].to_numpy() + singles.loc[second].to_numpy() - n_intact
+        return pd.DataFrame({
+            "Strategy": "pairs",
+            "Replicate": 0,
+            "Step": 2,
+            "Knockout": [f"{a};{b}" for a, b in zip(first, second)],
+            "Last_Removed": second,
+            "num_components": pairs["num_components"],
+            "largest_component_size": pairs["largest_component_size"],
+            "Expected_Components": expected,
+            "Excess_Components": pairs["num_components"].to_numpy() - expected,
+        })
+
+    _run_parallel(graph, _pairs_task, tasks, parts_dir, n_jobs, to_rows)
+    return [task_id for task_id, _ in tasks]
+
+
+def _random_sweep(graph, candidates, steps, replicates, seed, parts_dir, n_jobs):
+    seeds = np.random.SeedSequence(seed).spawn(replicates)
+    tasks = [(f"random-{r:05d}", (r, seeds[r], np.asarray(candidates), steps)) for r in range(replicates)]
+
+    def to_rows(result):
+        return pd.DataFrame({
+            "Strategy": "random",
+            "Replicate": result["Replicate"],
+            "Step": result["Step"],
+            "Knockout": [_names(graph, codes) for codes in result["Codes"]],
+            "Last_Removed": [graph.names[codes[-1]] for codes in result["Codes"]],
+            "num_components": result["num_components"],
+            "largest_component_size": result["largest_component_size"],
+        })
+
+    _run_parallel(graph, _random_task, tasks, parts_dir, n_jobs, to_rows)
+    return [task_id for task_id, _ in tasks]
+
+
+def _greedy_sweep(graph, candidates, steps, parts_dir):
+    """Sequential attack; one part file per step, so a resumed run continues from the last finished step."""
+    code_of = {name: code for code, name in enumerate(graph.names)}
+    done = sorted(glob.glob(os.path.join(parts_dir, "part-greedy-*.parquet")))
+    removed = []
+    if done:
+        removed = [code_of[name] for name in pd.read_parquet(done[-1])["Knockout"].iloc[0].split(";")]
+        print(f"Resuming greedy attack after {len(removed)} steps")
+
+    candidate_names = set(graph.names[candidates])
+    n_steps = min(steps, len(candidates))
+    for step in tqdm(range(len(removed) + 1, n_steps + 1)):
+        effects = single_removal_effects(graph, removed)
+        effects = effects[effects["Node"].isin(candidate_names)]
+        best = effects.sort_values(["num_components", "largest_component_size", "Degree"],
+                                   ascending=[False, True, False], kind="stable").iloc[0]
+        removed.append(code_of[best["Node"]])
+        pd.DataFrame({
+            "Strategy": ["greedy"],
+            "Replicate": [0],
+            "Step": [step],
+            "Knockout": [_names(graph, removed)],
+            "Last_Removed": [best["Node"]],
+            "num_components": [best["num_components"]],
+            "largest_component_size": [best["largest_component_size"]],
+        }).to_parquet(_part_path(parts_dir, f"greedy-{step:05d}"), index=False)
+    return [f"greedy-{step:05d}" for step in range(1, n_steps + 1)]
+
+
+def run_sweep(graph, strategy, candidates, output_path, steps=10, replicates=100, seed=None, n_jobs=None):
+    """
+    Run a knockout sweep and write the combined results to output_path (Parquet).
+    candidates are the TF names to knock out: the top N hubs for pairs, the attack pool for greedy/random.
+    Returns the results as a DataFrame.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown knockout strategy '{strategy}'; choose from {', '.join(STRATEGIES)}")
+    code_of = {name: code for code, name in enumerate(graph.names)}
+    candidates = [code_of[name] for name in candidates if name in code_of]
+    n_jobs = n_jobs or os.cpu_count() or 1
+    # Settings that do not affect a strategy's results stay out of its run key
+    settings = {"pairs": (None, None, None), "random": (steps, replicates, seed), "greedy": (steps, None, None)}
+    parts_dir = os.path.join(output_path + ".parts", run_key(graph, strategy, candidates, *settings[strategy]))
+    os.makedirs(parts_dir, exist_ok=True)
+
+    if strategy == "pairs":
+        task_ids = _pairs_sweep(graph, candidates, parts_dir, n_jobs)
+    elif strategy == "random":
+        task_ids = _random_sweep(graph, candidates, steps, replicates, seed, parts_dir, n_jobs)
+    else:
+        task_ids = _greedy_sweep(graph, candidates, steps, parts_dir)
+
+    results = pd.concat([pd.read_parquet(_part_path(parts_dir, task_id)) for task_id in task_ids],
+                        ignore_index=True)
+    results = results.sort_values(["Replicate", "Step", "Knockout"], kind="stable").reset_index(drop=True)
+    results.to_parquet(output_path, index=False)
+    return results
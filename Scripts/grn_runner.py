@@ -0,0 +1,253 @@
+"""
+Script Name: grn_runner.py
+
+Purpose:
+Unified GRNBoost2 runner for the SC-specific and global GRN scripts. The Dask cluster is configured in one
+place (number of workers, threads per worker, memory limit per worker) or an existing scheduler is used by
+address, and the resulting client is passed explicitly to arboreto (client_or_address), so arboreto never
+starts a second cluster of its own.
+
+Sharded mode (run_sharded): target genes are split into fixed-size shards, each shard is one GRNBoost2 job
+(arboreto.core.create_graph with target_genes=shard) and its edges are written to
+`<checkpoint_dir>/shard-<i>.parquet` as soon as it finishes. A restarted run skips the finished shards, so
+long runs survive preemption; with --machine-index/--machine-count several machines (or jobs) can each
+take every m-th shard from a shared checkpoint directory. The edges are merged into the output once all
+shards exist. Every target is regressed independently with the same seed, so a seeded sharded run gives
+the same network as a single run. `shards.tsv` records the target → shard assignment and `run.json` the
+seed, TF list and a hash of the expression matrix (workbook values, sample filter, dropped genes); a
+restart that differs in any of them is refused instead of mixing shards of different runs.
+
+Optionally every run is profiled to size the compute nodes:
+  - `<prefix>.html`       : Dask performance report (task stream, worker profile, bandwidth)
+  - `<prefix>.tasks.tsv`  : per-task timings from the task stream (key, worker, action, start, stop, duration)
+  - `<prefix>.memory.tsv` : cluster memory over time (MemorySampler)
+
+Inputs:
+- Expression matrix (samples x genes DataFrame, expression_data.py), TF names
+
+Outputs:
+- GRNBoost2 edge list (TF, target, importance) and optional profiling files
+
+Thesis Reference:
+- Section 2.6: "Gene Regulatory Network Inference"
+
+Requirements:
+- Python packages: pandas, dask, distributed, arboreto
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+from collections import namedtuple
+from contextlib import ExitStack, contextmanager
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+from arboreto import core
+from arboreto.algo import grnboost2
+from dask.distributed import Client, LocalCluster, as_completed, get_task_stream, performance_report
+from distributed.diagnostics import MemorySampler
+
+from edge_store import store_path, write_edge_store
+from expression_data import expression_frame, frame_hash, load_tf_names
+
+# Monkey patch for deprecated method in arboreto (if using older versions)
+pd.DataFrame.as_matrix = lambda self: self.to_numpy()
+
+DaskConfig = namedtuple("DaskConfig", ["n_workers", "threads_per_worker", "memory_limit", "scheduler_address"],
+                        defaults=(4, 1, "auto", None))
+
+
+@contextmanager
+def dask_client(config=DaskConfig()):
+    """Client on an existing scheduler (config.scheduler_address) or on a new LocalCluster."""
+    if config.scheduler_address:
+        logging.info(f"Connecting to Dask scheduler at {config.scheduler_address}...")
+        with Client(config.scheduler_address) as client:
+            yield client
+        return
+    logging.info(f"Starting local Dask cluster: {config.n_workers} workers x {config.threads_per_worker} "
+                 f"threads, memory limit {config.memory_limit}")
+    with LocalCluster(n_workers=config.n_workers, threads_per_worker=config.threads_per_worker,
+                      memory_limit=config.memory_limit) as cluster, Client(cluster) as client:
+        yield client
+
+
+def task_timings(task_stream):
+    """Flatten Dask task-stream records into one row per task phase (compute, transfer, disk)."""
+    rows = [(task["key"], task["worker"], phase["action"], phase["start"], phase["stop"])
+            for task in task_stream for phase in task["startstops"]]
+    timings = pd.DataFrame(rows, columns=["key", "worker", "action", "start", "stop"])
+    timings["key"] = timings["key"].astype(str)
+    timings["duration"] = timings["stop"] - timings["start"]
+    return timings
+
+
+@contextmanager
+def profiled(client, report_prefix=None, label="grnboost2"):
+    """Record performance report, task timings and cluster memory of the enclosed computation."""
+    if not report_prefix:
+        yield
+        return
+    sampler = MemorySampler()
+    with ExitStack() as stack:
+        stack.enter_context(performance_report(filename=f"{report_prefix}.html"))
+        stream = stack.enter_context(get_task_stream(client))
+        stack.enter_context(sampler.sample(label, client=client))
+        yield
+    task_timings(stream.data).to_csv(f"{report_prefix}.tasks.tsv", sep="\t", index=False)
+    sampler.to_pandas().to_csv(f"{report_prefix}.memory.tsv", sep="\t")
+    logging.info(f"Performance report written to {report_prefix}.html (+ .tasks.tsv, .memory.tsv)")
+
+
+def run_grnboost2(expression_matrix, tf_names, client, seed=None, report_prefix=None):
+    """Run GRNBoost2 on the given Dask client. Returns the edge list (TF, target, importance)."""
+    with profiled(client, report_prefix):
+        return grnboost2(expression_data=expression_matrix, tf_names=tf_names, client_or_address=client,
+                         seed=seed)
+
+
+# === Sharded, resumable inference ===
+
+def _shard_path(checkpoint_dir, shard):
+    return os.path.join(checkpoint_dir, f"shard-{shard:05d}.parquet")
+
+
+def shard_assignment(gene_names, shard_size, checkpoint_dir, run_settings=None):
+    """
+    Target → shard table, stored as shards.tsv in the checkpoint directory, with run_settings (seed, TF list,
+    expression hash) stored as run.json. A resumed run must see the same targets, shard size and settings,
+    otherwise the finished shards would not fit together.
+    """
+    manifest = pd.DataFrame({"target": [str(gene) for gene in gene_names],
+                             "shard": np.arange(len(gene_names)) // shard_size})
+    run_settings = json.loads(json.dumps(run_settings or {}))  # normalized as it is stored
+    path = os.path.join(checkpoint_dir, "shards.tsv")
+    settings_path = os.path.join(checkpoint_dir, "run.json")
+    if os.path.exists(path):
+        previous = pd.read_csv(path, sep="\t", dtype={"target": str})
+        if not previous.equals(manifest):
+            raise ValueError(f"{checkpoint_dir} holds shards of a different gene set or shard size; "
+                             "use a new checkpoint directory")
+        previous_settings = None
+        if os.path.exists(settings_path):
+            with open(settings_path) as handle:
+                previous_settings = json.load(handle)
+        if previous_settings != run_settings:
+            changed = sorted(key for key in set(run_settings) | set(previous_settings or {})
+                             if (previous_settings or {}).get(key) != run_settings.get(key))
+            raise ValueError(f"{checkpoint_dir} holds shards of a different run (changed: "
+                             f"{', '.join(changed)}); use a new checkpoint directory")
+    else:
+        manifest.to_csv(path, sep="\t", index=False)
+        with open(settings_path, "w") as handle:
+            json.dump(run_settings, handle)
+    return manifest
+
+
+def merge_shards(checkpoint_dir):
+    """Combine all shard checkpoints into one edge list sorted by decreasing importance."""
+    parts = sorted(glob.glob(os.path.join(checkpoint_dir, "shard-*.parquet")))
+    network = pd.concat([pd.read_parquet(part) for part in parts], ignore_index=True)
+    return network.sort_values("importance", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def run_sharded(expression_matrix, tf_names, client, checkpoint_dir, shard_size=500, seed=None,
+                machine_index=0, machine_count=1, max_in_flight=2, report_prefix=None):
+    """
+    GRNBoost2 in target shards with a checkpoint per shard. Runs the unfinished shards assigned to this
+    machine (shard % machine_count == machine_index), keeping max_in_flight shards queued on the cluster.
+    Returns the merged network once every shard is done, otherwise None.
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    gene_names = list(expression_matrix.columns)
+    run_settings = {"seed": seed, "tf_names": sorted(map(str, tf_names)),
+                    "expression_hash": frame_hash(expression_matrix)}
+    manifest = shard_assignment(gene_names, shard_size, checkpoint_dir, run_settings)
+    n_shards = int(manifest["shard"].max()) + 1 if len(manifest) else 0
+    pending = [shard for shard in range(machine_index, n_shards, machine_count)
+               if not os.path.exists(_shard_path(checkpoint_dir, shard))]
+    logging.info(f"{n_shards} shards of {shard_size} targets; {len(pending)} to run on this machine")
+
+    matrix = expression_matrix.to_numpy()
+    targets = manifest.groupby("shard")["target"].apply(list)
+
+    def submit(shard):
+        graph = core.create_graph(matrix, gene_names, tf_names, regressor_type="GBM",
+                                  regressor_kwargs=core.SGBM_KWARGS, client=client,
+                                  target_genes=targets[shard],
+                                  early_stop_window_length=core.EARLY_STOP_WINDOW_LENGTH, seed=seed)
+        future = client.compute(graph)
+        shard_of[future.key] = shard
+        return future
+
+    shard_of = {}
+    with profiled(client, report_prefix):
+        queue = iter(pending)
+        running = as_completed([submit(shard) for shard in islice(queue, max_in_flight)])
+        for future in running:
+            shard = shard_of.pop(future.key)
+            path = _shard_path(checkpoint_dir, shard)
+            future.result().to_parquet(path + ".tmp", index=False)
+            os.replace(path + ".tmp", path)  # a shard file only ever holds complete results
+            logging.info(f"Shard {shard + 1}/{n_shards} done")
+            next_shard = next(queue, None)
+            if next_shard is not None:
+                running.add(submit(next_shard))
+
+    if len(glob.glob(os.path.join(checkpoint_dir, "shard-*.parquet"))) < n_shards:
+        logging.info("Not all shards are finished yet; merge after the remaining machines are done")
+        return None
+    return merge_shards(checkpoint_dir)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Infer a GRN with GRNBoost2 on a configurable Dask cluster.")
+    parser.add_argument("--expression", required=True, help="Expression workbook (.xlsx)")
+    parser.add_argument("--tf-list", required=True, help="TF list (TSV with a Gene_ID column)")
+    parser.add_argument("--output", required=True, help="Output TSV (TF, target, importance)")
+    parser.add_argument("--samples", nargs="*", default=None,
+                        help="Keep samples whose name contains any of these substrings (default: all)")
+    parser.add_argument("--drop-constant", action="store_true", help="Drop genes without variance")
+    parser.add_argument("--n-workers", type=int, default=4)
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--memory-limit", default="auto", help="Memory limit per worker, e.g. '8GB'")
+    parser.add_argument("--scheduler-address", default=None, help="Use an existing Dask scheduler")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--report-prefix", default=None, help="Write performance report and timings here")
+    parser.add_argument("--shard-size", type=int, default=None,
+                        help="Run in resumable shards of this many target genes")
+    parser.add_argument("--checkpoint-dir", default=None, help="Shard checkpoints (default: <output>.shards)")
+    parser.add_argument("--machine-index", type=int, default=0, help="Run shards i with i %% count == index")
+    parser.add_argument("--machine-count", type=int, default=1)
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    expression_matrix = expression_frame(args.expression, sample_filter=args.samples,
+                                         drop_constant=args.drop_constant)
+    tf_names = load_tf_names(args.tf_list, expression_matrix.columns)
+    logging.info(f"Expression matrix shape: {expression_matrix.shape}, TFs matched: {len(tf_names)}")
+
+    config = DaskConfig(args.n_workers, args.threads_per_worker, args.memory_limit, args.scheduler_address)
+    with dask_client(config) as client:
+        if args.shard_size:
+            network = run_sharded(expression_matrix, tf_names, client, args.checkpoint_dir or args.output + ".shards",
+                                  args.shard_size, args.seed, args.machine_index, args.machine_count,
+                                  report_prefix=args.report_prefix)
+        else:
+            network = run_grnboost2(expression_matrix, tf_names, client, args.seed, args.report_prefix)
+    if network is None:
+        return
+    network.to_csv(args.output, sep="\t", index=False)
+    write_edge_store(network, store_path(args.output))  # memory-mapped query index
+    logging.info(f"GRN with {len(network)} edges saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Script Name: grn_threshold.py
+
+Purpose:
+Importance-threshold sweep for GRNBoost2 networks. Instead of rebuilding the network for every cutoff, the
+edge list is sorted once by decreasing importance and edges are added incrementally, Kruskal-style, into a
+union-find structure (union by size, path halving). Lowering the cutoff only adds edges, so a single pass
+gives, at every requested cutoff:
+  - number of edges and nodes (nodes = genes with at least one retained edge, as in the filtered network)
+  - number of weakly connected components and the size of the largest one
+  - TF degree rankings (in + out degree, as networkx DiGraph.degree())
+This allows choosing the importance threshold from data instead of a fixed value.
+
+Inputs:
+- GRNBoost2 edge list with columns TF, target, importance (unfiltered)
+
+Outputs:
+- Summary DataFrame with one row per cutoff
+- Tidy DataFrame of the top TFs by degree at every cutoff
+
+Thesis Reference:
+- Section 2.6.4: "Network Validation and Robustness Analysis"
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def threshold_sweep(df, thresholds, top_k=20, source="TF", target="target"):
+    """
+    Network statistics for every cutoff, keeping edges with importance > cutoff.
+    Returns (summary, rankings): summary has Threshold, Num_Edges, Num_Nodes, Num_Components and
+    Largest_Component_Size; rankings has Threshold, Rank, TF and Degree for the top_k TFs.
+    """
+    # Duplicate TF-target pairs count once, at their highest importance
+    edges = (df[[source, target, "importance"]]
+             .sort_values("importance", ascending=False, kind="stable")
+             .drop_duplicates([source, target]))
+    codes, names = pd.factorize(pd.concat([edges[source], edges[target]], ignore_index=True).astype(str))
+    n_edges = len(edges)
+    sources, targets = codes[:n_edges], codes[n_edges:]
+    importance = edges["importance"].to_numpy()
+    tf_mask = np.zeros(len(names), dtype=bool)
+    tf_mask[sources] = True
+
+    parent = list(range(len(names)))
+    size = [1] * len(names)
+    present = np.zeros(len(names), dtype=bool)
+    degree = np.zeros(len(names), dtype=np.int64)
+    n_present = n_unions = largest = 0
+
+    summary, rankings = [], []
+    added = 0
+    for cutoff in sorted(thresholds, reverse=True):
+        # Edges are sorted by decreasing importance: everything above the cutoff is a prefix
+        stop = int(np.searchsorted(-importance, -cutoff, side="left"))
+        batch_sources, batch_targets = sources[added:stop], targets[added:stop]
+        np.add.at(degree, batch_sources, 1)
+        np.add.at(degree, batch_targets, 1)
+        for u, v in zip(batch_sources.tolist(), batch_targets.tolist()):
+            for node in (u, v):
+                if not present[node]:
+                    present[node] = True
+                    n_present += 1
+                    largest = max(largest, 1)
+            root_u, root_v = _find(parent, u), _find(parent, v)
+            if root_u != root_v:
+                if size[root_u] < size[root_v]:
+                    root_u, root_v = root_v, root_u
+                parent[root_v] = root_u
+                size[root_u] += size[root_v]
+                largest = max(largest, size[root_u])
+                n_unions += 1
+        added = stop
+
+        summary.append((cutoff, stop, n_present, n_present - n_unions, largest))
+        tf_degree = np.where(tf_mask & present, degree, -1)
+        top = np.argsort(-tf_degree, kind="stable")[:top_k]
+        top = top[tf_degree[top] > 0]
+        rankings.extend((cutoff, rank + 1, names[i], degree[i]) for rank, i in enumerate(top))
+
+    summary = pd.DataFrame(summary, columns=["Threshold", "Num_Edges", "Num_Nodes", "Num_Components",
+                                             "Largest_Component_Size"])
+    rankings = pd.DataFrame(rankings, columns=["Threshold", "Rank", "TF", "Degree"])
+    return summary, rankings
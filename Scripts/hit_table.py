@@ -0,0 +1,101 @@
+"""
+Script Name: hit_table.py
+
+Purpose:
+Streaming loader for FIMO-style motif hit tables (`fimo.tsv`) with a columnar on-disk cache.
+  1. Reads the TSV in chunks, skipping the `#` comment trailer that FIMO appends to the file
+     (previously this trailer was parsed as extra motif rows).
+  2. Keeps only the requested columns with compact dtypes: categorical motif/sequence IDs,
+     int32 positions and float32 scores.
+  3. Writes a Feather sidecar next to the TSV, keyed by the TSV's size and modification time, so
+     repeated analyses load the table from the cache in a fraction of the time and memory.
+
+Inputs:
+- FIMO TSV output (fimo.tsv), or the in-process scanner output saved in the same format
+
+Outputs:
+- pandas DataFrame of motif hits
+- `<fimo.tsv>.<size>-<mtime>.feather` cache file
+
+Thesis Reference:
+- Used by the enrichment (Section 2.4.3) and annotation (Section 2.5) steps
+"""
+
+import glob
+import os
+
+import pandas as pd
+
+DEFAULT_COLUMNS = ["motif_id", "motif_alt_id", "sequence_name", "start", "stop", "strand", "score", "p-value"]
+
+HIT_DTYPES = {
+    "motif_id": "category",
+    "motif_alt_id": "category",
+    "sequence_name": "category",
+    "start": "int32",
+    "stop": "int32",
+    "strand": "category",
+    "score": "float32",
+    "p-value": "float32",
+    "q-value": "float32",
+    "matched_sequence": "string",
+}
+
+CHUNK_SIZE = 500_000
+
+
+def _cache_path(tsv_path):
+    stat = os.stat(tsv_path)
+    return f"{tsv_path}.{stat.st_size}-{stat.st_mtime_ns}.feather"
+
+
+def _concat_chunks(chunks, columns):
+    """Concatenate chunks while keeping categorical columns categorical."""
+    if not chunks:
+        return pd.DataFrame({col: pd.Series(dtype=HIT_DTYPES.get(col, "object")) for col in columns})
+    for col in columns:
+        if HIT_DTYPES.get(col) == "category":
+            categories = pd.api.types.union_categoricals([chunk[col] for chunk in chunks]).categories
+            for chunk in chunks:
+                chunk[col] = chunk[col].cat.set_categories(categories)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def stream_hits(tsv_path, columns=None, chunksize=CHUNK_SIZE):
+    """Yield the hit table in chunks with compact dtypes, skipping comment lines."""
+    columns = list(columns or DEFAULT_COLUMNS)
+    reader = pd.read_csv(
+        tsv_path,
+        sep="\t",
+        comment="#",
+        usecols=lambda col: col in columns,
+        dtype={col: HIT_DTYPES.get(col, "object") for col in columns},
+        chunksize=chunksize,
+    )
+    for chunk in reader:
+        yield chunk[[col for col in columns if col in chunk]]
+
+
+def read_hits(tsv_path, columns=None, use_cache=True, chunksize=CHUNK_SIZE):
+    """
+    Load a motif hit table. Uses the Feather cache when it matches the TSV's size and mtime,
+    otherwise streams the TSV and (re)writes the cache. Stale caches of the same TSV are removed.
+    """
+    columns = list(columns or DEFAULT_COLUMNS)
+    cache = _cache_path(tsv_path)
+    to_read = columns
+
+    if use_cache and os.path.exists(cache):
+        cached = pd.read_feather(cache)
+        if set(columns) <= set(cached.columns):
+            return cached[columns]
+        # Extend the cache with the missing columns instead of replacing it
+        to_read = list(cached.columns) + [col for col in columns if col not in cached.columns]
+
+    hits = _concat_chunks(list(stream_hits(tsv_path, to_read, chunksize)), to_read)
+
+    if use_cache:
+        for stale in glob.glob(f"{glob.escape(tsv_path)}.*.feather"):
+            os.remove(stale)
+        hits.to_feather(cache)
+    return hits[columns]
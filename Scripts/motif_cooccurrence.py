@@ -0,0 +1,278 @@
+"""
+Script Name: motif_cooccurrence.py
+
+Purpose:
+Pairwise motif analysis for cluster promoters: which motif pairs occur together in the same promoters more
+often than in the matched background, and at which spacing and relative orientation.
+  1. Co-occurrence: with the binary gene x motif presence matrix P of a gene set (motif_counts.py),
+     P.T @ P gives the number of promoters containing both motifs for all motif pairs in one sparse
+     product. Every pair (upper triangle, 805 motifs -> 323,610 pairs) is tested with one vectorized
+     Fisher's exact test: promoters with both motifs vs. without, foreground vs. matched background.
+     Many pairs share the same counts, so only the distinct tables are evaluated.
+  2. Spacing and orientation: hits are sorted by (gene, hit centre), which gives per-gene sorted position
+     arrays. All hit pairs within MAX_SPACING bp in the same promoter are found with a windowed self-join:
+     hit i is compared with hit i + lag for lag = 1, 2, ... as whole-array operations, until no pair at
+     that lag is close enough (positions are sorted, so larger lags cannot be either). Overlapping hits
+     (both strands of a palindrome, redundant motifs of one family) are skipped.
+     Every close pair is encoded as one integer (pair, orientation, spacing bin) and counted, so the
+     histograms of all motif pairs are built at once and stored sparsely (only occupied cells).
+     Each cell is tested against the matched background: hit pairs in this spacing/orientation vs. all
+     other close hit pairs of the same motif pair (Fisher's exact test), i.e. a preferred spacing relative
+     to the background's spacing distribution for that pair.
+Motif pairs are canonical: Motif_A <= Motif_B in motif order. Spacing is the distance between hit
+centres, positive when the Motif_B hit lies 3' of the Motif_A hit on the promoter sequence; Orientation is
+the strand of the Motif_A hit followed by the strand of the Motif_B hit ("+-" etc.).
+Redundant motifs of one family trivially co-occur; run on motif families (motif_families.py) to avoid this.
+
+Inputs:
+- Motif hit table (pwm_scanner output or fimo.tsv), incidence matrix of the scanned promoters
+- Cluster gene sets {cluster: (foreground IDs, background IDs)} (motif_enrichment_pipeline.build_gene_sets)
+
+Outputs:
+- Co-occurrence table: Cluster, Motif_A, Motif_B, gene counts, Odds_Ratio, P_Value, Adj_P_Value
+- Spacing table: Cluster, Motif_A, Motif_B, Orientation, Spacing, hit-pair counts, Fisher statistics
+
+Thesis Reference:
+- Section 2.4.3: Motif Enrichment Statistical Analysis
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from enrichment import bh_adjust, fisher_exact_2x2
+from motif_counts import membership_matrix, normalize_gene_ids
+
+MAX_SPACING = 50      # bp between hit centres
+SPACING_BIN = 5       # bp per spacing bin
+MIN_PAIR_COUNT = 3    # minimum foreground hit pairs in a spacing cell for it to be tested
+MAX_QVALUE = 0.05     # rows with a larger BH q-value are dropped from the output tables
+GENE_CHUNK = 2000     # promoters joined at once, bounds the memory of the windowed join
+ORIENTATIONS = np.array(["++", "+-", "-+", "--"])
+
+HitPositions = namedtuple("HitPositions", ["gene", "motif", "centre", "start", "stop", "minus",
+                                           "gene_ids", "motif_ids"])
+
+
+# === Co-occurrence ===
+def presence_matrix(incidence):
+    """Binary gene x motif matrix (promoter has at least one hit)."""
+    present = incidence.matrix.copy()
+    present.data = np.ones_like(present.data)
+    return present
+
+
+def pair_gene_counts(present, rows):
+    """(n_motifs, n_motifs) promoters containing both motifs, for the genes in rows."""
+    subset = present[rows]
+    return (subset.T @ subset).toarray()
+
+
+def cooccurrence_table(incidence, gene_sets, max_qvalue=MAX_QVALUE):
+    """
+    Co-occurrence of every motif pair in every cluster's foreground against its matched background.
+    Pairs found in neither set are not tested. max_qvalue=None keeps all tested pairs.
+    """
+    clusters = list(gene_sets)
+    present = presence_matrix(incidence)
+    fg_membership, _ = membership_matrix(incidence.gene_ids, {c: gene_sets[c][0] for c in clusters})
+    bg_membership, _ = membership_matrix(incidence.gene_ids, {c: gene_sets[c][1] for c in clusters})
+    motif_ids = np.asarray(incidence.motif_ids)
+    a, b = np.triu_indices(len(motif_ids), k=1)
+
+    frames = []
+    for c, cluster in enumerate(clusters):
+        fg_rows, bg_rows = fg_membership[c].indices, bg_membership[c].indices
+        fg_pairs, bg_pairs = pair_gene_counts(present, fg_rows), pair_gene_counts(present, bg_rows)
+        fg_both, bg_both = fg_pairs[a, b], bg_pairs[a, b]
+        fg_total, bg_total = len(fg_rows), len(bg_rows)
+        tested = (fg_both + bg_both) > 0
+
+        # Totals are fixed within a cluster, so each distinct (fg_both, bg_both) table is tested once
+        tables, inverse = np.unique(np.stack([fg_both, bg_both]), axis=1, return_inverse=True)
+        odds_ratio, pvalue = fisher_exact_2x2(tables[0], fg_total - tables[0], tables[1], bg_total - tables[1])
+        odds_ratio, pvalue = odds_ratio[inverse.ravel()], np.where(tested, pvalue[inverse.ravel()], np.nan)
+        single = np.diag(fg_pairs)  # promoters with each motif
+        with np.errstate(divide="ignore", invalid="ignore"):
+            expected = single[a] * single[b] / fg_total
+        frame = pd.DataFrame({
+            "Cluster": cluster,
+            "Motif_A": motif_ids[a],
+            "Motif_B": motif_ids[b],
+            "Foreground_Genes_A": single[a],
+            "Foreground_Genes_B": single[b],
+            "Foreground_Both": fg_both,
+            "Expected_Both": expected,
+            "Foreground_Total": fg_total,
+            "Background_Both": bg_both,
+            "Background_Total": bg_total,
+            "Odds_Ratio": odds_ratio,
+            "P_Value": pvalue,
+            "Adj_P_Value": bh_adjust(pvalue),
+        })
+        kept = frame[tested] if max_qvalue is None else frame[frame["Adj_P_Value"] <= max_qvalue]
+        summary = "" if max_qvalue is None else f", {len(kept)} with q <= {max_qvalue}"
+        print(f"Cluster {cluster}: {tested.sum()} motif pairs tested{summary}")
+        frames.append(kept)
+    return pd.concat(frames, ignore_index=True).sort_values(["Cluster", "P_Value"], kind="stable",
+                                                            ignore_index=True)
+
+
+# === Spacing and orientation ===
+def hit_positions(hits, gene_ids, motif_ids):
+    """Hits as code arrays sorted by (gene, hit centre); hits outside gene_ids / motif_ids are dropped."""
+    genes = pd.Categorical(normalize_gene_ids(hits["sequence_name"]), categories=list(gene_ids)).codes
+    motifs = pd.Categorical(hits["motif_id"].astype(str), categories=list(motif_ids)).codes
+    keep = (genes >= 0) & (motifs >= 0)
+    start = hits["start"].to_numpy(dtype=np.int32)[keep]
+    stop = hits["stop"].to_numpy(dtype=np.int32)[keep]
+    centre = (start + stop) // 2
+    order = np.lexsort((centre, genes[keep]))
+    return HitPositions(
+        gene=genes[keep][order].astype(np.int32),
+        motif=motifs[keep][order].astype(np.int32),
+        centre=centre[order],
+        start=start[order],
+        stop=stop[order],
+        minus=(hits["strand"].astype(str).to_numpy()[keep] == "-")[order],
+        gene_ids=list(gene_ids),
+        motif_ids=list(motif_ids),
+    )
+
+
+def close_pairs(positions, index, max_spacing=MAX_SPACING):
+    """
+    Windowed self-join: all pairs (i, j), i before j, of the hits `index` (sorted positions into
+    `positions`) in the same promoter with centres at most max_spacing apart and not overlapping.
+    """
+    gene, centre = positions.gene[index], positions.centre[index]
+    start, stop = positions.start[index], positions.stop[index]
+    firsts, seconds = [], []
+    for lag in range(1, len(index)):
+        near = (gene[lag:] == gene[:-lag]) & (centre[lag:] - centre[:-lag] <= max_spacing)
+        if not near.any():
+            break
+        apart = near & ((start[lag:] > stop[:-lag]) | (stop[lag:] < start[:-lag]))
+        i = np.flatnonzero(apart)
+        firsts.append(index[i])
+        seconds.append(index[i + lag])
+    if not firsts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(firsts), np.concatenate(seconds)
+
+
+def _half_bins(max_spacing, bin_width):
+    """Spacing bins on each side of the zero bin; bins are centred on multiples of bin_width."""
+    return (max_spacing + bin_width // 2) // bin_width
+
+
+def _n_bins(max_spacing, bin_width):
+    return 2 * _half_bins(max_spacing, bin_width) + 1
+
+
+def spacing_counts(positions, rows, max_spacing=MAX_SPACING, bin_width=SPACING_BIN, chunk=GENE_CHUNK):
+    """
+    Sparse (pair, orientation, spacing bin) histogram of the close hit pairs in the promoters `rows`.
+    Returns (sorted cell keys, counts); see decode_cells for the key layout.
+    """
+    n_motifs, n_bins = len(positions.motif_ids), _n_bins(max_spacing, bin_width)
+    selected = np.zeros(len(positions.gene_ids), dtype=bool)
+    selected[rows] = True
+    index = np.flatnonzero(selected[positions.gene])
+
+    keys, counts = [], []
+    bounds = np.searchsorted(positions.gene[index], np.arange(0, len(positions.gene_ids) + chunk, chunk))
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        i, j = close_pairs(positions, index[lo:hi], max_spacing)
+        if not len(i):
+            continue
+        motif_i, motif_j = positions.motif[i], positions.motif[j]
+        spacing = positions.centre[j] - positions.centre[i]
+        swap = motif_i > motif_j  # canonical pair: Motif_A <= Motif_B, spacing measured from Motif_A
+        a, b = np.where(swap, motif_j, motif_i), np.where(swap, motif_i, motif_j)
+        minus_a = np.where(swap, positions.minus[j], positions.minus[i])
+        minus_b = np.where(swap, positions.minus[i], positions.minus[j])
+        spacing = np.where(swap, -spacing, spacing)
+        orientation = 2 * minus_a + minus_b
+        spacing_bin = (spacing + bin_width // 2) // bin_width + _half_bins(max_spacing, bin_width)
+        cell = ((a.astype(np.int64) * n_motifs + b) * len(ORIENTATIONS) + orientation) * n_bins + spacing_bin
+        cell_keys, cell_counts = np.unique(cell, return_counts=True)
+        keys.append(cell_keys)
+        counts.append(cell_counts)
+    if not keys:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    keys, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+    return keys, np.bincount(inverse, weights=np.concatenate(counts)).astype(np.int64)
+
+
+def decode_cells(keys, positions, max_spacing=MAX_SPACING, bin_width=SPACING_BIN):
+    """Cell keys → (motif_a, motif_b, orientation, spacing bin centre in bp) code arrays."""
+    n_motifs, n_bins = len(positions.motif_ids), _n_bins(max_spacing, bin_width)
+    spacing_bin = keys % n_bins
+    rest = keys // n_bins
+    orientation = rest % len(ORIENTATIONS)
+    pair = rest // len(ORIENTATIONS)
+    return (pair // n_motifs, pair % n_motifs, orientation,
+            (spacing_bin - _half_bins(max_spacing, bin_width)) * bin_width)
+
+
+def _lookup(keys, counts, query):
+    """Counts of the query keys in a sorted sparse histogram (0 where absent)."""
+    if not len(keys):
+        return np.zeros(len(query), dtype=np.int64)
+    pos = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+    return np.where(keys[pos] == query, counts[pos], 0)
+
+
+def _pair_totals(keys, counts, cells_per_pair):
+    """Total close hit pairs per motif pair: (sorted pair keys, totals)."""
+    pairs, inverse = np.unique(keys // cells_per_pair, return_inverse=True)
+    return pairs, np.bincount(inverse, weights=counts).astype(np.int64)
+
+
+def spacing_table(hits, incidence, gene_sets, max_spacing=MAX_SPACING, bin_width=SPACING_BIN,
+                  min_count=MIN_PAIR_COUNT, max_qvalue=MAX_QVALUE):
+    """
+    Preferred spacing/orientation of every motif pair in every cluster against its matched background.
+    Only cells with at least min_count foreground hit pairs are tested; max_qvalue=None keeps all of them.
+    """
+    clusters = list(gene_sets)
+    positions = hit_positions(hits, incidence.gene_ids, incidence.motif_ids)
+    fg_membership, _ = membership_matrix(incidence.gene_ids, {c: gene_sets[c][0] for c in clusters})
+    bg_membership, _ = membership_matrix(incidence.gene_ids, {c: gene_sets[c][1] for c in clusters})
+    motif_ids = np.asarray(incidence.motif_ids)
+    cells_per_pair = len(ORIENTATIONS) * _n_bins(max_spacing, bin_width)
+
+    frames = []
+    for c, cluster in enumerate(clusters):
+        fg_keys, fg_counts = spacing_counts(positions, fg_membership[c].indices, max_spacing, bin_width)
+        bg_keys, bg_counts = spacing_counts(positions, bg_membership[c].indices, max_spacing, bin_width)
+        tested = fg_counts >= min_count
+        cells, fg_cell = fg_keys[tested], fg_counts[tested]
+        bg_cell = _lookup(bg_keys, bg_counts, cells)
+        fg_pair_total = _lookup(*_pair_totals(fg_keys, fg_counts, cells_per_pair), cells // cells_per_pair)
+        bg_pair_total = _lookup(*_pair_totals(bg_keys, bg_counts, cells_per_pair), cells // cells_per_pair)
+
+        odds_ratio, pvalue = fisher_exact_2x2(fg_cell, fg_pair_total - fg_cell, bg_cell, bg_pair_total - bg_cell)
+        a, b, orientation, spacing = decode_cells(cells, positions, max_spacing, bin_width)
+        frame = pd.DataFrame({
+            "Cluster": cluster,
+            "Motif_A": motif_ids[a],
+            "Motif_B": motif_ids[b],
+            "Orientation": ORIENTATIONS[orientation],
+            "Spacing": spacing,
+            "Foreground_Pairs": fg_cell,
+            "Foreground_Pair_Total": fg_pair_total,
+            "Background_Pairs": bg_cell,
+            "Background_Pair_Total": bg_pair_total,
+            "Odds_Ratio": odds_ratio,
+            "P_Value": pvalue,
+            "Adj_P_Value": bh_adjust(pvalue),
+        })
+        if max_qvalue is not None:
+            frame = frame[frame["Adj_P_Value"] <= max_qvalue]
+        frames.append(frame)
+        print(f"Cluster {cluster}: {fg_counts.sum()} close hit pairs, {len(cells)} spacing cells tested")
+    return pd.concat(frames, ignore_index=True).sort_values(["Cluster", "P_Value"], kind="stable",
+                                                            ignore_index=True)
@@ -0,0 +1,107 @@
+"""
+Script Name: motif_counts.py
+
+Purpose:
+Counting engine for motif enrichment. The hit table is turned into a sparse gene x motif incidence
+matrix (scipy.sparse CSR, number of hits per promoter and motif) in one pass. All count statistics come
+from that same matrix:
+  - hit-level counts      : total hits per motif (the original FIMO hit counts)
+  - gene-level counts     : number of promoters with at least one hit (presence/absence), so a promoter
+                            with 40 overlapping hits of a repeat motif counts once
+  - density               : hits per kb of promoter sequence
+Counts for any number of gene sets (clusters, backgrounds) are a single sparse matrix product of a
+group x gene membership matrix with the incidence matrix.
+
+Inputs:
+- Motif hit table (pwm_scanner output or fimo.tsv loaded with hit_table.read_hits)
+- Gene universe (e.g. the promoters that were scanned), so genes without hits are counted too
+
+Outputs:
+- Sparse incidence matrix and (n_groups x n_motifs) count arrays
+
+Thesis Reference:
+- Section 2.4.3: Motif Enrichment Statistical Analysis
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+Incidence = namedtuple("Incidence", ["matrix", "gene_ids", "motif_ids"])
+
+
+def normalize_gene_ids(gene_ids):
+    """Strip transcript version suffixes, e.g. 'AT1G01010.1' → 'AT1G01010'."""
+    return pd.Series(gene_ids, dtype=str).str.split(".", n=1).str[0].str.upper()
+
+
+def build_incidence(hits, gene_ids=None, motif_ids=None, gene_column="sequence_name", values=None):
+    """
+    Build the gene x motif hit-count matrix from a hit table in one pass.
+    gene_ids / motif_ids fix the row and column order; by default all genes/motifs in the hits are used.
+    Hits on genes or motifs outside the given lists are ignored.
+    With values set to a hit column (e.g. "score"), entries are the per-gene sums of that column instead.
+    """
+    hit_genes = normalize_gene_ids(hits[gene_column])
+    hit_motifs = hits["motif_id"].astype(str)
+    if gene_ids is None:
+        gene_ids = np.unique(hit_genes)
+    if motif_ids is None:
+        motif_ids = np.unique(hit_motifs)
+    gene_ids = list(normalize_gene_ids(gene_ids).drop_duplicates())
+    motif_ids = list(motif_ids)
+
+    rows = pd.Categorical(hit_genes, categories=gene_ids).codes
+    cols = pd.Categorical(hit_motifs, categories=motif_ids).codes
+    keep = (rows >= 0) & (cols >= 0)
+    data = np.ones(keep.sum(), dtype=np.int32) if values is None else hits[values].to_numpy(float)[keep]
+    matrix = sparse.coo_matrix(
+        (data, (rows[keep], cols[keep])),
+        shape=(len(gene_ids), len(motif_ids)),
+    ).tocsr()  # duplicate (gene, motif) entries are summed
+    return Incidence(matrix, gene_ids, motif_ids)
+
+
+def membership_matrix(gene_ids, groups):
+    """
+    Sparse group x gene indicator matrix.
+    groups maps a group label to a collection of gene IDs; returns (matrix, group labels).
+    """
+    index = {gene: i for i, gene in enumerate(gene_ids)}
+    labels = list(groups)
+    rows, cols = [], []
+    for row, label in enumerate(labels):
+        members = [index[g] for g in normalize_gene_ids(list(groups[label])) if g in index]
+        rows.extend([row] * len(members))
+        cols.extend(members)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=(len(labels), len(gene_ids))
+    )
+    matrix.data[:] = 1  # a gene listed twice in one group still counts once
+    return matrix, labels
+
+
+def hit_counts(incidence, membership):
+    """Total hits per group and motif: (n_groups x n_motifs)."""
+    return np.asarray((membership @ incidence.matrix).todense())
+
+
+def gene_counts(incidence, membership):
+    """Number of genes per group with at least one hit of each motif: (n_groups x n_motifs)."""
+    present = incidence.matrix.copy()
+    present.data = np.ones_like(present.data)
+    return np.asarray((membership @ present).todense())
+
+
+def group_sizes(membership):
+    """Number of genes in each group."""
+    return np.asarray(membership.sum(axis=1)).ravel()
+
+
+def hit_density(incidence, membership, promoter_lengths):
+    """Hits per kb of promoter sequence per group and motif; promoter_lengths follows incidence.gene_ids."""
+    total_kb = membership @ (np.asarray(promoter_lengths, dtype=float) / 1000.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return hit_counts(incidence, membership) / total_kb[:, None]
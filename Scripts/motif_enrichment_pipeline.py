@@ -0,0 +1,266 @@
+"""
+Script Name: motif_enrichment_pipeline.py
+
+Purpose:
+Single entry point that runs the motif enrichment analysis for every expression cluster in one batch,
+instead of re-running the cluster-specific scripts by hand for each cluster:
+1. Reads the expression/cluster table once and builds the expression-matched background of every cluster
+   (same matching as Background_Arabidopsis_vs_Lotus.py).
+2. Fetches the union of all foreground and background promoters from the indexed promoter store and
+   scans it exactly once with the PWM scanner; every gene is scanned once, however many sets it is in.
+3. Builds one sparse gene x motif incidence matrix from the hits (motif_counts.py) and runs Fisher's exact
+   tests of every cluster against its own background in one vectorized call (enrichment.py).
+4. Runs the shuffled-sequence control (null_model.py) for all clusters in parallel on a process pool;
+   every cluster gets its own seed stream derived from the master seed.
+5. Writes one tidy results table with a row per cluster and motif.
+   With --families the scan and tests run on one representative per motif family (motif_families.py)
+   and the results are expanded back to every member motif.
+   With --cooccurrence, motif-pair co-occurrence and preferred spacing/orientation are tested against
+   the matched backgrounds as well (motif_cooccurrence.py).
+   With --positions, the TSS-relative positional profile of every motif is tested against the matched
+   background and shuffled foreground promoters, and one faceted heatmap is drawn (motif_positions.py).
+
+Usage:
+    python motif_enrichment_pipeline.py [--clusters 1 3 6] [--count-level {hit,gene}]
+        [--num-shuffles N] [--shuffle {mono,di,k}] [--kmer K] [--seed SEED] [--n-jobs N]
+        [--families [THRESHOLD]] [--cooccurrence] [--positions]
+
+Inputs:
+- Expression matrix (.xlsx) with clustering labels and gene expression values
+- FASTA file containing 1 kb upstream promoter sequences for Arabidopsis genes
+- Plant TF motif database in MEME format (e.g., from JASPAR)
+
+Outputs:
+- fimo.tsv with the hits of all scanned promoters
+- CSV listing the foreground and background genes of every cluster
+- Tidy CSV with Fisher and shuffled-control statistics for every cluster and motif
+- With --cooccurrence: significant motif pairs and significant pair spacings/orientations per cluster
+- With --positions: positional test table and heatmap of the motifs with a significant positional bias
+
+Thesis Reference:
+- Sections 2.4.2-2.4.4: Motif Enrichment Analysis and Statistical Controls Using Shuffling
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from Background_Arabidopsis_vs_Lotus import (CLUSTER_COLUMN, EXPR_PATH, MOTIF_FILE, UPSTREAM_FASTA,
+                                             load_expression, select_background)
+from enrichment import bh_adjust, enrichment_table
+from motif_cooccurrence import cooccurrence_table, spacing_table
+from motif_counts import build_incidence, gene_counts, group_sizes, hit_counts, membership_matrix
+from motif_families import SIMILARITY_THRESHOLD, expand_families, motif_families
+from motif_positions import plot_positional_heatmap, positional_enrichment, shuffled_position_hits
+from null_model import SHUFFLE_MODES, shuffled_score_sums
+from promoter_store import PromoterStore
+from pwm_scanner import load_pssms, scan_codes, sequence_lengths
+
+# === Config ===
+OUTPUT_DIR = "/home/15712745/personal/TF_prediction_genomes/MEME/All_clusters"
+HITS_OUTPUT = os.path.join(OUTPUT_DIR, "fimo.tsv")
+GENE_SETS_OUTPUT = os.path.join(OUTPUT_DIR, "cluster_gene_sets.csv")
+RESULTS_OUTPUT = os.path.join(OUTPUT_DIR, "motif_enrichment_all_clusters.csv")
+COOCCURRENCE_OUTPUT = os.path.join(OUTPUT_DIR, "motif_pair_cooccurrence_all_clusters.csv")
+SPACING_OUTPUT = os.path.join(OUTPUT_DIR, "motif_pair_spacing_all_clusters.csv")
+POSITIONS_OUTPUT = os.path.join(OUTPUT_DIR, "motif_positions_all_clusters.csv")
+POSITIONS_PLOT = os.path.join(OUTPUT_DIR, "motif_positions_heatmap.png")
+position_shuffles = 10
+num_shuffles = 100
+random_seed = 2025
+
+
+# === Step 1: Foreground and matched background for every cluster ===
+def build_gene_sets(df, clusters=None, cluster_column=CLUSTER_COLUMN):
+    """Return {cluster: (foreground_ids, background_ids)} for the given (default: all) clusters."""
+    if clusters is None:
+        clusters = sorted(df[cluster_column].dropna().unique())
+    gene_sets = {}
+    for cluster in clusters:
+        foreground_ids = df.loc[df[cluster_column] == cluster, 'ID'].dropna().astype(str).unique()
+        background_ids = select_background(df, cluster, cluster_column)
+        gene_sets[cluster] = (list(foreground_ids), list(background_ids))
+        print(f"Cluster {cluster}: {len(foreground_ids)} foreground / {len(background_ids)} background genes")
+    return gene_sets
+
+
+def gene_sets_table(gene_sets):
+    """Tidy table of cluster gene sets (Cluster, Set, Gene_ID)."""
+    rows = [(cluster, name, gene_id)
+            for cluster, sets in gene_sets.items()
+            for name, ids in zip(("foreground", "background"), sets)
+            for gene_id in ids]
+    return pd.DataFrame(rows, columns=['Cluster', 'Set', 'Gene_ID'])
+
+
+# === Step 2: Scan the union of all promoters once ===
+def scan_union(gene_sets, store, pssms, background, n_jobs=None):
+    """Fetch every promoter needed by any cluster once and scan it once."""
+    union = sorted({gene_id for sets in gene_sets.values() for ids in sets for gene_id in ids})
+    found_ids, codes = store.fetch_codes(union)
+    print(f"Scanning {len(found_ids)} promoters (union of all clusters, {len(union)} genes requested)...")
+    hits = scan_codes(codes, found_ids, pssms, background, n_jobs=n_jobs)
+    return found_ids, codes, hits
+
+
+# === Step 3: Fisher's exact test for all clusters at once ===
+def fisher_results(incidence, gene_sets, count_level="hit"):
+    """Paired enrichment of every cluster against its own background from one incidence matrix."""
+    clusters = list(gene_sets)
+    fg_membership, _ = membership_matrix(incidence.gene_ids, {c: gene_sets[c][0] for c in clusters})
+    bg_membership, _ = membership_matrix(incidence.gene_ids, {c: gene_sets[c][1] for c in clusters})
+
+    if count_level == "gene":
+        fg_counts, bg_counts = gene_counts(incidence, fg_membership), gene_counts(incidence, bg_membership)
+        fg_total, bg_total = group_sizes(fg_membership), group_sizes(bg_membership)
+    else:
+        fg_counts, bg_counts = hit_counts(incidence, fg_membership), hit_counts(incidence, bg_membership)
+        fg_total, bg_total = fg_counts.sum(axis=1), bg_counts.sum(axis=1)
+
+    return enrichment_table(incidence.motif_ids, fg_counts, fg_total, bg_counts, bg_total,
+                            clusters=clusters, backgrounds=clusters, paired=True).drop(columns='Background')
+
+
+# === Step 4: Shuffled controls for all clusters in parallel ===
+def _shuffle_task(args):
+    """Worker task: score sums of all shuffles of one cluster's foreground promoters."""
+    cluster, codes, pssms, background, n_shuffles, seed, kmer_size = args
+    scores = shuffled_score_sums(codes, pssms, background, n_shuffles, seed=seed, k=kmer_size, n_jobs=1)
+    return cluster, scores
+
+
+def shuffled_controls(incidence, scores, codes, gene_sets, pssms, background, n_shuffles=num_shuffles,
+                      seed=random_seed, kmer_size=1, n_jobs=None):
+    """
+    Empirical p-values of the foreground motif score sums against shuffled foreground promoters.
+    scores is the gene x motif score-sum incidence matrix of the real promoters.
+    """
+    clusters = list(gene_sets)
+    fg_membership, _ = membership_matrix(incidence.gene_ids, {c: gene_sets[c][0] for c in clusters})
+    real = np.asarray((fg_membership @ scores.matrix).todense())
+    real_hits = hit_counts(incidence, fg_membership)
+
+    seeds = np.random.SeedSequence(seed).spawn(len(clusters))
+    tasks = []
+    for c, (cluster, cluster_seed) in enumerate(zip(clusters, seeds)):
+        rows = np.sort(fg_membership[c].indices)  # foreground genes with a scanned promoter
+        tasks.append((cluster, codes[rows], pssms, background, n_shuffles, cluster_seed, kmer_size))
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=min(n_jobs, len(tasks))) as pool:
+        shuffled = dict(pool.map(_shuffle_task, tasks))
+
+    motif_ids = [pssm.motif_id for pssm in pssms]
+    frames = []
+    for c, cluster in enumerate(clusters):
+        shuf = shuffled[cluster][motif_ids].to_numpy()
+        exceed = (shuf >= real[c]).sum(axis=0)
+        pvalues = (exceed + 1) / (len(shuf) + 1)
+        # Motifs without any real hit are not tested
+        pvalues = np.where(real_hits[c] > 0, pvalues, np.nan)
+        frames.append(pd.DataFrame({
+            'Cluster': cluster,
+            'Motif': motif_ids,
+            'Real_Score_Sum': real[c],
+            'Shuffled_Mean_Score': shuf.mean(axis=0),
+            'Empirical_P_Value': pvalues,
+            'Empirical_Adj_P_Value': bh_adjust(pvalues),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+# === Step 5: Full pipeline ===
+def run_pipeline(clusters=None, count_level="hit", n_shuffles=num_shuffles, seed=random_seed, kmer_size=1,
+                 n_jobs=None, family_threshold=None, cooccurrence=False, positions=False):
+    """
+    With family_threshold, the promoters are scanned and tested with one representative per motif family
+    (motif_families.py); the results are then expanded to one row per member motif.
+    With cooccurrence, the motif-pair co-occurrence and spacing tables are written as well (motif pairs
+    stay at family level when family_threshold is set).
+    With positions, the positional profiles are tested and plotted (motif_positions.py).
+    """
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    df = load_expression(EXPR_PATH)
+    gene_sets = build_gene_sets(df, clusters)
+    gene_sets_table(gene_sets).to_csv(GENE_SETS_OUTPUT, index=False)
+    print(f"Cluster gene sets saved to: {GENE_SETS_OUTPUT}")
+
+    motif_file, families = MOTIF_FILE, None
+    if family_threshold is not None:
+        motif_file, families = motif_families(MOTIF_FILE, family_threshold)
+    pssms, background = load_pssms(motif_file)
+    found_ids, codes, hits = scan_union(gene_sets, PromoterStore(UPSTREAM_FASTA), pssms, background, n_jobs)
+    hits.to_csv(HITS_OUTPUT, sep="\t", index=False)
+    print(f"{len(hits)} motif hits written to: {HITS_OUTPUT}")
+
+    motif_ids = [pssm.motif_id for pssm in pssms]
+    incidence = build_incidence(hits, gene_ids=found_ids, motif_ids=motif_ids)
+    results = fisher_results(incidence, gene_sets, count_level)
+
+    if cooccurrence:
+        print("Motif-pair co-occurrence and spacing...")
+        cooccurrence_table(incidence, gene_sets).to_csv(COOCCURRENCE_OUTPUT, index=False)
+        spacing_table(hits, incidence, gene_sets).to_csv(SPACING_OUTPUT, index=False)
+        print(f"Motif-pair results saved to: {COOCCURRENCE_OUTPUT} and {SPACING_OUTPUT}")
+
+    if positions:
+        print(f"Positional profiles ({position_shuffles} shuffles of the foreground promoters)...")
+        fg_membership, _ = membership_matrix(incidence.gene_ids, {c: gene_sets[c][0] for c in gene_sets})
+        fg_rows = np.unique(fg_membership.indices)  # union of all foregrounds, scanned promoters only
+        shuffled = shuffled_position_hits(codes[fg_rows], np.asarray(incidence.gene_ids)[fg_rows], pssms,
+                                          background, position_shuffles, seed, kmer_size, n_jobs)
+        table, foreground, background_profiles = positional_enrichment(
+            hits, incidence.gene_ids, sequence_lengths(codes), motif_ids, gene_sets, shuffled)
+        table.to_csv(POSITIONS_OUTPUT, index=False)
+        plot_positional_heatmap(table, motif_ids, list(gene_sets), foreground, background_profiles, POSITIONS_PLOT,
+                                labels={pssm.motif_id: pssm.motif_alt_id or pssm.motif_id for pssm in pssms})
+        print(f"Positional results saved to: {POSITIONS_OUTPUT} and {POSITIONS_PLOT}")
+
+    if n_shuffles:
+        print(f"Shuffled controls: {n_shuffles} shuffles ({kmer_size}-mer preserving) per cluster...")
+        scores = build_incidence(hits, gene_ids=found_ids, motif_ids=motif_ids, values="score")
+        controls = shuffled_controls(incidence, scores, codes, gene_sets, pssms, background,
+                                     n_shuffles, seed, kmer_size, n_jobs)
+        results = results.merge(controls, on=['Cluster', 'Motif'], how='left')
+    if families is not None:
+        results = expand_families(results, families)
+
+    results.to_csv(RESULTS_OUTPUT, index=False)
+    print(f"Results for {len(gene_sets)} clusters saved to: {RESULTS_OUTPUT}")
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Motif enrichment for all expression clusters in one batch.")
+    parser.add_argument("--clusters", nargs="+", type=int, default=None,
+                        help="Cluster labels to analyse (default: all clusters in the expression table)")
+    parser.add_argument("--count-level", choices=["hit", "gene"], default="hit",
+                        help="Fisher counts: motif hits vs. all hits, or promoters with vs. without the motif")
+    parser.add_argument("--num-shuffles", type=int, default=num_shuffles,
+                        help="Shuffled sets per cluster (0 skips the shuffled control)")
+    parser.add_argument("--shuffle", choices=["mono", "di", "k"], default="mono",
+                        help="Shuffle model: mononucleotide, dinucleotide or k-mer preserving (default: mono)")
+    parser.add_argument("--kmer", type=int, default=3, help="k-mer size preserved with --shuffle k (default: 3)")
+    parser.add_argument("--seed", type=int, default=random_seed, help="Master random seed for the shuffles")
+    parser.add_argument("--n-jobs", type=int, default=None, help="Worker processes (default: all CPUs)")
+    parser.add_argument("--families", type=float, nargs="?", const=SIMILARITY_THRESHOLD, default=None,
+                        metavar="THRESHOLD",
+                        help="Scan and test one representative per motif family (similarity threshold, "
+                             f"default {SIMILARITY_THRESHOLD}); results are expanded to all member motifs")
+    parser.add_argument("--cooccurrence", action="store_true",
+                        help="Also test motif-pair co-occurrence and preferred spacing/orientation")
+    parser.add_argument("--positions", action="store_true",
+                        help="Also test TSS-relative positional profiles and plot the significant motifs")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run_pipeline(args.clusters, args.count_level, args.num_shuffles, args.seed,
+                 SHUFFLE_MODES.get(args.shuffle, args.kmer), args.n_jobs, args.families, args.cooccurrence,
+                 args.positions)
+    print("Full analysis complete.")
@@ -0,0 +1,174 @@
+"""
+Script Name: motif_families.py
+
+Purpose:
+Redundancy reduction of the JASPAR motif library before scanning and testing. ALL_plant_motifs_JASPAR.meme
+holds many near-identical matrices (several versions of one profile, members of one TF family); each of
+them multiplies the scanning cost and dilutes the Benjamini-Hochberg correction.
+  1. Pairwise similarity of all motifs, offset- and reverse-complement-aware: columns are compared by
+     Pearson correlation of their letter probabilities, and for every relative offset and strand the
+     summed column correlations are normalized by the aligned width (RSAT "Ncor": mean correlation over
+     the overlap x overlap / total aligned width). The score of a pair is the best offset/strand.
+     One matrix product per motif against all columns of all motifs gives every column correlation;
+     the offsets are summed with vectorized diagonal gathers.
+  2. Average-linkage hierarchical clustering on 1 - similarity, cut at SIMILARITY_THRESHOLD.
+  3. Each family is represented by its medoid (highest mean similarity to the other members).
+The reduced library (`<meme>.families-<threshold>-o<min_overlap>.meme`) and the membership map
+(`<meme>.families-<threshold>-o<min_overlap>.tsv`) are cached next to the MEME file. Scanning and enrichment can then
+run at family level, and family-level results are expanded back to the individual motifs.
+
+Inputs:
+- Plant TF motif database in MEME format (Data/ALL_plant_motifs_JASPAR.meme)
+
+Outputs:
+- Reduced MEME file with one representative per family
+- Membership TSV: Motif, Motif_Alt_ID, Family (representative motif ID), Family_Size, Similarity
+
+Thesis Reference:
+- Sections 2.3-2.4: motif scanning and enrichment
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.spatial.distance import squareform
+
+from pwm_scanner import ALPHABET, read_meme
+
+SIMILARITY_THRESHOLD = 0.7
+MIN_OVERLAP = 4
+
+
+def _unit_columns(pwm):
+    """Centered, unit-length columns: dot products of these are column Pearson correlations."""
+    centered = pwm - pwm.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(centered, axis=1, keepdims=True)
+    return np.divide(centered, norms, out=np.zeros_like(centered), where=norms > 0)
+
+
+def motif_similarity(motifs, min_overlap=MIN_OVERLAP):
+    """
+    Symmetric (n_motifs, n_motifs) Ncor similarity matrix, maximized over offsets and both strands.
+    Alignments must overlap by at least min(min_overlap, width of the shorter motif) columns.
+    """
+    n_motifs = len(motifs)
+    widths = np.array([len(motif.pwm) for motif in motifs])
+    max_width = widths.max()
+    # All columns of all motifs, zero-padded to max_width, for both strands of the second motif
+    padded = np.zeros((2, n_motifs, max_width, 4))
+    for j, motif in enumerate(motifs):
+        columns = _unit_columns(motif.pwm)
+        padded[0, j, :widths[j]] = columns
+        padded[1, j, :widths[j]] = columns[::-1, ::-1]  # reverse complement: A<->T, C<->G
+    columns = padded.reshape(2 * n_motifs * max_width, 4)
+
+    similarity = np.zeros((n_motifs, n_motifs))
+    for i, motif in enumerate(motifs):
+        wi = widths[i]
+        # Column correlations of motif i against every column of every motif, both strands
+        corr = (_unit_columns(motif.pwm) @ columns.T).reshape(wi, 2, n_motifs, max_width)
+        best = np.full(n_motifs, -np.inf)
+        for offset in range(-(max_width - 1), wi):
+            # Column a of motif i is aligned with column a - offset of motif j
+            a = np.arange(max(offset, 0), min(wi, offset + max_width))
+            summed = corr[a, :, :, a - offset].sum(axis=0)  # (2, n_motifs)
+            overlap = np.minimum(wi, offset + widths) - max(offset, 0)
+            total = np.maximum(wi, offset + widths) - min(offset, 0)
+            valid = overlap >= np.minimum(min_overlap, np.minimum(wi, widths))
+            ncor = np.where(valid, summed.max(axis=0) / total, -np.inf)
+            best = np.maximum(best, ncor)
+        similarity[i] = best
+    similarity = np.maximum(similarity, similarity.T)  # symmetric up to floating point
+    np.fill_diagonal(similarity, 1.0)
+    return similarity
+
+
+def cluster_motifs(similarity, threshold=SIMILARITY_THRESHOLD):
+    """Average-linkage families: motifs joined while the mean similarity is >= threshold."""
+    if len(similarity) < 2:
+        return np.ones(len(similarity), dtype=int)
+    distance = np.clip(1.0 - similarity, 0.0, None)
+    np.fill_diagonal(distance, 0.0)
+    tree = linkage(squareform(distance, checks=False), method="average")
+    return fcluster(tree, t=1.0 - threshold, criterion="distance")
+
+
+def family_table(motifs, similarity, labels):
+    """Membership map with the medoid of every family as its representative."""
+    motif_ids = np.array([motif.motif_id for motif in motifs])
+    family = np.empty(len(motifs), dtype=object)
+    to_representative = np.ones(len(motifs))
+    sizes = np.bincount(labels)
+    for label in np.unique(labels):
+        members = np.flatnonzero(labels == label)
+        block = similarity[np.ix_(members, members)]
+        medoid = members[np.argmax(block.mean(axis=1))]
+        family[members] = motif_ids[medoid]
+        to_representative[members] = similarity[members, medoid]
+    return pd.DataFrame({
+        "Motif": motif_ids,
+        "Motif_Alt_ID": [motif.motif_alt_id for motif in motifs],
+        "Family": family,
+        "Family_Size": sizes[labels],
+        "Similarity": to_representative,
+    })
+
+
+def write_meme(motifs, background, output_path):
+    """Write motifs as a minimal MEME file (same format as read_meme expects)."""
+    with open(output_path, "w") as out:
+        out.write("MEME version 4\n\nALPHABET= ACGT\n\nstrands: + -\n\n")
+        out.write("Background letter frequencies\n")
+        out.write(" ".join(f"{base} {freq:.6f}" for base, freq in zip(ALPHABET, background)) + "\n\n")
+        for motif in motifs:
+            out.write(f"MOTIF {motif.motif_id} {motif.motif_alt_id}\n".replace(" \n", "\n"))
+            out.write(f"letter-probability matrix: alength= 4 w= {len(motif.pwm)} nsites= {motif.nsites:g} E= 0\n")
+            for row in motif.pwm:
+                out.write(" " + "  ".join(f"{p:.6f}" for p in row) + "\n")
+            out.write("\n")
+
+
+def family_paths(motif_file, threshold=SIMILARITY_THRESHOLD, min_overlap=MIN_OVERLAP):
+    base = f"{motif_file}.families-{threshold:g}-o{min_overlap}"
+    return base + ".meme", base + ".tsv"
+
+
+def motif_families(motif_file, threshold=SIMILARITY_THRESHOLD, min_overlap=MIN_OVERLAP, use_cache=True):
+    """
+    Reduced library and membership map for a MEME file, built once and cached next to it
+    (rebuilt when the MEME file is newer). Returns (reduced MEME path, membership DataFrame).
+    """
+    reduced_path, map_path = family_paths(motif_file, threshold, min_overlap)
+    current = (os.path.exists(reduced_path) and os.path.exists(map_path)
+               and os.path.getmtime(map_path) >= os.path.getmtime(motif_file))
+    if use_cache and current:
+        return reduced_path, pd.read_csv(map_path, sep="\t")
+
+    motifs, background = read_meme(motif_file)
+    similarity = motif_similarity(motifs, min_overlap)
+    families = family_table(motifs, similarity, cluster_motifs(similarity, threshold))
+    representatives = set(families["Family"])
+    write_meme([motif for motif in motifs if motif.motif_id in representatives], background, reduced_path)
+    families.to_csv(map_path, sep="\t", index=False)
+    print(f"{len(motifs)} motifs reduced to {len(representatives)} families (similarity >= {threshold:g})")
+    return reduced_path, families
+
+
+def to_families(hits, families, motif_column="motif_id"):
+    """Relabel hits of the full library with their family representative (family-level counting)."""
+    family_of = families.set_index("Motif")["Family"]
+    return hits.assign(**{motif_column: hits[motif_column].astype(str).map(family_of).fillna(hits[motif_column])})
+
+
+def expand_families(results, families, motif_column="Motif"):
+    """
+    Expand family-level results (one row per representative) to every member motif. Adds
+    Family, Member_Motif, Member_Alt_ID and Similarity (member to representative).
+    """
+    members = families.rename(columns={"Family": motif_column, "Motif": "Member_Motif",
+                                       "Motif_Alt_ID": "Member_Alt_ID"})
+    expanded = results.merge(members[[motif_column, "Member_Motif", "Member_Alt_ID", "Family_Size", "Similarity"]],
+                             on=motif_column, how="left")
+    return expanded.rename(columns={motif_column: "Family"}).rename(columns={"Member_Motif": motif_column})
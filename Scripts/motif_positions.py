@@ -0,0 +1,232 @@
+"""
+Script Name: motif_positions.py
+
+Purpose:
+Positional distribution of motif hits relative to the transcription start site (TSS). The promoters are the
+TAIR10 1 kb upstream windows in gene orientation, so the last base of every promoter is position -1.
+  1. Hit centres are converted to TSS-relative positions and binned (POSITION_BIN bp bins over
+     -POSITION_WINDOW..-1). The (group x motif x bin) histograms of all clusters are built with a single
+     np.bincount over encoded indices; a hit is counted once for every gene set its promoter belongs to.
+  2. Every motif's foreground profile is compared with the matched-background profile and, optionally,
+     with the profile of the same motif in shuffled foreground promoters (positional information removed,
+     composition kept), using vectorized tests over all motifs and clusters at once:
+       - chi-square test of homogeneity of the 2 x n_bins table (foreground vs. reference)
+       - two-sample Kolmogorov-Smirnov distance on the binned cumulative profiles (asymptotic p-value;
+         binning makes it conservative)
+     p-values are BH-adjusted across motifs per cluster.
+  3. One faceted heatmap (one panel per cluster, one row per significant motif) shows the log2 ratio of
+     the foreground to the background positional profile.
+
+Inputs:
+- Motif hit table (pwm_scanner output or fimo.tsv) and promoter lengths of the scanned genes
+- Cluster gene sets {cluster: (foreground IDs, background IDs)} (motif_enrichment_pipeline.build_gene_sets)
+- Optional: hits in shuffled foreground promoters (shuffled_position_hits)
+
+Outputs:
+- Tidy table per cluster and motif: hit counts, peak bin, chi-square and KS statistics with q-values
+- Faceted heatmap of the positional enrichment of all significant motifs
+
+Thesis Reference:
+- Section 2.4.3: Motif Enrichment Statistical Analysis
+- Section 2.4.4: Statistical Controls Using Shuffling
+"""
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+from scipy.stats import chi2, kstwobign
+
+from enrichment import bh_adjust
+from motif_counts import membership_matrix, normalize_gene_ids
+from null_model import shuffle_codes
+from pwm_scanner import scan_codes
+
+POSITION_WINDOW = 1000  # bp upstream of the TSS
+POSITION_BIN = 50       # bp per bin
+MIN_HITS = 20           # foreground hits needed for a motif to be tested
+MAX_QVALUE = 0.05
+
+
+def tss_positions(hits, gene_ids, promoter_lengths):
+    """
+    Gene codes, motif IDs and TSS-relative hit-centre positions (-length..-1) of the hits on gene_ids.
+    promoter_lengths follows gene_ids; hits on other genes are dropped.
+    """
+    genes = pd.Categorical(normalize_gene_ids(hits["sequence_name"]), categories=list(gene_ids)).codes
+    keep = genes >= 0
+    centre = (hits["start"].to_numpy(dtype=np.int64)[keep] + hits["stop"].to_numpy(dtype=np.int64)[keep]) // 2
+    lengths = np.asarray(promoter_lengths, dtype=np.int64)
+    return genes[keep], hits["motif_id"].astype(str).to_numpy()[keep], centre - lengths[genes[keep]] - 1
+
+
+def position_histograms(hits, gene_ids, promoter_lengths, motif_ids, membership, window=POSITION_WINDOW,
+                        bin_width=POSITION_BIN):
+    """
+    (n_groups, n_motifs, n_bins) hit counts per TSS-relative bin for every group of the membership matrix
+    (group x gene, motif_counts.membership_matrix), from one np.bincount over (group, motif, bin) indices.
+    """
+    n_bins = -(-window // bin_width)
+    genes, motifs, position = tss_positions(hits, gene_ids, promoter_lengths)
+    motif_codes = pd.Categorical(motifs, categories=list(motif_ids)).codes
+    keep = (motif_codes >= 0) & (position >= -window)
+    genes, motif_codes = genes[keep], motif_codes[keep].astype(np.int64)
+    bins = (position[keep] + window) // bin_width
+
+    # Repeat every hit once per group containing its gene (CSC column = groups of one gene)
+    by_gene = membership.tocsc()
+    n_groups_of_hit = np.diff(by_gene.indptr)[genes]
+    hit = np.repeat(np.arange(len(genes)), n_groups_of_hit)
+    within = np.arange(len(hit)) - np.repeat(np.cumsum(n_groups_of_hit) - n_groups_of_hit, n_groups_of_hit)
+    groups = by_gene.indices[by_gene.indptr[genes[hit]] + within]
+
+    n_motifs = len(motif_ids)
+    encoded = (groups.astype(np.int64) * n_motifs + motif_codes[hit]) * n_bins + bins[hit]
+    counts = np.bincount(encoded, minlength=membership.shape[0] * n_motifs * n_bins)
+    return counts.reshape(membership.shape[0], n_motifs, n_bins)
+
+
+def profile_tests(observed, reference, min_hits=MIN_HITS):
+    """
+    Compare positional profiles along the last axis, vectorized over all leading axes.
+    Returns a dict of arrays: chi2, chi2_pvalue (homogeneity of the 2 x n_bins table), ks_d and
+    ks_pvalue (asymptotic two-sample KS). Profiles with fewer than min_hits observed hits get NaN.
+    """
+    observed, reference = np.broadcast_arrays(np.asarray(observed, dtype=float), np.asarray(reference, dtype=float))
+    n_obs = observed.sum(axis=-1, keepdims=True)
+    n_ref = reference.sum(axis=-1, keepdims=True)
+    column = observed + reference
+    total = n_obs + n_ref
+    with np.errstate(divide="ignore", invalid="ignore"):
+        expected_obs = n_obs * column / total
+        expected_ref = n_ref * column / total
+        terms = np.where(column > 0, (observed - expected_obs) ** 2 / expected_obs
+                         + (reference - expected_ref) ** 2 / expected_ref, 0.0)
+        cdf_obs = np.cumsum(observed, axis=-1) / n_obs
+        cdf_ref = np.cumsum(reference, axis=-1) / n_ref
+        effective_n = np.sqrt(n_obs * n_ref / total)[..., 0]
+    statistic = terms.sum(axis=-1)
+    dof = (column > 0).sum(axis=-1) - 1
+    ks_d = np.abs(cdf_obs - cdf_ref).max(axis=-1)
+
+    testable = (n_obs[..., 0] >= min_hits) & (n_ref[..., 0] > 0) & (dof > 0)
+    return {
+        "chi2": np.where(testable, statistic, np.nan),
+        "chi2_pvalue": np.where(testable, chi2.sf(statistic, np.maximum(dof, 1)), np.nan),
+        "ks_d": np.where(testable, ks_d, np.nan),
+        "ks_pvalue": np.where(testable, kstwobign.sf(ks_d * effective_n), np.nan),
+    }
+
+
+def log2_profile_ratio(observed, reference, pseudocount=0.5):
+    """log2 of the foreground over the reference positional profile (each normalized to its total hits)."""
+    observed, reference = np.asarray(observed, dtype=float), np.asarray(reference, dtype=float)
+    n_bins = observed.shape[-1]
+    obs = (observed + pseudocount) / (observed.sum(axis=-1, keepdims=True) + pseudocount * n_bins)
+    ref = (reference + pseudocount) / (reference.sum(axis=-1, keepdims=True) + pseudocount * n_bins)
+    return np.log2(obs / ref)
+
+
+def bin_starts(window=POSITION_WINDOW, bin_width=POSITION_BIN):
+    """TSS-relative start position of every bin."""
+    return -window + bin_width * np.arange(-(-window // bin_width))
+
+
+def positional_table(motif_ids, clusters, foreground, background, shuffled=None, window=POSITION_WINDOW,
+                     bin_width=POSITION_BIN, min_hits=MIN_HITS, max_qvalue=MAX_QVALUE):
+    """
+    Tidy table of the positional tests for every cluster and motif. foreground / background / shuffled are
+    (n_clusters, n_motifs, n_bins) histograms. A motif is Significant when its chi-square q-value against
+    the background (and against the shuffled profile, when given) is at most max_qvalue.
+    """
+    n_clusters, n_motifs, _ = foreground.shape
+    starts = bin_starts(window, bin_width)
+    peak = np.argmax(log2_profile_ratio(foreground, background), axis=-1)
+    table = pd.DataFrame({
+        "Cluster": np.repeat(clusters, n_motifs),
+        "Motif": np.tile(np.asarray(motif_ids), n_clusters),
+        "Foreground_Hits": foreground.sum(axis=-1).ravel(),
+        "Background_Hits": background.sum(axis=-1).ravel(),
+        "Peak_Bin_Start": starts[peak].ravel(),
+    })
+    significant = np.ones((n_clusters, n_motifs), dtype=bool)
+    references = {"Background": background} if shuffled is None else {"Background": background,
+                                                                      "Shuffled": shuffled}
+    for name, reference in references.items():
+        tests = profile_tests(foreground, reference, min_hits)
+        chi2_q = bh_adjust(tests["chi2_pvalue"])
+        table[f"Chi2_{name}"] = tests["chi2"].ravel()
+        table[f"Chi2_P_Value_{name}"] = tests["chi2_pvalue"].ravel()
+        table[f"Chi2_Adj_P_Value_{name}"] = chi2_q.ravel()
+        table[f"KS_D_{name}"] = tests["ks_d"].ravel()
+        table[f"KS_P_Value_{name}"] = tests["ks_pvalue"].ravel()
+        table[f"KS_Adj_P_Value_{name}"] = bh_adjust(tests["ks_pvalue"]).ravel()
+        significant &= chi2_q <= max_qvalue
+    table["Significant"] = significant.ravel()
+    return table
+
+
+def plot_positional_heatmap(table, motif_ids, clusters, foreground, background, output_plot, labels=None,
+                            window=POSITION_WINDOW, bin_width=POSITION_BIN):
+    """
+    One figure with a heatmap panel per cluster: log2(foreground / background profile) of every motif that
+    is significant in any cluster, ordered by peak position. labels maps motif IDs to display names.
+    """
+    significant = table.loc[table["Significant"], ["Motif", "Peak_Bin_Start"]]
+    if significant.empty:
+        print("No motif with a significant positional bias; heatmap not written.")
+        return None
+    order = significant.groupby("Motif")["Peak_Bin_Start"].min().sort_values(kind="stable").index
+    index = {motif: i for i, motif in enumerate(motif_ids)}
+    rows = [index[motif] for motif in order]
+    ratio = log2_profile_ratio(foreground, background)[:, rows, :]
+    limit = max(np.nanmax(np.abs(ratio)), 1e-9)
+
+    labels = labels or {}
+    x_labels = bin_starts(window, bin_width)
+    fig, axes = plt.subplots(1, len(clusters), figsize=(3 + 4 * len(clusters), 3 + 0.25 * len(rows)),
+                             sharey=True, squeeze=False)
+    colorbar_ax = fig.add_axes([0.91, 0.3, 0.012, 0.4])
+    for c, (cluster, ax) in enumerate(zip(clusters, axes[0])):
+        sns.heatmap(pd.DataFrame(ratio[c], index=[labels.get(m, m) for m in order], columns=x_labels),
+                    ax=ax, cmap="RdBu_r", center=0, vmin=-limit, vmax=limit, cbar=c == 0, cbar_ax=colorbar_ax,
+                    cbar_kws={"label": "log2(foreground / background)"})
+        ax.set_title(f"Cluster {cluster}")
+        ax.set_xlabel("Position relative to TSS (bp, bin start)")
+    axes[0][0].set_ylabel("")
+    fig.suptitle("Positional distribution of motif hits (significant motifs)", y=1.02)
+    fig.subplots_adjust(right=0.88)
+    fig.savefig(output_plot, dpi=300, bbox_inches="tight")
+    plt.close(fig)
+    return output_plot
+
+
+def shuffled_position_hits(codes, gene_ids, pssms, background, n_shuffles, seed=None, k=1, n_jobs=None):
+    """
+    Scan n_shuffles shuffled copies of the promoters (codes, rows follow gene_ids). The hits keep the gene
+    IDs, so the shuffled promoters are binned with the lengths and gene sets of the real ones.
+    """
+    shuffled = shuffle_codes(codes, n_shuffles, seed, k=k, n_jobs=n_jobs)
+    names = np.tile(np.asarray(gene_ids), n_shuffles)
+    return scan_codes(shuffled.reshape(-1, codes.shape[-1]), names, pssms, background, n_jobs=n_jobs)
+
+
+def positional_enrichment(hits, gene_ids, promoter_lengths, motif_ids, gene_sets, shuffled_hits=None,
+                          window=POSITION_WINDOW, bin_width=POSITION_BIN, min_hits=MIN_HITS):
+    """
+    Positional tests of every cluster's foreground against its matched background (and shuffled hits).
+    Returns (table, foreground, background) with the (n_clusters, n_motifs, n_bins) histograms.
+    """
+    clusters = list(gene_sets)
+    fg_membership, _ = membership_matrix(gene_ids, {c: gene_sets[c][0] for c in clusters})
+    bg_membership, _ = membership_matrix(gene_ids, {c: gene_sets[c][1] for c in clusters})
+    foreground = position_histograms(hits, gene_ids, promoter_lengths, motif_ids, fg_membership, window, bin_width)
+    background = position_histograms(hits, gene_ids, promoter_lengths, motif_ids, bg_membership, window, bin_width)
+    shuffled = None
+    if shuffled_hits is not None:
+        shuffled = position_histograms(shuffled_hits, gene_ids, promoter_lengths, motif_ids, fg_membership,
+                                       window, bin_width)
+    table = positional_table(motif_ids, clusters, foreground, background, shuffled, window, bin_width, min_hits)
+    for cluster, n in table.groupby("Cluster")["Significant"].sum().items():
+        print(f"Cluster {cluster}: {n} motifs with a significant positional bias")
+    return table, foreground, background
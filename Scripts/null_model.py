@@ -0,0 +1,265 @@
+"""
+Script Name: null_model.py
+
+Purpose:
+Batched shuffled-sequence null model for motif enrichment. Instead of writing one shuffled FASTA file per
+round and scanning each file separately, all shuffles are created in memory as a single
+(n_shuffles, n_genes, length) uint8 array from a seeded NumPy generator, scanned in one pass with the
+PWM scanner and reduced directly to per-motif score sums for every shuffle.
+
+Shuffle modes:
+- k = 1 (mono): letters are permuted independently; base composition is preserved
+- k = 2 (di) or higher: k-mer-preserving shuffle (Altschul & Erickson 1985) via a random Eulerian path
+  through the (k-1)-mer graph. Dinucleotide shuffles keep CpG depletion and AT-run structure, which gives
+  a stricter null for AT-rich plant promoters. Sequences are shuffled in parallel blocks; every gene gets
+  its own seed stream derived from the master seed, so results do not depend on the number of workers.
+
+Adaptive permutation testing (Besag & Clifford 1991, sequential Monte Carlo p-values):
+shuffles are generated in rounds and each motif keeps being tested only until its shuffled score sum
+has reached or exceeded the real score h times. Clearly non-significant motifs are retired after a few
+dozen shuffles, while motifs that are rarely exceeded continue up to max_shuffles, which gives p-values
+down to 1 / (max_shuffles + 1) at a fraction of the cost of a fixed number of shuffles for every motif.
+
+Running this file directly benchmarks the shuffle modes against the original list-based random.shuffle.
+
+Inputs:
+- Encoded promoter sequences (see pwm_scanner.encode_sequences)
+- PSSMs and background frequencies from pwm_scanner.load_pssms
+
+Outputs:
+- DataFrame of motif score sums with one row per shuffle and one column per motif
+
+Thesis Reference:
+- Section 2.4.4: "Statistical Controls Using Shuffling"
+"""
+
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from pwm_scanner import PAD_CODE, decode_sequence, motif_score_sums, sequence_lengths
+
+SHUFFLE_MODES = {"mono": 1, "di": 2}
+
+
+def shuffle_codes(codes, num_shuffles, seed=None, k=1, n_jobs=None):
+    """
+    Shuffle every encoded sequence num_shuffles times, preserving k-mer counts (k=1: mononucleotide).
+    Padding stays at the end of each sequence. Returns an array of shape (num_shuffles, n_genes, length).
+    """
+    if k > 1:
+        return _kmer_shuffle_batch(codes, num_shuffles, seed, k, n_jobs)
+
+    rng = np.random.default_rng(seed)
+    batch = np.broadcast_to(codes, (num_shuffles,) + codes.shape)
+
+    # Sorting random keys gives an independent permutation per sequence; padding keys sort last
+    keys = rng.random(batch.shape, dtype=np.float32)
+    keys[batch == PAD_CODE] = 2.0
+    order = np.argsort(keys, axis=-1)
+    return np.take_along_axis(batch, order, axis=-1)
+
+
+def kmer_shuffle(seq, k, rng):
+    """
+    Return a random shuffle of one encoded sequence (1-D, no padding) with the same k-mer counts.
+
+    Follows Altschul & Erickson: the sequence is a path through the multigraph of (k-1)-mers, one edge
+    per k-mer. A random spanning arborescence towards the final vertex (Wilson's algorithm) fixes the
+    last exit edge of every vertex; the other exit edges are permuted randomly, and walking the graph
+    from the first vertex gives a uniformly random Eulerian path, i.e. a random k-mer-preserving sequence.
+    """
+    n_edges = len(seq) - k + 1
+    if n_edges <= 1:
+        return seq.copy()
+
+    # (k-1)-mer vertex for every position; base 5 covers the N code
+    vertex = seq[:n_edges + 1].astype(np.int64)
+    for i in range(1, k - 1):
+        vertex = vertex * 5 + seq[i:n_edges + 1 + i]
+    _, vertex = np.unique(vertex, return_inverse=True)
+    src, dst = vertex[:-1], vertex[1:]
+    letters = seq[k - 1:]
+    n_vertices = vertex.max() + 1
+    root = vertex[-1]
+
+    by_source = np.argsort(src, kind="stable")
+    out_degree = np.bincount(src, minlength=n_vertices)
+    first_edge = np.concatenate(([0], np.cumsum(out_degree)[:-1]))
+
+    # Wilson's algorithm: loop-erased random walks give a random arborescence of last exit edges
+    in_tree = np.zeros(n_vertices, dtype=bool)
+    in_tree[root] = True
+    last_exit = np.full(n_vertices, -1)
+    for start in range(n_vertices):
+        u = start
+        while not in_tree[u]:
+            edge = by_source[first_edge[u] + rng.integers(out_degree[u])]
+            last_exit[u] = edge
+            u = dst[edge]
+        u = start
+        while not in_tree[u]:
+            in_tree[u] = True
+            u = dst[last_exit[u]]
+
+    # Random order of the remaining exit edges, with the arborescence edge used last
+    keys = rng.random(n_edges)
+    keys[last_exit[last_exit >= 0]] = 2.0
+    edge_order = np.lexsort((keys, src)).tolist()
+
+    next_edge = first_edge.tolist()
+    dst, letters = dst.tolist(), letters.tolist()
+    walk = []
+    u = vertex[0]
+    for _ in range(n_edges):
+        edge = edge_order[next_edge[u]]
+        next_edge[u] += 1
+        walk.append(letters[edge])
+        u = dst[edge]
+
+    return np.concatenate((seq[:k - 1], np.array(walk, dtype=seq.dtype)))
+
+
+def _kmer_shuffle_task(args):
+    """Worker task: all shuffles for one block of genes."""
+    codes, seeds, num_shuffles, k = args
+    lengths = sequence_lengths(codes)
+    out = np.full((num_shuffles,) + codes.shape, PAD_CODE, dtype=codes.dtype)
+    for gene, (seq, length, seed) in enumerate(zip(codes, lengths, seeds)):
+        rng = np.random.default_rng(seed)
+        for i in range(num_shuffles):
+            out[i, gene, :length] = kmer_shuffle(seq[:length], k, rng)
+    return out
+
+
+def _kmer_shuffle_batch(codes, num_shuffles, seed, k, n_jobs):
+    """k-mer-preserving shuffles for all genes, spread over a process pool in blocks of genes."""
+    n_jobs = n_jobs or os.cpu_count() or 1
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    seeds = root.spawn(len(codes))
+    bounds = np.linspace(0, len(codes), min(len(codes), n_jobs * 4) + 1).astype(int)
+    tasks = [(codes[a:b], seeds[a:b], num_shuffles, k) for a, b in zip(bounds[:-1], bounds[1:]) if a < b]
+
+    if n_jobs == 1:
+        blocks = [_kmer_shuffle_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            blocks = list(pool.map(_kmer_shuffle_task, tasks))
+    return np.concatenate(blocks, axis=1)
+
+
+def shuffled_score_sums(codes, pssms, background, num_shuffles, seed=None, k=1, **scan_kwargs):
+    """
+    Build all shuffles in memory, scan them in one batched pass and return the per-motif score sums.
+    Returns a DataFrame with one row per shuffle and one column per motif ID.
+    """
+    shuffled = shuffle_codes(codes, num_shuffles, seed, k=k, n_jobs=scan_kwargs.get("n_jobs"))
+    sums, _ = motif_score_sums(shuffled, pssms, background, **scan_kwargs)
+    return pd.DataFrame(sums, columns=[pssm.motif_id for pssm in pssms])
+
+
+def real_score_sums(codes, pssms, background, **scan_kwargs):
+    """Per-motif score sums and hit counts for the real (unshuffled) sequences."""
+    sums, counts = motif_score_sums(codes[None], pssms, background, **scan_kwargs)
+    motif_ids = [pssm.motif_id for pssm in pssms]
+    return pd.Series(sums[0], index=motif_ids), pd.Series(counts[0], index=motif_ids)
+
+
+def adaptive_pvalues(codes, pssms, background, real_scores, h=10, round_size=100, max_shuffles=10000,
+                     seed=None, k=1, **scan_kwargs):
+    """
+    Sequential Monte Carlo (Besag-Clifford) empirical p-values for the motifs in real_scores.
+
+    Each round builds round_size new shuffles and scans them only with the motifs that are still active.
+    A motif is retired as soon as its h-th exceedance (shuffled sum >= real sum) is observed after l
+    shuffles, giving p = h / l. Motifs that never reach h exceedances run to max_shuffles and get
+    p = (g + 1) / (n + 1), with g exceedances in n shuffles.
+    Returns a DataFrame with the real and mean shuffled scores, p-value, exceedances and shuffles used.
+    """
+    motif_ids = list(real_scores.index)
+    by_id = {pssm.motif_id: pssm for pssm in pssms}
+    real = real_scores.values.astype(float)
+
+    n_done = np.zeros(len(motif_ids), dtype=np.int64)
+    exceed = np.zeros(len(motif_ids), dtype=np.int64)
+    score_sum = np.zeros(len(motif_ids))
+    pvalues = np.full(len(motif_ids), np.nan)
+    active = np.arange(len(motif_ids))
+
+    round_seeds = np.random.SeedSequence(seed).spawn(int(np.ceil(max_shuffles / round_size)))
+    for round_number, round_seed in enumerate(round_seeds):
+        if len(active) == 0:
+            break
+        n_round = min(round_size, max_shuffles - round_number * round_size)
+        shuffled = shuffle_codes(codes, n_round, round_seed, k=k, n_jobs=scan_kwargs.get("n_jobs"))
+        sums, _ = motif_score_sums(shuffled, [by_id[motif_ids[i]] for i in active], background, **scan_kwargs)
+
+        # Position (1-based) within this round at which each motif reaches its h-th exceedance
+        hits = np.cumsum(sums >= real[active], axis=0) + exceed[active]
+        reached = hits[-1] >= h
+        stop_at = np.where(reached, np.argmax(hits >= h, axis=0) + 1, n_round)
+
+        used = np.arange(n_round)[:, None] < stop_at
+        score_sum[active] += np.where(used, sums, 0).sum(axis=0)
+        exceed[active] = hits[stop_at - 1, np.arange(len(active))]
+        n_done[active] += stop_at
+        pvalues[active[reached]] = h / n_done[active[reached]]
+
+        active = active[~reached]
+        print(f"Round {round_number + 1}: {n_done.sum()} motif-shuffles scanned, {len(active)} motifs still active")
+
+    pvalues[active] = (exceed[active] + 1) / (n_done[active] + 1)
+    return pd.DataFrame({
+        'motif_id': motif_ids,
+        'Real_Score_Sum': real,
+        'Shuffled_Mean_Score': score_sum / np.maximum(n_done, 1),
+        'P_Value': pvalues,
+        'Exceedances': exceed,
+        'Num_Shuffles': n_done,
+    })
+
+
+def kmer_counts(codes, k):
+    """Count k-mers (base-5 codes) in a 1-D encoded sequence."""
+    kmers = codes[:len(codes) - k + 1].astype(np.int64)
+    for i in range(1, k):
+        kmers = kmers * 5 + codes[i:len(codes) - k + 1 + i]
+    return np.bincount(kmers, minlength=5 ** k)
+
+
+def _list_shuffle(sequence):
+    """Original shuffle from Shuffled_control_At_100_times.py, kept as the benchmark reference."""
+    seq_list = list(sequence)
+    random.shuffle(seq_list)
+    return ''.join(seq_list)
+
+
+def benchmark(n_genes=300, length=1000, num_shuffles=10, seed=1):
+    """Time the original list shuffle against the vectorized and k-mer-preserving shuffles."""
+    rng = np.random.default_rng(seed)
+    # AT-rich random promoters (about 65% A/T), similar to Arabidopsis upstream regions
+    codes = rng.choice(4, size=(n_genes, length), p=[0.33, 0.17, 0.17, 0.33]).astype(np.uint8)
+    sequences = [decode_sequence(row) for row in codes]
+
+    start = time.perf_counter()
+    for _ in range(num_shuffles):
+        [_list_shuffle(seq) for seq in sequences]
+    print(f"list random.shuffle : {time.perf_counter() - start:8.3f} s")
+
+    for mode, k in [("mono", 1), ("di", 2), ("k=3", 3)]:
+        start = time.perf_counter()
+        shuffled = shuffle_codes(codes, num_shuffles, seed=seed, k=k)
+        elapsed = time.perf_counter() - start
+        preserved = all(
+            np.array_equal(kmer_counts(codes[g], k), kmer_counts(shuffled[0, g], k)) for g in range(n_genes)
+        )
+        print(f"{mode:<20}: {elapsed:8.3f} s   {k}-mer counts preserved: {preserved}")
+
+
+if __name__ == "__main__":
+    print("Benchmark: 300 promoters x 1000 bp, 10 shuffles")
+    benchmark()
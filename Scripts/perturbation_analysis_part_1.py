@@ -2,101 +2,178 @@
 Script Name: perturbation_analysis_part_1.py
 
 Purpose:
-This script performs a topological robustness analysis on the SC-specific Arabidopsis GRN. It iteratively removes
-the top transcription factors (TFs) by degree and measures the impact on:
+This script performs a topological robustness analysis on the SC-specific Arabidopsis GRN. It removes
+every transcription factor (TF) in turn and measures the impact on:
   - Number of components
   - Size of the largest component
   - Average shortest path length
 
 Steps:
 1. Load GRN inferred by GRNBoost2 and filter by importance threshold.
-2. Rank TFs by their node degree in the directed graph.
-3. Iteratively remove each top TF and recalculate graph metrics.
-4. Save the resulting perturbation statistics to CSV.
+2. Build CSR adjacency arrays once (grn_graph.py).
+3. Compute components and largest component size after removing each TF for all TFs from a single
+   articulation-point pass (grn_perturbation.py), without copying the graph.
+4. Estimate average shortest path lengths for the top TFs by degree with pivot-sampled BFS on the CSR
+   arrays (path_length.py), in parallel over TFs, with confidence intervals.
+5. Compare each TF's effect with degree-preserving rewired null networks (grn_null.py): z-scores and
+   empirical p-values for the components gained and the largest-component loss, each relative to the
+   network's own intact graph.
+6. Save the resulting perturbation statistics to CSV.
+
+Usage:
+    python perturbation_analysis_part_1.py                       # single TF removals
+    python perturbation_analysis_part_1.py --sweep pairs [--top-n 50]
+    python perturbation_analysis_part_1.py --sweep {greedy,random} [--steps 20] [--replicates 100] [--seed S]
+    python perturbation_analysis_part_1.py --thresholds 0.5 1 2 5 10
+Sweeps remove several TFs at once (grn_knockout.py) and write Parquet with resumable checkpoints.
+--thresholds reports components, largest component and top TFs per importance cutoff (grn_threshold.py).
 
 Inputs:
 - GRNBoost2 output TSV file with columns: TF, target, importance
 
 Outputs:
-- CSV file with perturbation metrics per TF (degree, #components, avg path length, largest CC)
+- CSV file with perturbation metrics per TF (degree, #components, avg path length, largest CC,
+  articulation point flag, path length confidence interval, null z-scores/p-values), sorted by degree
 
 Thesis Reference:
 - Section 2.6.4: "Network Validation and Robustness Analysis" (used in Figure 9)
 """
 
+import argparse
+
 import pandas as pd
-import networkx as nx
-import numpy as np
-from tqdm import tqdm
+
+from grn_graph import build_graph, load_grn
+from grn_knockout import STRATEGIES, run_sweep
+from grn_null import perturbation_significance
+from grn_perturbation import single_removal_effects
+from grn_threshold import threshold_sweep
+from path_length import removal_path_lengths
 
 # === Configuration ===
 network_file = "/home/15712745/personal/TF_prediction_genomes/Gene_regulatory_network/grnboost2_output_AtSC_vs_LjSC_final_8_6_2025.tsv"
 output_file = "/home/15712745/personal/TF_prediction_genomes/Gene_regulatory_network/Network_validation_and_robustness_of_network/At_Network_perturbation_results_cutoff2_9_6_2025.csv"
 
 importance_threshold = 2.0
+# Consensus networks (grn_consensus.py): keep edges recovered in at least this fraction of replicates
+min_edge_frequency = None
+# Average path lengths are computed for the top TFs by degree (None: all TFs)
 top_n_tfs = 100
-
-# === Step 1: Load and filter GRN ===
-print("Loading GRNBoost2 output...")
-df = pd.read_csv(network_file, sep="\t")
-df = df[df["importance"] > importance_threshold]
-print(f"Retained {len(df)} edges with importance > {importance_threshold}")
-
-# === Step 2: Construct directed network ===
-G_real = nx.from_pandas_edgelist(df, source="TF", target="target", create_using=nx.DiGraph())
-
-# Ensure all TFs are included (some may only regulate others)
-for tf in df["TF"].unique():
-    if tf not in G_real:
-        G_real.add_node(tf)
-
-print(f"Network: {G_real.number_of_nodes()} nodes, {G_real.number_of_edges()} edges")
-
-# === Step 3: Compute degree centrality and select top TFs ===
-print("📈 Ranking TFs by degree...")
-degree_dict = dict(G_real.degree())
-top_tfs = sorted(degree_dict.items(), key=lambda x: x[1], reverse=True)[:top_n_tfs]
-print(f"Selected top {top_n_tfs} TFs for perturbation.")
-
-# === Step 4: Define metric computation ===
-def compute_network_stats(G):
-    stats = {}
-
-    # Count number of weakly connected components
-    stats["num_components"] = nx.number_weakly_connected_components(G)
-
-    # Analyze the largest component
-    largest_cc = max(nx.weakly_connected_components(G), key=len)
-    subgraph = G.subgraph(largest_cc)
-
-    try:
-        stats["avg_path_length"] = nx.average_shortest_path_length(subgraph)
-    except Exception:
-        stats["avg_path_length"] = np.nan
-
-    stats["largest_component_size"] = len(largest_cc)
-    return stats
-
-# === Step 5: Run perturbation analysis ===
-print("Running TF removal simulations...")
-perturbation_results = []
-
-for tf, degree in tqdm(top_tfs):
-    if tf not in G_real:
-        print(f"Skipping TF {tf} — not found in graph.")
-        continue
-
-    G_copy = G_real.copy()
-    G_copy.remove_node(tf)
-
-    stats = compute_network_stats(G_copy)
-    stats["Removed_TF"] = tf
-    stats["Original_Degree"] = degree
-    perturbation_results.append(stats)
-
-# === Step 6: Save output ===
-df_out = pd.DataFrame(perturbation_results)
-df_out = df_out[["Removed_TF", "Original_Degree", "num_components", "avg_path_length", "largest_component_size"]]
-df_out.to_csv(output_file, index=False)
-
-print(f"\nPerturbation analysis complete. Results saved to:\n{output_file}")
+# Path length semantics (see path_length.py): "undirected" = all pairs of the largest weakly connected
+# component, ignoring edge direction; "directed" = pairs reachable along TF → target edges
+path_length_mode = "undirected"
+# BFS sources sampled per perturbed network; components with at most this many nodes are solved exactly
+n_pivots = 256
+random_seed = 2025
+n_jobs = None  # worker processes (None: all CPUs)
+
+# Degree-preserving rewired networks used as null for the single-removal effects (0 disables)
+n_null_networks = 100
+
+# Knockout sweeps (--sweep): pairs among the top hubs, greedy or random attack over all TFs
+sweep_output_file = "/home/15712745/personal/TF_prediction_genomes/Gene_regulatory_network/Network_validation_and_robustness_of_network/At_Network_knockout_{strategy}_cutoff{cutoff:g}.parquet"
+sweep_top_n = 50
+sweep_steps = 20
+sweep_replicates = 100
+
+# Importance threshold sweep (--thresholds): network statistics at every cutoff from one sorted-edge pass
+threshold_summary_file = "/home/15712745/personal/TF_prediction_genomes/Gene_regulatory_network/Network_validation_and_robustness_of_network/At_Network_threshold_sweep.csv"
+threshold_rankings_file = "/home/15712745/personal/TF_prediction_genomes/Gene_regulatory_network/Network_validation_and_robustness_of_network/At_Network_threshold_sweep_top_TFs.csv"
+threshold_top_k = 20
+
+def run_knockout_sweep(df, graph, args):
+    """Multi-TF knockouts; results are checkpointed, so re-running the same command resumes the sweep."""
+    tfs = single_removal_effects(graph)
+    tfs = tfs.loc[tfs["Node"].isin(set(df["TF"].astype(str))), "Node"].tolist()  # sorted by degree
+    candidates = tfs[:args.top_n] if args.sweep == "pairs" else tfs
+    output = sweep_output_file.format(strategy=args.sweep, cutoff=importance_threshold)
+
+    print(f"Running {args.sweep} knockout sweep over {len(candidates)} TFs...")
+    results = run_sweep(graph, args.sweep, candidates, output, steps=args.steps, replicates=args.replicates,
+                        seed=args.seed, n_jobs=args.n_jobs)
+    print(f"{len(results)} knockout sets evaluated. Results saved to:\n{output}")
+
+
+def run_threshold_sweep(cutoffs):
+    """Component statistics and TF degree rankings for every importance cutoff."""
+    print(f"Sweeping {len(cutoffs)} importance cutoffs over the unfiltered GRN...")
+    summary, rankings = threshold_sweep(load_grn(network_file), cutoffs, top_k=threshold_top_k)
+    print(summary.to_string(index=False))
+    summary.to_csv(threshold_summary_file, index=False)
+    rankings.to_csv(threshold_rankings_file, index=False)
+    print(f"Threshold sweep saved to:\n{threshold_summary_file}\n{threshold_rankings_file}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="TF removal robustness analysis of the GRN.")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=None,
+                        help="Importance cutoffs to sweep instead of running the perturbation analysis")
+    parser.add_argument("--sweep", choices=STRATEGIES, default=None,
+                        help="Multi-TF knockout sweep instead of single TF removals")
+    parser.add_argument("--top-n", type=int, default=sweep_top_n, help="Top TFs by degree used for pairs")
+    parser.add_argument("--steps", type=int, default=sweep_steps, help="TFs removed per greedy/random attack")
+    parser.add_argument("--replicates", type=int, default=sweep_replicates, help="Random attack replicates")
+    parser.add_argument("--null-networks", type=int, default=n_null_networks,
+                        help="Degree-preserving null networks for z-scores/empirical p-values (0: none)")
+    parser.add_argument("--seed", type=int, default=random_seed, help="Random seed")
+    parser.add_argument("--n-jobs", type=int, default=n_jobs, help="Worker processes (default: all CPUs)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.thresholds:
+        run_threshold_sweep(args.thresholds)
+        return
+
+    # === Step 1: Load and filter GRN ===
+    print("Loading GRNBoost2 output...")
+    df = load_grn(network_file, importance_threshold, min_edge_frequency)
+    print(f"Retained {len(df)} edges with importance > {importance_threshold}"
+          + (f" and frequency >= {min_edge_frequency}" if min_edge_frequency is not None else ""))
+
+    # === Step 2: Construct directed network (CSR arrays, built once) ===
+    graph = build_graph(df)
+    print(f"Network: {len(graph.names)} nodes, {len(graph.sources)} edges")
+
+    if args.sweep:
+        run_knockout_sweep(df, graph, args)
+        return
+
+    # === Step 3: Components after removing every node, from one DFS ===
+    print("Computing single-node removal effects for all nodes...")
+    effects = single_removal_effects(graph)
+    effects = effects[effects["Node"].isin(set(df["TF"].astype(str)))]
+    print(f"{len(effects)} TFs perturbed, {effects['Is_Articulation_Point'].sum()} are articulation points.")
+
+    # === Step 4: Path lengths for the top TFs (pivot-sampled BFS, parallel over TFs) ===
+    top_tfs = effects["Node"].head(top_n_tfs).tolist()
+    print(f"Estimating {path_length_mode} average path lengths for {len(top_tfs)} TFs ({n_pivots} pivots)...")
+    code_of = {name: code for code, name in enumerate(graph.names)}
+    estimates = removal_path_lengths(graph, [[code_of[tf]] for tf in top_tfs],
+                                     directed=(path_length_mode == "directed"), n_pivots=n_pivots,
+                                     seed=args.seed, n_jobs=args.n_jobs)
+    path_lengths = pd.DataFrame(estimates, index=top_tfs)
+
+    # === Step 5: Significance against degree-preserving null networks ===
+    if args.null_networks:
+        print(f"Rewiring {args.null_networks} degree-preserving null networks...")
+        null_stats = perturbation_significance(graph, args.null_networks, seed=args.seed, n_jobs=args.n_jobs)
+        effects = effects.merge(null_stats, on="Node", how="left")
+
+    # === Step 6: Save output ===
+    df_out = effects.rename(columns={"Node": "Removed_TF", "Degree": "Original_Degree"})
+    df_out["avg_path_length"] = df_out["Removed_TF"].map(path_lengths["mean"])
+    df_out["avg_path_length_ci_low"] = df_out["Removed_TF"].map(path_lengths["ci_low"])
+    df_out["avg_path_length_ci_high"] = df_out["Removed_TF"].map(path_lengths["ci_high"])
+    columns = ["Removed_TF", "Original_Degree", "num_components", "avg_path_length", "largest_component_size",
+               "Is_Articulation_Point", "avg_path_length_ci_low", "avg_path_length_ci_high"]
+    df_out = df_out[columns + [col for col in df_out.columns if col.endswith(("_gained", "_loss", "_null_mean", "_z", "_p"))]]
+    df_out.to_csv(output_file, index=False)
+
+    print(f"\nPerturbation analysis complete. Results saved to:\n{output_file}")
+
+
+# The process pool needs an import-safe entry point
+if __name__ == "__main__":
+    main()
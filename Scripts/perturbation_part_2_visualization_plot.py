@@ -8,7 +8,7 @@ It plots the number of weakly connected components remaining after each TF remov
 Steps:
 1. Load perturbation analysis results from part 1.
 2. Rank TFs by the number of components caused after their removal.
-3. Highlight top 20 most disruptive TFs in the barplot.
+3. Plot the 100 most disruptive TFs, highlighting the top 20 in the barplot.
 4. Save and display the plot.
 
 Input:
@@ -29,11 +29,14 @@ import seaborn as sns
 input_csv = "/home/15712745/personal/TF_prediction_genomes/Gene_regulatory_network/Network_validation_and_robustness_of_network/At_Network_perturbation_results_cutoff2_9_6_2025.csv"
 output_plot = "/home/15712745/personal/TF_prediction_genomes/Gene_regulatory_network/Network_validation_and_robustness_of_network/TF_disruption_num_components_SC_specific_9_6_2025.png"
 
+# Part 1 now perturbs every TF; only the most disruptive ones are plotted
+plot_top_n = 100
+
 # === Load data ===
 df = pd.read_csv(input_csv)
 
 # === Sort and annotate ===
-df_sorted = df.sort_values("num_components", ascending=False)
+df_sorted = df.sort_values("num_components", ascending=False).head(plot_top_n)
 top_disruptors = df_sorted.head(20)["Removed_TF"].tolist()
 df_sorted["Highlight"] = df_sorted["Removed_TF"].apply(lambda x: "Top 20" if x in top_disruptors else "Other")
 
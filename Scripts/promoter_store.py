@@ -0,0 +1,190 @@
+"""
+Script Name: promoter_store.py
+
+Purpose:
+Indexed, memory-mapped store for the TAIR10 upstream promoter sequences. The FASTA file is parsed only
+once to build:
+  - `<fasta>.seq`     : all sequences concatenated as uint8 base codes (A/C/G/T = 0-3, N = 4)
+  - `<fasta>.idx.npz` : sorted gene IDs with (offset, length) into the sequence blob, plus the original
+                        FASTA headers and the size/mtime of the source file
+Afterwards promoters are served by gene ID through `mmap`, without parsing the FASTA again. Single and
+batch lookups use a binary search on the sorted ID array, so fetching a 50-gene set takes milliseconds.
+The index is rebuilt automatically when the FASTA file changes.
+
+Gene IDs are stored without transcript version (e.g. AT1G01010). When the FASTA contains several
+transcript models of the same gene, the first record in the file is kept.
+
+Inputs:
+- FASTA file of upstream sequences (e.g., TAIR10_upstream_1000_20101104.txt)
+
+Outputs:
+- Binary index and sequence blob next to the FASTA file (or in index_dir)
+
+Thesis Reference:
+- Section 2.2 "Promoter Sequence Extraction"
+"""
+
+import os
+
+import numpy as np
+
+from pwm_scanner import PAD_CODE, decode_sequence, encode_sequence
+
+
+def normalize_gene_id(gene_id):
+    """
+    Strip version suffix from gene ID.
+    E.g. 'AT1G01010.1' → 'AT1G01010'
+    """
+    return gene_id.split('.')[0].upper()
+
+
+def _source_stamp(fasta_path):
+    stat = os.stat(fasta_path)
+    return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+def build_index(fasta_path, seq_path, idx_path):
+    """Parse the FASTA file once and write the sequence blob and the index."""
+    ids, headers, offsets, lengths = [], [], [], []
+    seen = set()
+    offset = 0
+
+    def flush(header, chunks, out):
+        nonlocal offset
+        if header is None:
+            return
+        gene_id = normalize_gene_id(header.split()[0])
+        if gene_id in seen:
+            return
+        seen.add(gene_id)
+        codes = encode_sequence("".join(chunks))
+        out.write(codes.tobytes())
+        ids.append(gene_id)
+        headers.append(header)
+        offsets.append(offset)
+        lengths.append(len(codes))
+        offset += len(codes)
+
+    with open(fasta_path, "r", encoding="utf-8") as fasta, open(seq_path, "wb") as out:
+        header, chunks = None, []
+        for line in fasta:
+            line = line.rstrip()
+            if line.startswith(">"):
+                flush(header, chunks, out)
+                header, chunks = line[1:], []
+            elif header is not None:
+                chunks.append(line)
+        flush(header, chunks, out)
+
+    order = np.argsort(ids)
+    np.savez(
+        idx_path,
+        gene_ids=np.array(ids)[order],
+        headers=np.array(headers)[order],
+        offsets=np.array(offsets, dtype=np.int64)[order],
+        lengths=np.array(lengths, dtype=np.int32)[order],
+        source=_source_stamp(fasta_path),
+    )
+    print(f"Indexed {len(ids)} promoter sequences from {fasta_path}")
+
+
+class PromoterStore:
+    """Random access to promoter sequences by gene ID, backed by a memory-mapped sequence blob."""
+
+    def __init__(self, fasta_path, index_dir=None):
+        base = os.path.basename(fasta_path)
+        index_dir = index_dir or os.path.dirname(os.path.abspath(fasta_path))
+        self.seq_path = os.path.join(index_dir, base + ".seq")
+        self.idx_path = os.path.join(index_dir, base + ".idx.npz")
+
+        if not self._index_is_current(fasta_path):
+            build_index(fasta_path, self.seq_path, self.idx_path)
+
+        with np.load(self.idx_path) as index:
+            self.gene_ids = index["gene_ids"]
+            self.headers = index["headers"]
+            self.offsets = index["offsets"]
+            self.lengths = index["lengths"]
+        # np.memmap cannot map an empty file
+        if self.lengths.sum():
+            self.blob = np.memmap(self.seq_path, dtype=np.uint8, mode="r")
+        else:
+            self.blob = np.zeros(0, dtype=np.uint8)
+
+    def _index_is_current(self, fasta_path):
+        if not (os.path.exists(self.seq_path) and os.path.exists(self.idx_path)):
+            return False
+        with np.load(self.idx_path) as index:
+            return np.array_equal(index["source"], _source_stamp(fasta_path))
+
+    def __len__(self):
+        return len(self.gene_ids)
+
+    def __contains__(self, gene_id):
+        return self.locate([gene_id])[0] >= 0
+
+    def locate(self, gene_ids):
+        """Index of each gene ID in the store (-1 when missing), by binary search."""
+        query = np.array([normalize_gene_id(str(g)) for g in gene_ids], dtype=self.gene_ids.dtype)
+        pos = np.searchsorted(self.gene_ids, query)
+        pos = np.minimum(pos, max(len(self.gene_ids) - 1, 0))
+        found = (self.gene_ids[pos] == query) if len(self.gene_ids) else np.zeros(len(query), dtype=bool)
+        return np.where(found, pos, -1)
+
+    def get_codes(self, gene_id):
+        """Encoded promoter of one gene (a read-only view into the memory map), or None if missing."""
+        pos = self.locate([gene_id])[0]
+        if pos < 0:
+            return None
+        return self.blob[self.offsets[pos]:self.offsets[pos] + self.lengths[pos]]
+
+    def get(self, gene_id):
+        """Promoter sequence of one gene as a string, or None if missing."""
+        codes = self.get_codes(gene_id)
+        return None if codes is None else decode_sequence(codes)
+
+    def fetch_codes(self, gene_ids, length=None):
+        """
+        Batch lookup. Returns the gene IDs that were found and their promoters as a padded
+        (n_genes, length) uint8 code matrix, ready for the PWM scanner.
+        """
+        pos = self.locate(gene_ids)
+        pos = pos[pos >= 0]
+        lengths = self.lengths[pos]
+        length = length or (int(lengths.max()) if len(pos) else 0)
+        codes = np.full((len(pos), length), PAD_CODE, dtype=np.uint8)
+        for row, (offset, n) in enumerate(zip(self.offsets[pos], np.minimum(lengths, length))):
+            codes[row, :n] = self.blob[offset:offset + n]
+        return self.gene_ids[pos].tolist(), codes
+
+    def gc_content(self, gene_ids):
+        """GC fraction of each gene's promoter (N bases excluded); NaN for genes not in the store."""
+        pos = self.locate(gene_ids)
+        gc = np.full(len(pos), np.nan)
+        for i, p in enumerate(pos):
+            if p >= 0:
+                counts = np.bincount(self.blob[self.offsets[p]:self.offsets[p] + self.lengths[p]], minlength=5)
+                if counts[:4].sum():
+                    gc[i] = (counts[1] + counts[2]) / counts[:4].sum()
+        return gc
+
+    def fetch(self, gene_ids):
+        """Batch lookup returning the found gene IDs and their sequences as strings."""
+        found, codes = self.fetch_codes(gene_ids)
+        return found, [decode_sequence(row) for row in codes]
+
+    def write_fasta(self, gene_ids, output_path, full_headers=False):
+        """
+        Write the promoters of the given genes to a FASTA file.
+        Headers are the bare gene IDs, or the original TAIR headers with full_headers=True.
+        Returns the number of sequences written.
+        """
+        pos = self.locate(gene_ids)
+        pos = pos[pos >= 0]
+        with open(output_path, "w") as out:
+            for p in pos:
+                header = self.headers[p] if full_headers else self.gene_ids[p]
+                seq = decode_sequence(self.blob[self.offsets[p]:self.offsets[p] + self.lengths[p]])
+                out.write(f">{header}\n{seq}\n")
+        return len(pos)
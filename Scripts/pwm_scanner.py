@@ -0,0 +1,440 @@
+"""
+Script Name: pwm_scanner.py
+
+Purpose:
+In-process replacement for the FIMO binary. This module loads a MEME motif file once, converts every
+letter-probability matrix into a log-odds position-specific scoring matrix (PSSM) and scores all promoter
+sequences on both strands at once with NumPy. Sequences are encoded as uint8 base codes; groups of three
+adjacent bases are combined into one code so that each table lookup adds the one-hot product of three
+PSSM columns for every window of every sequence.
+
+Scoring follows FIMO defaults:
+  - Motif pseudocount of 0.1, distributed according to the background letter frequencies
+  - Log-odds scores in bits (log2) against the background stored in the MEME file
+  - P-values from the exact score distribution of a scaled integer PSSM under the background model
+  - Hits reported when p < 1e-4, on both strands, with 1-based start/stop on the input sequence
+
+Hits are returned as an in-memory DataFrame with the same column names as `fimo.tsv`
+(motif_id, motif_alt_id, sequence_name, start, stop, strand, score, p-value, matched_sequence), so
+downstream code can use it directly instead of reading a TSV back from disk. FIMO q-values are not computed.
+
+Inputs:
+- Plant TF motif database in MEME format (e.g., Data/ALL_plant_motifs_JASPAR.meme)
+- Promoter sequences (FASTA file or lists of IDs and sequences)
+
+Outputs:
+- pandas DataFrame with one row per motif hit
+
+Thesis Reference:
+- Replaces the FIMO scans described in Sections 2.3–2.4 (motif scanning and enrichment)
+"""
+
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from Bio import SeqIO
+
+# === Defaults (same as FIMO) ===
+PVALUE_THRESHOLD = 1e-4
+MOTIF_PSEUDOCOUNT = 0.1
+PSSM_RANGE = 1000
+CHUNK_SIZE = 2000
+KMER_SIZE = 3  # PSSM columns merged into one lookup table
+
+ALPHABET = "ACGT"
+N_CODE = 4    # ambiguous base (N or any non-ACGT letter)
+PAD_CODE = 5  # padding after the end of shorter sequences
+
+Motif = namedtuple("Motif", ["motif_id", "motif_alt_id", "pwm", "nsites"])
+PSSM = namedtuple("PSSM", ["motif_id", "motif_alt_id", "width", "log_odds", "lookup", "tails"])
+
+# Byte -> code lookup table; lower case letters are treated like upper case
+_ENCODE_TABLE = np.full(256, N_CODE, dtype=np.uint8)
+for _code, _base in enumerate(ALPHABET):
+    _ENCODE_TABLE[ord(_base)] = _code
+    _ENCODE_TABLE[ord(_base.lower())] = _code
+
+_DECODE_TABLE = np.frombuffer(b"ACGTN-", dtype=np.uint8)
+
+
+# === Motif file parsing ===
+
+def read_meme(motif_file):
+    """
+    Parse a MEME-format motif file.
+    Returns a list of Motif records and the background letter frequencies (A, C, G, T).
+    """
+    motifs = []
+    background = np.full(4, 0.25)
+
+    with open(motif_file, "r", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+
+    i = 0
+    motif_id, motif_alt_id = None, ""
+    while i < len(lines):
+        line = lines[i].strip()
+        if line.startswith("Background letter frequencies"):
+            fields = lines[i + 1].split()
+            freqs = dict(zip(fields[0::2], map(float, fields[1::2])))
+            background = np.array([freqs[base] for base in ALPHABET])
+            background = background / background.sum()
+            i += 2
+            continue
+        if line.startswith("MOTIF"):
+            fields = line.split()
+            motif_id = fields[1]
+            motif_alt_id = fields[2] if len(fields) > 2 else ""
+        elif line.startswith("letter-probability matrix"):
+            header = line.split(":", 1)[1].replace("= ", "=").split()
+            params = dict(field.split("=") for field in header if "=" in field)
+            width = int(params["w"])
+            nsites = float(params.get("nsites", 20))
+            rows = [lines[i + 1 + j].split() for j in range(width)]
+            pwm = np.array(rows, dtype=float)
+            motifs.append(Motif(motif_id, motif_alt_id, pwm, nsites))
+            i += width + 1
+            continue
+        i += 1
+
+    return motifs, background
+
+
+def build_pssm(motif, background, pseudocount=MOTIF_PSEUDOCOUNT):
+    """
+    Convert a letter-probability matrix into a log-odds PSSM for both strands.
+
+    Besides the (width, 4) log-odds matrix, the PSSM holds the scores scaled to integers (used to look up
+    p-values) as lookup tables over groups of KMER_SIZE adjacent columns, one column per strand.
+    """
+    freqs = (motif.pwm * motif.nsites + pseudocount * background) / (motif.nsites + pseudocount)
+    log_odds = np.log2(freqs / background)
+
+    # Scale log-odds to integers in [0, PSSM_RANGE] so the score distribution can be computed exactly
+    col_min = log_odds.min(axis=1)
+    spread = (log_odds.max(axis=1) - col_min).sum()
+    scale = PSSM_RANGE / spread if spread > 0 else 1.0
+    int_scores = np.rint((log_odds - col_min[:, None]) * scale)
+
+    # Reverse complement: reverse column order and swap A<->T, C<->G
+    strands = np.stack([int_scores, int_scores[::-1, ::-1]], axis=2)
+    lookup = _kmer_tables(_code_table(strands, background))
+
+    tails = (_score_tail(int_scores, background), _score_tail(int_scores[::-1, ::-1], background))
+    return PSSM(motif.motif_id, motif.motif_alt_id, len(log_odds), log_odds, lookup, tails)
+
+
+def _code_table(scores, background):
+    """
+    Extend a (width, 4, ...) score matrix to all six sequence codes.
+    N scores the background-weighted mean of the column and padding scores zero.
+    """
+    table = np.zeros((scores.shape[0], 6) + scores.shape[2:])
+    table[:, :4] = scores
+    table[:, N_CODE] = np.tensordot(background, scores, axes=([0], [1]))
+    return table
+
+
+def _kmer_tables(table):
+    """
+    Merge consecutive PSSM columns into lookup tables indexed by k-mer codes (see kmer_codes).
+    Returns a list of (column offset, k, table of shape (6**k, 2)).
+    """
+    groups = []
+    for offset in range(0, len(table), KMER_SIZE):
+        columns = table[offset:offset + KMER_SIZE]
+        k = len(columns)
+        merged = np.zeros((6,) * k + (2,))
+        for i, column in enumerate(columns):
+            shape = [1] * k + [2]
+            shape[i] = 6
+            merged = merged + column.reshape(shape)
+        groups.append((offset, k, merged.reshape(-1, 2).astype(np.float32)))
+    return groups
+
+
+def _score_tail(int_scores, background):
+    """Return P(score >= s) for every integer score s under the background model."""
+    int_scores = int_scores.astype(np.int64)
+    pdf = np.zeros(int(int_scores.max(axis=1).sum()) + 1)
+    pdf[0] = 1.0
+    reach = 0
+    for column in int_scores:
+        new_pdf = np.zeros_like(pdf)
+        for base in range(4):
+            shift = column[base]
+            new_pdf[shift:shift + reach + 1] += pdf[:reach + 1] * background[base]
+        reach += column.max()
+        pdf = new_pdf
+    return np.cumsum(pdf[::-1])[::-1]
+
+
+def load_pssms(motif_file, pseudocount=MOTIF_PSEUDOCOUNT):
+    """Read a MEME file once and return the PSSMs and background frequencies."""
+    motifs, background = read_meme(motif_file)
+    pssms = [build_pssm(motif, background, pseudocount) for motif in motifs]
+    print(f"Loaded {len(pssms)} motifs from {motif_file}")
+    return pssms, background
+
+
+# === Sequence encoding ===
+
+def encode_sequence(sequence):
+    """Encode one DNA string as a 1-D uint8 code array (A/C/G/T = 0-3, anything else = N)."""
+    return _ENCODE_TABLE[np.frombuffer(str(sequence).encode("ascii"), dtype=np.uint8)]
+
+
+def encode_sequences(sequences, length=None):
+    """
+    Encode a list of DNA strings as a (n_sequences, length) uint8 array.
+    A/C/G/T become 0-3, any other letter becomes N (4), and shorter sequences are padded with 5.
+    """
+    if length is None:
+        length = max((len(seq) for seq in sequences), default=0)
+    codes = np.full((len(sequences), length), PAD_CODE, dtype=np.uint8)
+    for row, seq in enumerate(sequences):
+        encoded = encode_sequence(seq)[:length]
+        codes[row, :len(encoded)] = encoded
+    return codes
+
+
+def decode_sequence(codes):
+    """Convert an encoded sequence back into a DNA string (padding is dropped)."""
+    codes = np.asarray(codes)
+    return _DECODE_TABLE[codes[codes != PAD_CODE]].tobytes().decode("ascii")
+
+
+def sequence_lengths(codes):
+    """Number of non-padding positions in each encoded sequence."""
+    return (codes != PAD_CODE).sum(axis=-1)
+
+
+def kmer_codes(codes, k):
+    """
+    Combine k adjacent base codes into one integer per position (base-6 number), so that one table
+    lookup scores k PSSM columns at once. This is the one-hot product of k columns, precomputed.
+    """
+    codes = codes.astype(np.intp)
+    n_positions = codes.shape[-1] - k + 1
+    kmers = codes[..., :n_positions].copy()
+    for i in range(1, k):
+        kmers = kmers * 6 + codes[..., i:i + n_positions]
+    return kmers
+
+
+def read_fasta(fasta_file):
+    """Read a FASTA file and return the sequence IDs and sequences as strings."""
+    names, sequences = [], []
+    for record in SeqIO.parse(fasta_file, "fasta"):
+        names.append(record.id)
+        sequences.append(str(record.seq))
+    return names, sequences
+
+
+# === Scanning ===
+
+def score_windows(kmers, pssm):
+    """
+    Score every window of every sequence against a PSSM on both strands.
+    kmers maps k to the output of kmer_codes for the sequence block.
+    Returns the integer-scaled scores with shape (n_sequences, n_windows, 2) (forward, reverse).
+    """
+    n_windows = kmers[1].shape[1] - pssm.width + 1
+    scores = np.zeros((kmers[1].shape[0], max(n_windows, 0), 2), dtype=np.float32)
+    if n_windows <= 0:
+        return scores
+    for offset, k, table in pssm.lookup:
+        scores += np.take(table, kmers[k][:, offset:offset + n_windows], axis=0)
+    return scores
+
+
+def _score_cutoffs(pssm, pvalue_threshold):
+    """Smallest integer score per strand whose p-value is below the threshold."""
+    return [np.searchsorted(-tail, -pvalue_threshold, side="right") for tail in pssm.tails]
+
+
+def _window_mask(lengths, n_windows, width):
+    """Mask of windows that lie completely inside each (unpadded) sequence."""
+    return np.arange(n_windows)[None, :] <= (lengths[:, None] - width)
+
+
+def _site_codes(codes, seq_idx, pos, width, reverse):
+    """Gather the base codes of each hit site, reverse-complemented for minus-strand hits."""
+    sites = codes[seq_idx[:, None], pos[:, None] + np.arange(width)]
+    rc = np.where(sites < 4, 3 - sites, sites)[:, ::-1]
+    return np.where(reverse[:, None], rc, sites)
+
+
+def _log_odds_scores(sites, pssm, background):
+    """Exact log-odds score of each hit site (rows of base codes oriented along the motif)."""
+    table = _code_table(pssm.log_odds, background)
+    return table[np.arange(pssm.width), sites].sum(axis=1)
+
+
+def _iter_hits(codes, pssms, background, pvalue_threshold):
+    """
+    Scan one block of sequences with a list of PSSMs.
+    Yields (motif index, strand, sequence indices, positions, log-odds scores, p-values) per motif and strand.
+    """
+    kmers = {k: kmer_codes(codes, k) for k in range(1, KMER_SIZE + 1)}
+    lengths = sequence_lengths(codes)
+    for motif_index, pssm in enumerate(pssms):
+        scores = score_windows(kmers, pssm)
+        if scores.shape[1] == 0:
+            continue
+        cutoffs = _score_cutoffs(pssm, pvalue_threshold)
+        inside = _window_mask(lengths, scores.shape[1], pssm.width)
+        for strand in range(2):
+            seq_idx, pos = np.nonzero((scores[:, :, strand] >= cutoffs[strand]) & inside)
+            if len(seq_idx) == 0:
+                continue
+            int_hit = np.rint(scores[seq_idx, pos, strand]).astype(np.int64)
+            sites = _site_codes(codes, seq_idx, pos, pssm.width, np.full(len(pos), strand == 1))
+            yield (motif_index, strand, seq_idx, pos,
+                   _log_odds_scores(sites, pssm, background), pssm.tails[strand][int_hit])
+
+
+def _scan_task(args):
+    """Worker task: raw hit arrays for one block of sequences and motifs."""
+    codes, pssms, offset, background, pvalue_threshold = args
+    hits = []
+    for motif_index, strand, seq_idx, pos, score, pvalue in _iter_hits(codes, pssms, background, pvalue_threshold):
+        hits.append((
+            np.full(len(seq_idx), motif_index + offset, dtype=np.int32),
+            seq_idx.astype(np.int32),
+            pos.astype(np.int32),
+            np.full(len(seq_idx), strand, dtype=np.int8),
+            score,
+            pvalue,
+        ))
+    return hits
+
+
+def _sum_task(args):
+    """Worker task: per-group hit counts and score sums for one block of sequences and motifs."""
+    codes, pssms, groups, n_groups, background, pvalue_threshold = args
+    sums = np.zeros((n_groups, len(pssms)))
+    counts = np.zeros((n_groups, len(pssms)), dtype=np.int64)
+    for motif_index, _, seq_idx, _, score, _ in _iter_hits(codes, pssms, background, pvalue_threshold):
+        sums[:, motif_index] += np.bincount(groups[seq_idx], weights=score, minlength=n_groups)
+        counts[:, motif_index] += np.bincount(groups[seq_idx], minlength=n_groups)
+    return sums, counts
+
+
+def _motif_blocks(n_motifs, n_jobs):
+    """Split motif indices into contiguous blocks for the worker pool."""
+    n_blocks = max(1, min(n_motifs, n_jobs * 4))
+    bounds = np.linspace(0, n_motifs, n_blocks + 1).astype(int)
+    return [(bounds[i], bounds[i + 1]) for i in range(n_blocks) if bounds[i] < bounds[i + 1]]
+
+
+def _run_tasks(task_function, tasks, n_jobs):
+    """Run tasks inline or on a process pool, preserving order."""
+    if n_jobs == 1:
+        return [task_function(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        return list(pool.map(task_function, tasks))
+
+
+def scan_codes(codes, names, pssms, background, pvalue_threshold=PVALUE_THRESHOLD,
+               n_jobs=None, chunk_size=CHUNK_SIZE):
+    """
+    Scan encoded sequences with all PSSMs and return hits as a FIMO-style DataFrame.
+    Motifs are distributed over a process pool; sequences are processed in blocks of chunk_size.
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+    offsets, tasks = [], []
+    for row_start in range(0, len(codes), chunk_size):
+        block = codes[row_start:row_start + chunk_size]
+        for start, stop in _motif_blocks(len(pssms), n_jobs):
+            offsets.append(row_start)
+            tasks.append((block, pssms[start:stop], start, background, pvalue_threshold))
+
+    parts = []
+    for row_start, hits in zip(offsets, _run_tasks(_scan_task, tasks, n_jobs)):
+        for motif_idx, seq_idx, pos, strand, score, pvalue in hits:
+            parts.append((motif_idx, seq_idx + row_start, pos, strand, score, pvalue))
+
+    return _hits_to_dataframe(parts, codes, names, pssms)
+
+
+def motif_score_sums(codes, pssms, background, groups=None, pvalue_threshold=PVALUE_THRESHOLD,
+                     n_jobs=None, chunk_size=CHUNK_SIZE):
+    """
+    Scan encoded sequences and reduce the hits straight to per-motif totals, without building a hit table.
+
+    codes may have any number of leading dimensions, e.g. (n_shuffles, n_genes, length).
+    groups assigns every sequence (in flattened order) to an output row; by default each index along the
+    first dimension is one group, so a (n_shuffles, n_genes, length) array gives one row per shuffle.
+    Returns (score_sums, hit_counts), both of shape (n_groups, n_motifs).
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+    flat = codes.reshape(-1, codes.shape[-1])
+    if groups is None:
+        groups = np.repeat(np.arange(codes.shape[0]), len(flat) // max(codes.shape[0], 1))
+    groups = np.asarray(groups, dtype=np.intp)
+    n_groups = int(groups.max()) + 1 if len(groups) else 0
+
+    blocks, tasks = [], []
+    for row_start in range(0, len(flat), chunk_size):
+        rows = slice(row_start, row_start + chunk_size)
+        for start, stop in _motif_blocks(len(pssms), n_jobs):
+            blocks.append((start, stop))
+            tasks.append((flat[rows], pssms[start:stop], groups[rows], n_groups, background, pvalue_threshold))
+
+    sums = np.zeros((n_groups, len(pssms)))
+    counts = np.zeros((n_groups, len(pssms)), dtype=np.int64)
+    for (start, stop), (block_sums, block_counts) in zip(blocks, _run_tasks(_sum_task, tasks, n_jobs)):
+        sums[:, start:stop] += block_sums
+        counts[:, start:stop] += block_counts
+    return sums, counts
+
+
+def _hits_to_dataframe(parts, codes, names, pssms):
+    """Assemble raw hit arrays into a DataFrame with fimo.tsv column names."""
+    columns = ["motif_id", "motif_alt_id", "sequence_name", "start", "stop",
+               "strand", "score", "p-value", "matched_sequence"]
+    if not parts:
+        return pd.DataFrame(columns=columns)
+
+    motif_idx, seq_idx, pos, strand, score, pvalue = (np.concatenate(col) for col in zip(*parts))
+    widths = np.array([pssm.width for pssm in pssms])[motif_idx]
+
+    # Decode matched sites in groups of equal motif width
+    matched = np.empty(len(motif_idx), dtype=object)
+    for width in np.unique(widths):
+        rows = np.flatnonzero(widths == width)
+        sites = _site_codes(codes, seq_idx[rows], pos[rows], width, strand[rows] == 1)
+        letters = np.ascontiguousarray(_DECODE_TABLE[sites])
+        matched[rows] = letters.view(f"S{width}").ravel().astype(str)
+
+    motif_ids = np.array([pssm.motif_id for pssm in pssms])
+    alt_ids = np.array([pssm.motif_alt_id for pssm in pssms])
+    hits = pd.DataFrame({
+        "motif_id": motif_ids[motif_idx],
+        "motif_alt_id": alt_ids[motif_idx],
+        "sequence_name": np.asarray(names)[seq_idx],
+        "start": pos + 1,
+        "stop": pos + widths,
+        "strand": np.where(strand == 0, "+", "-"),
+        "score": np.round(score.astype(float), 5),
+        "p-value": pvalue,
+        "matched_sequence": matched,
+    })
+    return hits.sort_values(["motif_id", "p-value"], kind="stable").reset_index(drop=True)
+
+
+def scan_sequences(names, sequences, pssms, background, **kwargs):
+    """Scan a list of DNA strings; see scan_codes for keyword arguments."""
+    return scan_codes(encode_sequences(sequences), names, pssms, background, **kwargs)
+
+
+def scan_fasta(fasta_file, motif_file, **kwargs):
+    """Convenience wrapper: load motifs, read a FASTA file and return its motif hits."""
+    pssms, background = load_pssms(motif_file)
+    names, sequences = read_fasta(fasta_file)
+    print(f"Scanning {len(names)} sequences...")
+    return scan_sequences(names, sequences, pssms, background, **kwargs)